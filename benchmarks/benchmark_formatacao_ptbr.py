@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# benchmarks/benchmark_formatacao_ptbr.py
+"""
+Micro-benchmark da formatação pt_BR dos contratos (utils/formatacao_ptbr.py).
+
+Uso (a partir da raiz do repositório):
+
+    python benchmarks/benchmark_formatacao_ptbr.py --contratos 20000 --saida formatacao.json
+
+Compara, para a mesma sequência de contratos, a formatação original (num2words(..., lang='pt_BR',
+to='currency') três vezes por contrato, troca tripla de separadores e data remontada a cada chamada)
+com a do módulo: caches LRU para valores por extenso e números, data pré-montada por dia e formatador
+de números direto. Antes de medir, confere que os textos gerados são idênticos contrato a contrato.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+
+DIRETORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(DIRETORIO_BENCHMARKS), 'src'))
+
+from num2words import num2words
+
+from utils import formatacao_ptbr
+from run_benchmarks import resumir, commit_atual
+
+CIDADE, UF = "Mossoró", "RN"
+# Valores de doação padronizados (a maioria dos contratos) e alíquotas de ITCMD usuais
+VALORES_PADRAO = [500.0, 1000.0, 1500.0, 2000.0, 2500.0, 3000.0, 5000.0, 10000.0, 1500, 2000]
+ALIQUOTAS = [2.0, 4.0, 8.0]
+
+
+def formatar_original(valor_bruto, aliquota):
+    """Campos calculados do contrato como eram montados antes do módulo formatacao_ptbr."""
+    valor_itcmd = (valor_bruto * aliquota) / 100.0
+    valor_liquido = valor_bruto - valor_itcmd
+    data_atual = datetime.date.today()
+    meses_extenso = ["janeiro", "fevereiro", "março", "abril", "maio", "junho",
+                     "julho", "agosto", "setembro", "outubro", "novembro", "dezembro"]
+    data_extenso = f"{CIDADE}/{UF}, {data_atual.day} de {meses_extenso[data_atual.month - 1]} de {data_atual.year}"
+    return (
+        f"{valor_bruto:,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
+        num2words(valor_bruto, lang='pt_BR', to='currency').upper(),
+        f"{aliquota:,.2f}%".replace('.', ','),
+        f"{valor_itcmd:,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
+        num2words(valor_itcmd, lang='pt_BR', to='currency').upper(),
+        f"{valor_liquido:,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
+        num2words(valor_liquido, lang='pt_BR', to='currency').upper(),
+        data_extenso.upper(),
+    )
+
+
+def formatar_modulo(valor_bruto, aliquota):
+    """Os mesmos campos, pelas funções de utils/formatacao_ptbr.py (como em preparar_dados_para_contrato)."""
+    valor_itcmd = (valor_bruto * aliquota) / 100.0
+    valor_liquido = valor_bruto - valor_itcmd
+    return (
+        formatacao_ptbr.formatar_numero_br(valor_bruto),
+        formatacao_ptbr.moeda_por_extenso(valor_bruto),
+        formatacao_ptbr.formatar_percentual(aliquota),
+        formatacao_ptbr.formatar_numero_br(valor_itcmd),
+        formatacao_ptbr.moeda_por_extenso(valor_itcmd),
+        formatacao_ptbr.formatar_numero_br(valor_liquido),
+        formatacao_ptbr.moeda_por_extenso(valor_liquido),
+        formatacao_ptbr.local_data_completa(CIDADE, UF),
+    )
+
+
+def gerar_entradas(total, fracao_avulsos, semente):
+    """(valor_bruto, aliquota) por contrato: valores padronizados, com uma fração de valores avulsos com centavos."""
+    rng = random.Random(semente)
+    entradas = []
+    for _ in range(total):
+        if rng.random() < fracao_avulsos:
+            valor = round(rng.uniform(100, 250000), 2)
+        else:
+            valor = rng.choice(VALORES_PADRAO)
+        entradas.append((valor, rng.choice(ALIQUOTAS)))
+    return entradas
+
+
+def valores_de_borda():
+    """Entradas que exercitam o formatador fora do caso comum: zero, negativos, milhões, int e arredondamento."""
+    return [(0.0, 4.0), (0.005, 2.0), (999.995, 4.0), (1000, 8.0), (-1500.0, 4.0), (1234567.89, 2.0),
+            (10 ** 9 + 0.01, 4.0), (0.01, 0.5), (100, 2.0)]
+
+
+def medir(funcao, entradas, repeticoes, limpar_antes):
+    """Tempo por execução da sequência inteira de contratos."""
+    amostras = []
+    for _ in range(repeticoes):
+        if limpar_antes:
+            formatacao_ptbr.limpar_caches()
+        inicio = time.perf_counter()
+        for valor_bruto, aliquota in entradas:
+            funcao(valor_bruto, aliquota)
+        amostras.append(time.perf_counter() - inicio)
+    return resumir(amostras, len(entradas))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark da formatação pt_BR dos contratos.")
+    parser.add_argument('--contratos', type=int, default=20000, help="Contratos na sequência medida.")
+    parser.add_argument('--fracao-avulsos', type=float, default=0.1,
+                        help="Fração de contratos com valor avulso (fora dos valores padronizados).")
+    parser.add_argument('--repeticoes', type=int, default=5, help="Repetições de cada medição.")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', default=None, help="Arquivo JSON de saída (padrão: stdout).")
+    args = parser.parse_args(argv)
+
+    entradas = gerar_entradas(args.contratos, args.fracao_avulsos, args.semente)
+
+    # 1. Saída idêntica, contrato a contrato (com as caches frias e depois de aquecidas)
+    formatacao_ptbr.limpar_caches()
+    for rodada in ('cache_fria', 'cache_quente'):
+        for valor_bruto, aliquota in valores_de_borda() + entradas:
+            original, novo = formatar_original(valor_bruto, aliquota), formatar_modulo(valor_bruto, aliquota)
+            if original != novo:
+                print(f"Saída diferente ({rodada}) para valor={valor_bruto!r}, alíquota={aliquota!r}:\n"
+                      f"  original: {original}\n  módulo:   {novo}", file=sys.stderr)
+                return 1
+    print(f"Saída idêntica em {len(entradas) + len(valores_de_borda())} contratos.", file=sys.stderr)
+
+    # 2. Tempos: original, módulo com as caches esvaziadas a cada execução e módulo em regime (caches quentes)
+    etapas = {
+        "original": medir(formatar_original, entradas, args.repeticoes, limpar_antes=False),
+        "modulo_cache_fria": medir(formatar_modulo, entradas, args.repeticoes, limpar_antes=True),
+        "modulo_cache_quente": medir(formatar_modulo, entradas, args.repeticoes, limpar_antes=False),
+    }
+    base = etapas["original"]["p50_ms"]
+    for nome_etapa, estatisticas in etapas.items():
+        estatisticas["aceleracao_p50"] = base / estatisticas["p50_ms"]
+        print(f"{nome_etapa:22} p50 {estatisticas['p50_ms']:>10.2f} ms  "
+              f"{estatisticas['p50_ms'] * 1000 / len(entradas):>8.2f} us/contrato  "
+              f"{estatisticas['aceleracao_p50']:>6.1f}x", file=sys.stderr)
+
+    saida = {
+        "meta": {"commit": commit_atual(), "data": datetime.datetime.now().isoformat(timespec='seconds'),
+                 "parametros": vars(args),
+                 "cache_extenso": formatacao_ptbr.moeda_por_extenso.cache_info()._asdict()},
+        "resultados": etapas,
+    }
+    texto_json = json.dumps(saida, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f_saida:
+            f_saida.write(texto_json)
+    else:
+        print(texto_json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
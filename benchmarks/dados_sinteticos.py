@@ -0,0 +1,53 @@
+# benchmarks/dados_sinteticos.py
+import random
+
+# Colunas que preparar_dados_para_contrato espera na planilha de donatários
+COLUNAS = ['NOME', 'NACIONALIDADE', 'ESTADO_CIVIL', 'PROFISSAO', 'RG', 'CPF', 'ENDERECO', 'CIDADE_UF',
+           'CEP', 'TELEFONE', 'EMAIL', 'BANCO', 'AGENCIA', 'CONTA', 'OPERACAO']
+
+_PRENOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Íris', 'João',
+             'Lúcia', 'Marcos', 'Nádia', 'Otávio', 'Paula', 'Raul', 'Sônia', 'Tiago', 'Vera', 'Wagner']
+_SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Lima', 'Carvalho', 'Araújo',
+               'Fernandes', 'Gomes', 'Ribeiro', 'Martins', 'Rocha', 'Almeida', 'Barbosa', 'Conceição']
+_ESTADOS_CIVIS = ['solteiro(a)', 'casado(a)', 'divorciado(a)', 'viúvo(a)']
+_PROFISSOES = ['professora', 'agricultor', 'enfermeira', 'comerciante', 'estudante', 'pedreiro', 'artesã']
+_CIDADES = ['Mossoró/RN', 'Natal/RN', 'Fortaleza/CE', 'Recife/PE', 'João Pessoa/PB', 'Caicó/RN']
+_RUAS = ['Rua das Flores', 'Av. Rio Branco', 'Rua Coronel Gurgel', 'Travessa São José', 'Rua Seis de Janeiro']
+_BANCOS = ['Banco do Brasil', 'Caixa Econômica', 'Bradesco', 'Itaú', 'Nubank']
+
+
+def _cpf(rng):
+    digitos = [rng.randint(0, 9) for _ in range(11)]
+    return '{}{}{}.{}{}{}.{}{}{}-{}{}'.format(*digitos)
+
+
+def gerar_registro(rng, indice):
+    """Um donatário sintético (valores em texto, como vêm da API do Sheets)."""
+    nome = f"{rng.choice(_PRENOMES)} {rng.choice(_SOBRENOMES)} {rng.choice(_SOBRENOMES)}"
+    return {
+        'NOME': nome,
+        'NACIONALIDADE': 'brasileira',
+        'ESTADO_CIVIL': rng.choice(_ESTADOS_CIVIS),
+        'PROFISSAO': rng.choice(_PROFISSOES),
+        'RG': f"{rng.randint(1000000, 9999999)} SSP/RN",
+        'CPF': _cpf(rng),
+        'ENDERECO': f"{rng.choice(_RUAS)}, {rng.randint(1, 2500)}, Centro",
+        'CIDADE_UF': rng.choice(_CIDADES),
+        'CEP': f"{rng.randint(59000, 59999)}-{rng.randint(0, 999):03d}",
+        'TELEFONE': f"(84) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+        'EMAIL': f"donatario{indice}@exemplo.com.br",
+        'BANCO': rng.choice(_BANCOS),
+        'AGENCIA': f"{rng.randint(1000, 9999)}-{rng.randint(0, 9)}",
+        'CONTA': f"{rng.randint(10000, 999999)}-{rng.randint(0, 9)}",
+        'OPERACAO': rng.choice(['corrente', 'poupança']),
+    }
+
+
+def gerar_linhas_planilha(total_linhas, semente=42):
+    """Linhas brutas da planilha (cabeçalho + dados), no formato devolvido pela API do Sheets."""
+    rng = random.Random(semente)
+    linhas = [list(COLUNAS)]
+    for indice in range(total_linhas):
+        registro = gerar_registro(rng, indice)
+        linhas.append([registro[coluna] for coluna in COLUNAS])
+    return linhas
@@ -0,0 +1,93 @@
+# benchmarks/fake_gspread.py
+import time
+
+import gspread
+
+# Substituto local do gspread para os benchmarks: mesma interface usada por utils/google_services.py
+# (open_by_key, get_lastUpdateTime, sheet1, row_count, get_all_records, row_values, col_values, batch_get).
+# Como a API de valores, corta as células e linhas vazias do fim das respostas; row_count é o tamanho
+# da grade, que inclui linhas vazias depois dos dados.
+# Injetado com google_services.definir_cliente_sheets(ClienteFalso(...)).
+
+
+def _cortar_vazios_do_fim(valores, vazio):
+    valores = list(valores)
+    while valores and valores[-1] == vazio:
+        valores.pop()
+    return valores
+
+
+class AbaFalsa:
+    """Primeira aba da planilha: linhas brutas (strings), com o cabeçalho na linha 1."""
+
+    title = 'Donatarios'
+
+    def __init__(self, linhas, latencia_segundos=0.0, linhas_vazias_grade=100):
+        self.linhas = linhas
+        self.latencia_segundos = latencia_segundos
+        self.linhas_vazias_grade = linhas_vazias_grade
+        self.chamadas = 0
+
+    @property
+    def row_count(self):
+        return len(self.linhas) + self.linhas_vazias_grade
+
+    def _chamada_api(self):
+        # Simula o custo de rede de uma chamada à API do Google Sheets
+        self.chamadas += 1
+        if self.latencia_segundos:
+            time.sleep(self.latencia_segundos)
+
+    def get_all_records(self, numericise_ignore=()):
+        self._chamada_api()
+        cabecalho, dados = self.linhas[0], self.linhas[1:]
+        if 'all' in numericise_ignore:
+            return gspread.utils.to_records(cabecalho, [list(linha) for linha in dados])
+        return gspread.utils.to_records(cabecalho, [gspread.utils.numericise_all(list(linha)) for linha in dados])
+
+    def row_values(self, numero_linha):
+        self._chamada_api()
+        return list(self.linhas[numero_linha - 1])
+
+    def col_values(self, numero_coluna):
+        self._chamada_api()
+        coluna = [linha[numero_coluna - 1] if len(linha) >= numero_coluna else '' for linha in self.linhas]
+        return _cortar_vazios_do_fim(coluna, '')
+
+    def batch_get(self, ranges):
+        self._chamada_api()
+        resultado = []
+        for intervalo in ranges:
+            inicio, fim = intervalo.split(':')
+            linha_inicio = int(''.join(c for c in inicio if c.isdigit()))
+            linha_fim = int(''.join(c for c in fim if c.isdigit()))
+            linhas = [_cortar_vazios_do_fim(linha, '') for linha in self.linhas[linha_inicio - 1:linha_fim]]
+            resultado.append(_cortar_vazios_do_fim(linhas, []))
+        return resultado
+
+
+class PlanilhaFalsa:
+    def __init__(self, aba, titulo='Planilha sintética', revisao='2024-01-01T00:00:00.000Z'):
+        self.sheet1 = aba
+        self.title = titulo
+        self.revisao = revisao
+
+    def get_lastUpdateTime(self):
+        self.sheet1._chamada_api()
+        return self.revisao
+
+
+class ClienteFalso:
+    """Cliente com várias planilhas, indexadas pelo ID (chave de open_by_key)."""
+
+    def __init__(self, planilhas=None):
+        self.planilhas = dict(planilhas or {})
+
+    def adicionar(self, sheet_id, linhas, latencia_segundos=0.0, revisao='2024-01-01T00:00:00.000Z'):
+        self.planilhas[sheet_id] = PlanilhaFalsa(AbaFalsa(linhas, latencia_segundos), revisao=revisao)
+        return self.planilhas[sheet_id]
+
+    def open_by_key(self, sheet_id):
+        if sheet_id not in self.planilhas:
+            raise gspread.exceptions.SpreadsheetNotFound(sheet_id)
+        return self.planilhas[sheet_id]
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# benchmarks/run_benchmarks.py
+"""
+Benchmark do pipeline de contratos, com planilhas sintéticas servidas por um gspread falso.
+
+Uso (a partir da raiz do repositório):
+
+    python benchmarks/run_benchmarks.py --tamanhos 10,1000,50000 --saida resultados.json
+    python benchmarks/run_benchmarks.py --tamanhos 1000 --comparar resultados_main.json
+
+Cada etapa é medida separadamente (carga da planilha, dataset store, preparação do contexto,
+Jinja + markdown2, WeasyPrint e requisições completas pelo test client do Flask).
+O JSON de saída traz percentis de latência, vazão e pico de RSS, para comparar execuções entre commits.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import resource
+import datetime
+import tempfile
+import subprocess
+
+DIRETORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_SRC = os.path.join(os.path.dirname(DIRETORIO_BENCHMARKS), 'src')
+sys.path.insert(0, DIRETORIO_SRC)
+
+from fake_gspread import ClienteFalso
+from dados_sinteticos import gerar_linhas_planilha
+
+VALOR_DOACAO = 1500.0
+ALIQUOTA = 4.0
+
+
+def percentil(valores_ordenados, fracao):
+    """Percentil com interpolação linear (valores já ordenados)."""
+    if not valores_ordenados:
+        return None
+    posicao = (len(valores_ordenados) - 1) * fracao
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[inferior] + (valores_ordenados[superior] - valores_ordenados[inferior]) * (posicao - inferior)
+
+
+def resumir(amostras_segundos, itens_por_execucao=1):
+    """Estatísticas de uma etapa: latência (ms), percentis e vazão (itens por segundo)."""
+    ordenadas = sorted(amostras_segundos)
+    total = sum(ordenadas)
+    return {
+        "execucoes": len(ordenadas),
+        "itens_por_execucao": itens_por_execucao,
+        "media_ms": total / len(ordenadas) * 1000,
+        "min_ms": ordenadas[0] * 1000,
+        "p50_ms": percentil(ordenadas, 0.50) * 1000,
+        "p90_ms": percentil(ordenadas, 0.90) * 1000,
+        "p95_ms": percentil(ordenadas, 0.95) * 1000,
+        "p99_ms": percentil(ordenadas, 0.99) * 1000,
+        "max_ms": ordenadas[-1] * 1000,
+        "total_s": total,
+        "vazao_por_s": (len(ordenadas) * itens_por_execucao) / total if total > 0 else None,
+    }
+
+
+def cronometrar(funcao, *args, **kwargs):
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    return time.perf_counter() - inicio, resultado
+
+
+def pico_rss_kb():
+    """Pico de RSS (KB no Linux) do processo e dos filhos já encerrados/aguardados (pool de renderização)."""
+    return {
+        "processo": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "filhos": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRETORIO_BENCHMARKS,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def preparar_ambiente(diretorio_temporario, args):
+    """
+    Isola o benchmark: banco SQLite, uploads, cache de PDFs e bytecode do Jinja em um diretório temporário.
+    Precisa rodar antes de importar o app (a Config é lida na importação).
+    """
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(diretorio_temporario, 'uploads')
+    os.environ['PDF_CACHE_DIR'] = os.path.join(diretorio_temporario, 'cache_pdf')
+    os.environ['JINJA_BYTECODE_CACHE_DIR'] = os.path.join(diretorio_temporario, 'jinja_cache')
+    if args.workers:
+        os.environ['PDF_POOL_WORKERS'] = str(args.workers)
+    os.makedirs(os.path.join(os.environ['UPLOAD_FOLDER'], 'contratos_gerados'), exist_ok=True)
+
+    from config import Config
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(diretorio_temporario, 'benchmark.db')
+    if not args.com_cache_pdf:
+        # Sem cache de PDFs, toda renderização passa pelo pipeline completo
+        Config.PDF_CACHE_MAX_BYTES = 0
+    logging.basicConfig(level=os.environ['LOG_LEVEL'])
+
+
+def benchmark_tamanho(total_linhas, cliente, app, args, logger):
+    from config import Config
+    from utils.google_services import get_sheet_records
+    from utils.dataset_store import salvar_dataset, obter_linha, listar_nome_cpf
+    from utils.contract_processing import preparar_dados_para_contrato, preparar_dados_para_contrato_lote
+    from utils.pdf_rendering import renderizar_html_contrato, gerar_pdf_bytes
+
+    etapas = {}
+    rng = random.Random(total_linhas)
+    sheet_id = f"benchmark-{total_linhas}"
+
+    inicio_geracao = time.perf_counter()
+    cliente.adicionar(sheet_id, gerar_linhas_planilha(total_linhas), latencia_segundos=args.latencia_ms / 1000)
+    print(f"[{total_linhas} linhas] planilha sintética gerada em {time.perf_counter() - inicio_geracao:.2f}s", file=sys.stderr)
+
+    # 1. Carga da planilha (gspread falso -> registros), sem o cache de planilhas
+    repeticoes_carga = args.repeticoes if total_linhas <= 1000 else max(1, args.repeticoes // 5)
+    amostras = []
+    for _ in range(repeticoes_carga):
+        segundos, registros = cronometrar(get_sheet_records, sheet_id, logger, usar_cache=False)
+        amostras.append(segundos)
+    etapas["carga_planilha"] = resumir(amostras, total_linhas)
+
+    # 2. Ida e volta dos dados entre requisições. O antigo session -> pd.read_json foi substituído pelo
+    #    dataset store (SQLite): grava o snapshot uma vez e lê linhas/listagem a cada requisição.
+    with app.app_context():
+        segundos, referencia = cronometrar(salvar_dataset, sheet_id, registros, logger)
+        etapas["dataset_store_salvar"] = resumir([segundos], total_linhas)
+        indices_amostra = [rng.randrange(total_linhas) for _ in range(min(total_linhas, args.amostras_linhas))]
+        amostras = [cronometrar(obter_linha, referencia, indice)[0] for indice in indices_amostra]
+        etapas["dataset_store_obter_linha"] = resumir(amostras)
+        amostras = [cronometrar(lambda: list(listar_nome_cpf(referencia)))[0] for _ in range(repeticoes_carga)]
+        etapas["dataset_store_listar"] = resumir(amostras, total_linhas)
+
+    # 3. Preparação do contexto (cálculos + num2words), linha a linha e em lote sobre o DataFrame inteiro
+    amostra_registros = [registros[indice] for indice in indices_amostra]
+    amostras, contextos = [], []
+    for registro in amostra_registros:
+        segundos, contexto = cronometrar(preparar_dados_para_contrato, registro, VALOR_DOACAO, ALIQUOTA, logger)
+        amostras.append(segundos)
+        contextos.append(contexto)
+    etapas["preparar_dados"] = resumir(amostras)
+    import pandas as pd
+    donatarios_df = pd.DataFrame(registros, dtype=object)
+    amostras = [cronometrar(preparar_dados_para_contrato_lote, donatarios_df, VALOR_DOACAO, ALIQUOTA, logger)[0]
+                for _ in range(repeticoes_carga)]
+    etapas["preparar_dados_lote"] = resumir(amostras, total_linhas)
+
+    # 4. Jinja + markdown2 (pipeline completo) e template compilado
+    modo_original = Config.TEMPLATE_COMPILADO
+    try:
+        Config.TEMPLATE_COMPILADO = False
+        etapas["html_jinja_markdown"] = resumir(
+            [cronometrar(renderizar_html_contrato, contexto, logger)[0] for contexto in contextos])
+        Config.TEMPLATE_COMPILADO = True
+        etapas["html_compilado"] = resumir(
+            [cronometrar(renderizar_html_contrato, contexto, logger)[0] for contexto in contextos])
+    finally:
+        Config.TEMPLATE_COMPILADO = modo_original
+
+    # 5. WeasyPrint (HTML -> PDF), no processo atual
+    if not args.sem_weasyprint:
+        amostras, tamanhos_pdf = [], []
+        for contexto in contextos[:args.amostras_pdf]:
+            html_content = renderizar_html_contrato(contexto, logger)
+            segundos, pdf_bytes = cronometrar(gerar_pdf_bytes, html_content, None, logger)
+            amostras.append(segundos)
+            tamanhos_pdf.append(len(pdf_bytes))
+        etapas["weasyprint"] = resumir(amostras)
+        etapas["weasyprint"]["pdf_bytes_medio"] = sum(tamanhos_pdf) / len(tamanhos_pdf)
+
+    # 6. Requisições completas pelo test client do Flask
+    cliente_http = app.test_client()
+    segundos, resposta = cronometrar(cliente_http.post, '/', data={'sheet_url': sheet_id})
+    if resposta.status_code != 200:
+        raise RuntimeError(f"POST / falhou com status {resposta.status_code}")
+    etapas["e2e_index_primeira_carga"] = resumir([segundos], total_linhas)
+    etapas["e2e_index_sincronizacao"] = resumir(
+        [cronometrar(cliente_http.post, '/', data={'sheet_url': sheet_id})[0] for _ in range(repeticoes_carga)],
+        total_linhas)
+    etapas["e2e_index_get"] = resumir([cronometrar(cliente_http.get, '/')[0] for _ in range(repeticoes_carga)],
+                                      total_linhas)
+    etapas["e2e_api_donatarios_pagina"] = resumir(
+        [cronometrar(cliente_http.get, f'/api/donatarios?pagina={rng.randint(1, max(1, total_linhas // 50))}')[0]
+         for _ in range(args.repeticoes)])
+    termos_busca = [registros[indice]['NOME'].split()[rng.randrange(3)][:4] for indice in indices_amostra[:args.repeticoes]]
+    etapas["e2e_api_donatarios_busca"] = resumir(
+        [cronometrar(cliente_http.get, '/api/donatarios', query_string={'q': termo})[0] for termo in termos_busca])
+
+    if not args.sem_weasyprint:
+        amostras = []
+        for indice in indices_amostra[:args.amostras_pdf]:
+            inicio = time.perf_counter()
+            resposta = cliente_http.post('/jobs', json={'donatario_selecionado_index': indice,
+                                                        'valor_doacao': VALOR_DOACAO, 'aliquota': ALIQUOTA})
+            status_url = resposta.get_json()['status_url']
+            while True:
+                status = cliente_http.get(status_url).get_json()['status']
+                if status in ('concluido', 'erro'):
+                    break
+                time.sleep(0.005)
+            if status == 'erro':
+                raise RuntimeError(f"Job do índice {indice} terminou com erro.")
+            amostras.append(time.perf_counter() - inicio)
+        etapas["e2e_job_contrato"] = resumir(amostras)
+
+        indices_lote = list(range(min(total_linhas, args.tamanho_lote)))
+        inicio = time.perf_counter()
+        resposta = cliente_http.post('/gerar_contratos_lote', json={'indices': indices_lote,
+                                                                   'valor_doacao': VALOR_DOACAO, 'aliquota': ALIQUOTA})
+        tamanho_zip = len(resposta.get_data()) # consome o ZIP em streaming até o fim
+        etapas["e2e_lote_zip"] = resumir([time.perf_counter() - inicio], len(indices_lote))
+        etapas["e2e_lote_zip"]["zip_bytes"] = tamanho_zip
+
+    return {"linhas": total_linhas, "etapas": etapas, "pico_rss_kb": pico_rss_kb()}
+
+
+def imprimir_resumo(resultados):
+    for chave_tamanho, resultado in resultados.items():
+        print(f"\n== {chave_tamanho} linhas (pico RSS: {resultado['pico_rss_kb']['processo'] / 1024:.0f} MB, "
+              f"filhos: {resultado['pico_rss_kb']['filhos'] / 1024:.0f} MB)")
+        print(f"{'etapa':32} {'n':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'vazão/s':>12}")
+        for nome_etapa, estatisticas in resultado["etapas"].items():
+            vazao = estatisticas['vazao_por_s']
+            print(f"{nome_etapa:32} {estatisticas['execucoes']:>6} {estatisticas['p50_ms']:>10.2f} "
+                  f"{estatisticas['p95_ms']:>10.2f} {estatisticas['p99_ms']:>10.2f} "
+                  f"{(f'{vazao:.1f}' if vazao else '-'):>12}")
+
+
+def comparar(resultados, caminho_base):
+    """Mostra a variação do p50 de cada etapa em relação a uma execução anterior (JSON)."""
+    with open(caminho_base, encoding='utf-8') as f_base:
+        base = json.load(f_base)
+    print(f"\n== Comparação com {caminho_base} (commit {base.get('meta', {}).get('commit')})")
+    for chave_tamanho, resultado in resultados.items():
+        etapas_base = base.get("resultados", {}).get(chave_tamanho, {}).get("etapas", {})
+        for nome_etapa, estatisticas in resultado["etapas"].items():
+            anterior = etapas_base.get(nome_etapa)
+            if not anterior or not anterior.get("p50_ms"):
+                continue
+            variacao = (estatisticas["p50_ms"] - anterior["p50_ms"]) / anterior["p50_ms"] * 100
+            print(f"{chave_tamanho:>6} {nome_etapa:32} p50 {anterior['p50_ms']:>10.2f} -> "
+                  f"{estatisticas['p50_ms']:>10.2f} ms ({variacao:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de contratos (planilhas sintéticas).")
+    parser.add_argument('--tamanhos', default='10,1000,50000', help="Quantidades de linhas, separadas por vírgula.")
+    parser.add_argument('--repeticoes', type=int, default=10, help="Repetições das etapas por planilha inteira.")
+    parser.add_argument('--amostras-linhas', type=int, default=1000, help="Linhas amostradas nas etapas por contrato.")
+    parser.add_argument('--amostras-pdf', type=int, default=20, help="Contratos renderizados pelo WeasyPrint/jobs.")
+    parser.add_argument('--tamanho-lote', type=int, default=50, help="Contratos no POST /gerar_contratos_lote.")
+    parser.add_argument('--latencia-ms', type=float, default=0.0, help="Latência simulada por chamada à API do Sheets.")
+    parser.add_argument('--workers', type=int, default=None, help="PDF_POOL_WORKERS do pool de renderização.")
+    parser.add_argument('--com-cache-pdf', action='store_true', help="Mantém o cache de PDFs ligado.")
+    parser.add_argument('--sem-weasyprint', action='store_true', help="Pula as etapas que geram PDF.")
+    parser.add_argument('--saida', default=None, help="Arquivo JSON de saída (padrão: stdout).")
+    parser.add_argument('--comparar', default=None, help="JSON de uma execução anterior para comparar o p50.")
+    args = parser.parse_args(argv)
+    tamanhos = [int(tamanho) for tamanho in args.tamanhos.split(',') if tamanho.strip()]
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_contratos_') as diretorio_temporario:
+        preparar_ambiente(diretorio_temporario, args)
+        segundos_importacao, app_modulo = cronometrar(__import__, 'app')
+        segundos_create_app, app = cronometrar(app_modulo.create_app)
+        from utils.google_services import definir_cliente_sheets
+        cliente = ClienteFalso()
+        definir_cliente_sheets(cliente)
+        logger = logging.getLogger('benchmark')
+
+        resultados = {}
+        for total_linhas in tamanhos:
+            resultados[str(total_linhas)] = benchmark_tamanho(total_linhas, cliente, app, args, logger)
+
+    saida = {
+        "meta": {
+            "commit": commit_atual(),
+            "data": datetime.datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "importacao_app_s": segundos_importacao,
+            "inicializacao_app_s": segundos_create_app,
+            "parametros": vars(args),
+        },
+        "resultados": resultados,
+    }
+    texto_json = json.dumps(saida, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f_saida:
+            f_saida.write(texto_json)
+        imprimir_resumo(resultados)
+    else:
+        print(texto_json)
+    if args.comparar:
+        comparar(resultados, args.comparar)
+
+
+if __name__ == '__main__':
+    main()
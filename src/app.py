@@ -1,65 +1,169 @@
 import os
-import pandas as pd 
+import time
+import functools
 import logging
 import datetime
 
 # Imports do Flask e extensões
 from flask import (Flask, render_template, request, redirect, url_for, 
-                   flash, session, send_from_directory)
-from flask_sqlalchemy import SQLAlchemy
+                   flash, session, send_from_directory, Response, jsonify,
+                   stream_with_context, g, current_app)
 from flask_session import Session
+from sqlalchemy import event
+
+# Imports dos seus módulos utils.
+# Os módulos pesados (pandas, WeasyPrint, gspread/oauth2client, python-docx) são importados dentro das
+# rotas que os usam: importar o app fica leve, e no gunicorn cada worker os carrega no aquecimento
+# (iniciar_servicos) ou no wsgi.py (precarregar_modulos), antes do fork.
+from utils.dataset_store import (salvar_dataset, obter_dataset, obter_linha, obter_linha_por_cpf, obter_linhas,
+                                 colunas_dataset, obter_snapshot_para_sincronizacao,
+                                 aplicar_diff)
+from utils.zip_stream import stream_zip
+from utils.indice_donatarios import obter_indice
+from utils.armazenamento_contratos import (obter_contrato, obter_contrato_do_job, listar_contratos_do_job,
+                                           listar_contratos, caminho_contrato, pasta_contratos, iniciar_retencao)
+from utils.metricas import TEMPO_REQUISICAO, TEMPO_ETAPA, ERROS, exportar_prometheus, configurar_multiprocesso
+from utils.migracoes_banco import migrar_esquema
+from extensions import db
+from models import ContratoJob
+from config import Config # Sua classe de configuração
 
-# Imports para novo fluxo de PDF
-from jinja2 import Environment, FileSystemLoader
-import markdown2 # Para converter Markdown em HTML
-from weasyprint import HTML, CSS # Para converter HTML em PDF
 
-# Imports dos seus módulos utils
-from utils.google_services import get_sheet_data 
-from utils.contract_processing import preparar_dados_para_contrato
-# Outros imports que você tinha
-from num2words import num2words # Usado em preparar_dados_para_contrato
-from config import Config # Sua classe de configuração
+def _configurar_sqlite(conexao_dbapi, _registro_conexao):
+    """
+    WAL: leituras não bloqueiam a escrita (e vice-versa) entre os workers do gunicorn que
+    compartilham o SQLite de sessões/jobs/datasets; busy_timeout espera o lock em vez de falhar.
+    """
+    cursor = conexao_dbapi.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def create_app(config_objeto=Config, iniciar_servicos_agora=True):
+    """
+    Cria e configura o app Flask. Com iniciar_servicos_agora=False (gunicorn com preload_app,
+    ver wsgi.py e gunicorn.conf.py) não sobe threads nem o pool de processos: cada worker chama
+    iniciar_servicos depois do fork.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_objeto) # Carrega configurações do config.py
+    app.template_folder = 'templates' # Onde estão index.html, sucesso_geracao.html
+    app.static_folder = 'static'    # Onde podem estar CSS, JS, imagens
+    app.logger.setLevel(app.config.get('LOG_LEVEL', 'INFO')) # LOG_LEVEL=DEBUG para depurar
+
+    # Inicializa o SQLAlchemy (instância em extensions.py, compartilhada com models.py)
+    db.init_app(app)
+    app.config['SESSION_SQLALCHEMY'] = db # Diz ao Flask-Session para usar esta instância db
+
+    # Inicializa a extensão Flask-Session
+    Session(app)
+
+    # --- Criação das tabelas ---
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _configurar_sqlite)
+        migrar_esquema(db.engine, app.logger)
+        db.create_all()
+        app.logger.info("Tabelas de sessões, jobs e datasets verificadas/criadas no banco de dados SQLite.")
+
+    app.before_request(_iniciar_cronometro)
+    app.after_request(_registrar_tempo_requisicao)
+    registrar_rotas(app)
+
+    if iniciar_servicos_agora:
+        iniciar_servicos(app)
+    return app
+
+
+def registrar_rotas(app):
+    """Registra as rotas com os mesmos nomes de endpoint usados pelos templates (url_for)."""
+    app.add_url_rule('/', 'index', index, methods=['GET', 'POST'])
+    app.add_url_rule('/api/donatarios', 'api_donatarios', api_donatarios, methods=['GET'])
+    app.add_url_rule('/gerar_contrato', 'gerar_contrato', gerar_contrato, methods=['POST'])
+    app.add_url_rule('/jobs', 'submeter_job_contrato', submeter_job_contrato, methods=['POST'])
+    app.add_url_rule('/jobs/<job_id>', 'status_job_contrato', status_job_contrato, methods=['GET'])
+    app.add_url_rule('/jobs/<job_id>/resultado', 'resultado_job_contrato', resultado_job_contrato, methods=['GET'])
+    # Nome, CPF e PDF de contratos já gerados: só para a sessão com a planilha carregada, como nas rotas de geração
+    app.add_url_rule('/api/contratos', 'api_contratos', _exigir_planilha_na_sessao(api_contratos), methods=['GET'])
+    app.add_url_rule('/api/contratos/<contrato_id>', 'api_contrato', _exigir_planilha_na_sessao(api_contrato),
+                     methods=['GET'])
+    app.add_url_rule('/contratos/<contrato_id>/download', 'download_contrato_gerado',
+                     _exigir_planilha_na_sessao(download_contrato_gerado))
+    app.add_url_rule('/gerar_contratos_lote', 'gerar_contratos_lote', gerar_contratos_lote, methods=['POST'])
+    app.add_url_rule('/metrics', 'metricas', metricas)
+    app.add_url_rule('/download_contrato/<path:filename>', 'download_contrato', download_contrato)
+
+
+def precarregar_modulos():
+    """
+    Importa os módulos pesados sem criar estado (threads, pools, fontes). Chamado no processo mestre
+    do gunicorn (preload_app), para os workers herdarem o código já carregado via fork.
+    """
+    import utils.google_services # noqa: F401 (gspread, oauth2client)
+    import utils.pdf_rendering # noqa: F401 (WeasyPrint, markdown2)
+    import utils.job_queue # noqa: F401
+    import utils.docx_rendering # noqa: F401 (python-docx)
+
+
+def iniciar_servicos(app):
+    """
+    Aquece os caches do processo e sobe os serviços em segundo plano. Roda uma vez por processo:
+    direto em create_app (servidor de desenvolvimento) ou no post_fork de cada worker do gunicorn.
+    """
+    from utils.pdf_rendering import aquecer_pool, compilar_templates, MARKDOWN_TEMPLATE_DIR
+    from utils.job_queue import iniciar_workers
+    from utils.google_services import get_google_sheets_client
+    from utils.docx_rendering import get_template_docx
+
+    # O ambiente Jinja2 dos templates Markdown fica em utils/pdf_rendering.py,
+    # para ser compartilhado com os processos de renderização em lote.
+    app.logger.info(f"Templates Markdown carregados de: {MARKDOWN_TEMPLATE_DIR}")
+    if app.config.get('TEMPLATE_COMPILADO'):
+        compilar_templates(app.logger)
+
+    # Sobe o pool de renderização antes das threads de jobs (fork sem threads extras no processo)
+    if app.config.get('PDF_AQUECER_RENDERIZADOR'):
+        aquecer_pool(app.logger)
+
+    # Modelo DOCX e cliente do Google Sheets: falhas aqui só adiam o custo para a 1ª requisição
+    try:
+        get_template_docx(app.config['DOCX_TEMPLATE_PATH'], app.logger)
+    except Exception as e_docx:
+        app.logger.warning(f"Modelo DOCX não indexado no aquecimento: {e_docx}")
+    if os.path.exists(app.config.get('CREDENTIALS_FILE') or ''):
+        get_google_sheets_client(app.logger, app.config['CREDENTIALS_FILE'])
 
-# Configuração inicial do Flask
-app = Flask(__name__)
-app.config.from_object(Config) # Carrega configurações do config.py
-app.template_folder = 'templates' # Onde estão index.html, sucesso_geracao.html
-app.static_folder = 'static'    # Onde podem estar CSS, JS, imagens
-app.logger.setLevel(logging.DEBUG)
+    # Séries deste processo no diretório compartilhado, somadas pelo /metrics de qualquer worker
+    if app.config.get('PROMETHEUS_MULTIPROC_DIR'):
+        configurar_multiprocesso(app.config['PROMETHEUS_MULTIPROC_DIR'], app.config.get('METRICAS_INTERVALO_GRAVACAO', 5))
 
-# Configurações que vêm do Config (UPLOAD_FOLDER, CREDENTIALS_FILE)
-# Elas serão acessadas via app.config['CHAVE'] ou app.config.get('CHAVE')
+    # Workers em segundo plano que processam a fila de geração de PDF
+    iniciar_workers(app)
+    # Limpeza periódica de contratos_gerados (CONTRATOS_RETENCAO_DIAS / CONTRATOS_MAX_BYTES)
+    iniciar_retencao(app)
 
-# Inicializa o SQLAlchemy
-db = SQLAlchemy(app)
-app.config['SESSION_SQLALCHEMY'] = db # Diz ao Flask-Session para usar esta instância db
 
-# Inicializa a extensão Flask-Session
-server_session = Session(app)
+def _iniciar_cronometro():
+    g.inicio_requisicao = time.perf_counter()
 
-# --- Criação da Tabela de Sessões ---
-with app.app_context():
-    db.create_all()
-    app.logger.info("Tabela de sessões verificada/criada no banco de dados SQLite.")
 
-# Configurar o ambiente Jinja2 para carregar templates Markdown
-# Assumindo que app.py está em /app e templates em /app/templates/
-markdown_template_dir = os.path.join(os.path.dirname(__file__), 'templates', 'markdown_templates')
-jinja_markdown_env = Environment(
-    loader=FileSystemLoader(markdown_template_dir),
-    autoescape=True # Autoescape é bom para HTML, pode não ser estritamente necessário para MD->HTML
-)
-app.logger.info(f"Ambiente Jinja2 para Markdown configurado para carregar de: {markdown_template_dir}")
+def _registrar_tempo_requisicao(response):
+    if request.endpoint and hasattr(g, 'inicio_requisicao'):
+        TEMPO_REQUISICAO.observar(time.perf_counter() - g.inicio_requisicao, rota=request.endpoint)
+    return response
 
 
-@app.route('/', methods=['GET', 'POST'])
 def index():
-    app.logger.info("--- FUNÇÃO INDEX ACESSADA (FLUXO MARKDOWN) ---")
+    from utils.google_services import (get_sheet_records, extrair_id_planilha, sincronizar_planilha,
+                                       revisao_em_cache, limpar_cache_planilhas)
+    current_app.logger.info("--- FUNÇÃO INDEX ACESSADA (FLUXO MARKDOWN) ---")
     
-    donatarios_df = None
+    registros_planilha = None
     # path_template_docx não é mais necessário aqui
-    donatarios_para_exibicao = []
+    # A tabela de donatários é carregada pela página via /api/donatarios (paginada)
+    total_donatarios = 0
 
     sheet_url_value = session.get('latest_sheet_url', '')
     # doc_url_value não é mais necessário se o template for local
@@ -74,72 +178,130 @@ def index():
 
         if not sheet_url_from_form: # Apenas a URL da planilha é obrigatória agora
             flash("Por favor, forneça a URL/ID da Planilha Google.", "danger")
-            session.pop('donatarios_data_json', None)
+            session.pop('dataset_ref', None)
         else:
-            app.logger.info(f"Carregando dados da planilha: {sheet_url_from_form}")
-            # A função get_sheet_data em utils.google_services precisa ser ajustada
-            # para receber app.config['CREDENTIALS_FILE'] ou o caminho diretamente.
-            # Por agora, vamos assumir que ela consegue pegar de Config importado no módulo dela.
-            donatarios_df = get_sheet_data(sheet_url_from_form, app.logger)
-
-            if donatarios_df is not None:
-                app.logger.info(f"donatarios_df carregado com {len(donatarios_df)} linhas.")
-                session['donatarios_data_json'] = donatarios_df.to_json(orient='records')
-                app.logger.info("Dados completos dos donatários salvos na sessão.")
-                flash("Planilha carregada com sucesso!", "success") # Mensagem simplificada
+            sheet_id = extrair_id_planilha(sheet_url_from_form)
+            opcoes_dataset = dict(
+                coluna_nome=current_app.config.get('COLUNA_NOME_PADRAO', 'NOME'),
+                coluna_cpf=current_app.config.get('COLUNA_CPF_PADRAO', 'CPF'),
+                versoes_mantidas=current_app.config.get('DATASET_VERSOES_MANTIDAS', 3),
+            )
+            snapshot = obter_snapshot_para_sincronizacao(sheet_id) if current_app.config.get('SHEETS_SYNC_INCREMENTAL') else None
+            sincronizacao = None
+            if snapshot is not None:
+                current_app.logger.info(f"Sincronizando planilha incrementalmente: {sheet_url_from_form}")
+                with TEMPO_ETAPA.medir(etapa='sheets_sync'):
+                    sincronizacao = sincronizar_planilha(
+                        sheet_url_from_form, current_app.logger, snapshot,
+                        coluna_chave=opcoes_dataset['coluna_nome'],
+                        verificar_edicoes=current_app.config.get('SHEETS_SYNC_VERIFICAR_EDICOES', True),
+                        tamanho_bloco=current_app.config.get('SHEETS_SYNC_TAMANHO_BLOCO', 500),
+                    )
+                if sincronizacao is None:
+                    ERROS.inc(etapa='sheets_sync')
+
+            if sincronizacao is not None:
+                with TEMPO_ETAPA.medir(etapa='dataset_store'):
+                    if sincronizacao['modo'] == 'completo':
+                        session['dataset_ref'] = salvar_dataset(sheet_id, sincronizacao['registros'], current_app.logger,
+                                                                revisao=sincronizacao['revisao'], **opcoes_dataset)
+                    else:
+                        session['dataset_ref'] = aplicar_diff(sheet_id, snapshot['versao'], sincronizacao,
+                                                              current_app.logger, **opcoes_dataset)
+                if sincronizacao['alteracoes'] or sincronizacao['removidas']:
+                    limpar_cache_planilhas(sheet_id)
+                flash(f"Planilha sincronizada: {len(sincronizacao['adicionadas'])} linha(s) adicionada(s), "
+                      f"{len(sincronizacao['alteradas'])} alterada(s), {len(sincronizacao['removidas'])} removida(s).",
+                      "success")
             else:
-                app.logger.warning("Falha ao carregar donatarios_df da planilha.")
-                session.pop('donatarios_data_json', None)
-                # flash já deve ter sido chamado por get_sheet_data em caso de erro
+                current_app.logger.info(f"Carregando dados da planilha: {sheet_url_from_form}")
+                with TEMPO_ETAPA.medir(etapa='sheets_fetch'):
+                    registros_planilha = get_sheet_records(sheet_url_from_form, current_app.logger)
+
+                if registros_planilha is not None:
+                    current_app.logger.info(f"Planilha carregada com {len(registros_planilha)} linhas.")
+                    # Os dados ficam no dataset store; a sessão guarda só a referência {sheet_id, versao}
+                    with TEMPO_ETAPA.medir(etapa='dataset_store'):
+                        session['dataset_ref'] = salvar_dataset(sheet_id, registros_planilha, current_app.logger,
+                                                                revisao=revisao_em_cache(sheet_id), **opcoes_dataset)
+                    current_app.logger.info("Dados dos donatários salvos no dataset store.")
+                    flash("Planilha carregada com sucesso!", "success") # Mensagem simplificada
+                else:
+                    current_app.logger.warning("Falha ao carregar os registros da planilha.")
+                    ERROS.inc(etapa='sheets_fetch')
+                    session.pop('dataset_ref', None)
+                    # flash já deve ter sido chamado por get_sheet_records em caso de erro
     
     # Lógica comum para GET e para continuar após POST
-    if donatarios_df is None and 'donatarios_data_json' in session:
-        app.logger.info("Tentando carregar donatarios_df da sessão.")
-        try:
-            donatarios_df = pd.read_json(session['donatarios_data_json'], orient='records')
-            app.logger.info(f"donatarios_df carregado da sessão com {len(donatarios_df)} linhas.")
-        except Exception as e:
-            app.logger.error(f"Erro ao ler 'donatarios_data_json' da sessão: {e}", exc_info=True)
-            session.pop('donatarios_data_json', None)
-            donatarios_df = None
-
-    # Processa donatarios_df para exibição
-    if donatarios_df is not None and not donatarios_df.empty:
-        app.logger.info("Processando donatarios_df para criar donatarios_para_exibicao.")
-        nome_coluna_nome = app.config.get('COLUNA_NOME_PADRAO', 'NOME') # Exemplo de pegar de config
-        nome_coluna_cpf = app.config.get('COLUNA_CPF_PADRAO', 'CPF')
+    dataset = obter_dataset(session.get('dataset_ref'))
+    if dataset is None and 'dataset_ref' in session:
+        current_app.logger.warning("Dataset referenciado na sessão não existe mais.")
+        session.pop('dataset_ref', None)
+
+    # Confere as colunas NOME/CPF; as linhas em si são servidas por /api/donatarios
+    if dataset is not None and dataset.total_linhas > 0:
+        nome_coluna_nome = current_app.config.get('COLUNA_NOME_PADRAO', 'NOME') # Exemplo de pegar de config
+        nome_coluna_cpf = current_app.config.get('COLUNA_CPF_PADRAO', 'CPF')
+        colunas = colunas_dataset(dataset)
 
         colunas_identificadas = []
-        if nome_coluna_nome in donatarios_df.columns: colunas_identificadas.append(nome_coluna_nome)
-        else: app.logger.warning(f"ALERTA: Coluna '{nome_coluna_nome}' NÃO encontrada na planilha.")
-        if nome_coluna_cpf in donatarios_df.columns: colunas_identificadas.append(nome_coluna_cpf)
-        else: app.logger.warning(f"ALERTA: Coluna '{nome_coluna_cpf}' NÃO encontrada na planilha.")
+        if nome_coluna_nome in colunas: colunas_identificadas.append(nome_coluna_nome)
+        else: current_app.logger.warning(f"ALERTA: Coluna '{nome_coluna_nome}' NÃO encontrada na planilha.")
+        if nome_coluna_cpf in colunas: colunas_identificadas.append(nome_coluna_cpf)
+        else: current_app.logger.warning(f"ALERTA: Coluna '{nome_coluna_cpf}' NÃO encontrada na planilha.")
         
         if colunas_identificadas:
-            donatarios_para_exibicao = donatarios_df[colunas_identificadas].to_dict(orient='records')
-            app.logger.info(f"donatarios_para_exibicao preparado com {len(donatarios_para_exibicao)} registros.")
+            total_donatarios = dataset.total_linhas
         else:
-            app.logger.error("ERRO: Nenhuma das colunas (NOME/CPF) foi encontrada. Tabela vazia.")
-            donatarios_para_exibicao = []
-    else:
-        donatarios_para_exibicao = []
+            current_app.logger.error("ERRO: Nenhuma das colunas (NOME/CPF) foi encontrada. Tabela vazia.")
 
-    app.logger.info(f"Antes de renderizar index: len(donatarios_para_exibicao) = {len(donatarios_para_exibicao)}")
+    current_app.logger.info(f"Antes de renderizar index: total_donatarios = {total_donatarios}")
     return render_template('index.html', 
-                           donatarios_exibicao=donatarios_para_exibicao,
+                           total_donatarios=total_donatarios,
+                           por_pagina=current_app.config.get('DONATARIOS_POR_PAGINA', 50),
                            sheet_url_value=sheet_url_value)
 
 
-@app.route('/gerar_contrato', methods=['POST'])
+def api_donatarios():
+    """
+    Lista paginada dos donatários do snapshot da sessão, com busca por prefixo/substring
+    no NOME (sem acentos/maiúsculas) e no CPF (só dígitos).
+    Parâmetros: q, pagina (a partir de 1), por_pagina (limitado a DONATARIOS_POR_PAGINA_MAXIMO).
+    """
+    if obter_dataset(session.get('dataset_ref')) is None:
+        return jsonify({"erro": "Sessão expirada ou dados dos donatários não encontrados."}), 400
+    try:
+        pagina = max(1, int(request.args.get('pagina', 1)))
+        por_pagina = int(request.args.get('por_pagina', current_app.config.get('DONATARIOS_POR_PAGINA', 50)))
+    except (ValueError, TypeError):
+        return jsonify({"erro": "Parâmetros de paginação inválidos."}), 400
+    por_pagina = min(max(1, por_pagina), current_app.config.get('DONATARIOS_POR_PAGINA_MAXIMO', 500))
+    termo = request.args.get('q', '').strip()
+
+    with TEMPO_ETAPA.medir(etapa='listagem'):
+        indice = obter_indice(session['dataset_ref'])
+        total, itens = indice.pagina(termo, pagina, por_pagina)
+    return jsonify({
+        "total": total,
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "total_paginas": (total + por_pagina - 1) // por_pagina,
+        "q": termo,
+        "itens": itens,
+    })
+
+
 def gerar_contrato():
-    app.logger.info("--- ROTA GERAR_CONTRATO (FLUXO MARKDOWN/WEASYPRINT) ---")
+    from utils.job_queue import submeter_job
+    current_app.logger.info("--- ROTA GERAR_CONTRATO (FLUXO MARKDOWN/WEASYPRINT) ---")
 
     selected_donatario_index_str = request.form.get('donatario_selecionado_index')
     valor_doacao_str = request.form.get('valor_doacao')
     aliquota_str = request.form.get('aliquota')
     # doc_template_path não é mais necessário do formulário
 
-    app.logger.debug(f"Formulário recebido - Índice Str: {selected_donatario_index_str}, Valor Str: {valor_doacao_str}, Alíquota Str: {aliquota_str}")
+    if current_app.logger.isEnabledFor(logging.DEBUG):
+        current_app.logger.debug(f"Formulário recebido - Índice Str: {selected_donatario_index_str}, Valor Str: {valor_doacao_str}, Alíquota Str: {aliquota_str}")
 
     if not all([selected_donatario_index_str, valor_doacao_str, aliquota_str]):
         flash("Dados incompletos para gerar o contrato.", "danger")
@@ -151,106 +313,463 @@ def gerar_contrato():
         aliquota_percentual = float(aliquota_str)
     except (ValueError, TypeError) as e_conv:
         flash("Valores inválidos ou ausentes para os campos do formulário.", "danger")
-        app.logger.error(f"Erro ao converter dados do formulário: {e_conv}", exc_info=True)
+        current_app.logger.error(f"Erro ao converter dados do formulário: {e_conv}", exc_info=True)
         return redirect(url_for('index'))
 
-    donatarios_json_str = session.get('donatarios_data_json')
-    if not donatarios_json_str:
+    if obter_dataset(session.get('dataset_ref')) is None:
         flash("Sessão expirada ou dados dos donatários não encontrados.", "warning")
         return redirect(url_for('index'))
 
-    try:
-        all_donatarios_list = pd.read_json(donatarios_json_str, orient='records').to_dict(orient='records')
-    except Exception as e_json:
-        flash("Erro ao processar dados dos donatários da sessão.", "danger")
-        app.logger.error(f"Erro ao ler donatarios_data_json: {e_json}", exc_info=True)
-        return redirect(url_for('index'))
-
-    if not (0 <= selected_donatario_index < len(all_donatarios_list)):
+    with TEMPO_ETAPA.medir(etapa='dataset_lookup'):
+        selected_donatario_data = obter_linha(session['dataset_ref'], selected_donatario_index)
+    if selected_donatario_data is None:
         flash("Índice de donatário selecionado inválido.", "danger")
         return redirect(url_for('index'))
     
-    selected_donatario_data = all_donatarios_list[selected_donatario_index]
-    app.logger.info(f"Dados do Donatário: {selected_donatario_data.get('NOME')}")
+    current_app.logger.info(f"Dados do Donatário: {selected_donatario_data.get('NOME')}")
+
+    if request.form.get('formato') == 'docx':
+        # DOCX editável: preenchimento do modelo já indexado leva milissegundos, não passa pela fila
+        try:
+            return _resposta_docx(selected_donatario_data, valor_bruto_doacao, aliquota_percentual)
+        except Exception as e_docx:
+            ERROS.inc(etapa='docx')
+            current_app.logger.error(f"Erro ao gerar o contrato DOCX: {e_docx}", exc_info=True)
+            flash(f"Erro ao gerar contrato DOCX: {str(e_docx)[:100]}", "danger")
+            return redirect(url_for('index'))
 
     try:
-        contexto_contrato = preparar_dados_para_contrato(
-            selected_donatario_data, valor_bruto_doacao, aliquota_percentual, app.logger
-        )
-
-        template_md = jinja_markdown_env.get_template('CONTRATO_MODELO_DOACAO.md.jinja') # Nome do seu arquivo
-        markdown_renderizado = template_md.render(contexto_contrato)
-        app.logger.debug("Template Markdown renderizado com Jinja2.")
-
-        html_content = markdown2.markdown(markdown_renderizado, extras=["tables", "smarty-pants", "cuddled-lists", "footnotes"])
-        app.logger.debug("Markdown convertido para HTML.")
-        # app.logger.debug(f"HTML Gerado (primeiros 500 chars): {html_content[:500]}") # Loga o início do HTML
-        # Salvar HTML para depuração
-        # with open(os.path.join(app.config.get('UPLOAD_FOLDER', 'uploads'), 'debug_contrato.html'), 'w', encoding='utf-8') as f_html:
-            # f_html.write(html_content)
-        
-        # app.logger.info("HTML de depuração salvo em uploads/debug_contrato.html")
+        with TEMPO_ETAPA.medir(etapa='enfileirar'):
+            job = submeter_job(selected_donatario_data, valor_bruto_doacao, aliquota_percentual,
+                               request.url_root, current_app.logger,
+                               max_tentativas=current_app.config.get('JOBS_MAX_TENTATIVAS', 3),
+                               upload_folder=current_app.config.get('UPLOAD_FOLDER', 'uploads'))
+    except Exception as e_geral:
+        db.session.rollback()
+        ERROS.inc(etapa='enfileirar')
+        current_app.logger.error(f"Erro ao enfileirar geração do contrato: {e_geral}", exc_info=True)
+        flash(f"Erro ao gerar contrato: {str(e_geral)[:100]}", "danger")
+        return redirect(url_for('index'))
 
-        # Opcional: Carregar CSS
-        # css_filepath = os.path.join(app.static_folder, 'css', 'contrato_estilo.css')
-        # contrato_css_obj = CSS(filename=css_filepath) if os.path.exists(css_filepath) else None
-        contrato_css_obj = None # Comece sem CSS externo para simplificar
+    # A página de sucesso acompanha o job e libera o download quando o PDF estiver pronto
+    return render_template('sucesso_geracao.html',
+                           job_id=job.id,
+                           nome_donatario=selected_donatario_data.get('NOME'))
 
-        data_atual_obj = datetime.date.today()
-        nome_donatario_arq = "".join(c if c.isalnum() else "_" for c in selected_donatario_data.get('NOME', 'donatario'))
-        nome_arquivo_pdf = f"CONTRATO_{nome_donatario_arq}_{data_atual_obj.strftime('%Y%m%d')}.pdf"
-        
-        pasta_contratos = os.path.join(app.config.get('UPLOAD_FOLDER', 'uploads'), 'contratos_gerados')
-        if not os.path.exists(pasta_contratos): os.makedirs(pasta_contratos)
-        
-        caminho_pdf_final = os.path.join(pasta_contratos, nome_arquivo_pdf)
 
-        app.logger.info(f"Gerando PDF com WeasyPrint para: {caminho_pdf_final}")
-        html_doc = HTML(string=html_content, base_url=request.url_root)
-        
-        css_files = []
-        css_filepath = os.path.join(app.static_folder, 'css', 'contrato_estilo.css')
-        if os.path.exists(css_filepath):
-            css_files.append(CSS(filename=css_filepath))
-            app.logger.info(f"CSS '{css_filepath}' carregado para o PDF.")
-        else:
-            app.logger.warning(f"Arquivo CSS '{css_filepath}' não encontrado. Usando estilos padrão do browser/WeasyPrint.")
-        
-        if not contrato_css_obj:
-            # html_doc.write_pdf(caminho_pdf_final, stylesheets=[contrato_css_obj])
-            html_doc.write_pdf(caminho_pdf_final, stylesheets=css_files if css_files else None)
-        else:
-            html_doc.write_pdf(caminho_pdf_final)
-        
-        app.logger.info(f"Arquivo PDF gerado: {caminho_pdf_final}")
+MIMETYPE_DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
 
-        flash(f"Contrato PDF para {selected_donatario_data.get('NOME')} gerado com sucesso!", "success")
-        return render_template('sucesso_geracao.html',
-                               nome_arquivo_pdf=nome_arquivo_pdf,
-                               nome_donatario=selected_donatario_data.get('NOME'))
 
-    except Exception as e_geral:
-        app.logger.error(f"Erro ao gerar contrato (Markdown/WeasyPrint): {e_geral}", exc_info=True)
-        flash(f"Erro ao gerar contrato: {str(e_geral)[:100]}", "danger")
+def _resposta_docx(dados_donatario, valor_bruto_doacao, aliquota_percentual):
+    """Gera o contrato editável (DOCX) a partir do modelo indexado e devolve o arquivo para download."""
+    from utils.contract_processing import preparar_dados_para_contrato
+    from utils.docx_rendering import gerar_docx_bytes
+    from utils.pdf_rendering import nome_arquivo_contrato
+    with TEMPO_ETAPA.medir(etapa='preparar_dados'):
+        contexto_contrato = preparar_dados_para_contrato(dados_donatario, valor_bruto_doacao, aliquota_percentual, current_app.logger)
+    with TEMPO_ETAPA.medir(etapa='docx'):
+        docx_bytes = gerar_docx_bytes(contexto_contrato, current_app.logger, current_app.config['DOCX_TEMPLATE_PATH'])
+    nome_arquivo = nome_arquivo_contrato(dados_donatario.get('NOME'), extensao='docx')
+    return Response(docx_bytes, mimetype=MIMETYPE_DOCX,
+                    headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}"'})
+
+
+def _dados_requisicao_job():
+    """Lê os campos do contrato de um JSON ou formulário, no mesmo formato de gerar_contrato."""
+    dados_requisicao = request.get_json(silent=True) if request.is_json else request.form.to_dict()
+    return dados_requisicao or {}
+
+
+def submeter_job_contrato():
+    """Enfileira a geração de um contrato e retorna o id do job (202) para acompanhamento."""
+    from utils.job_queue import submeter_job
+    dados_requisicao = _dados_requisicao_job()
+    try:
+        valor_bruto_doacao = float(dados_requisicao.get('valor_doacao'))
+        aliquota_percentual = float(dados_requisicao.get('aliquota'))
+        # O donatário pode ser informado pelo índice da linha ou pelo CPF
+        cpf_donatario = dados_requisicao.get('cpf')
+        selected_donatario_index = None if cpf_donatario else int(dados_requisicao.get('donatario_selecionado_index'))
+    except (ValueError, TypeError):
+        return jsonify({"erro": "Valores inválidos ou ausentes para os campos do contrato."}), 400
+
+    if obter_dataset(session.get('dataset_ref')) is None:
+        return jsonify({"erro": "Sessão expirada ou dados dos donatários não encontrados."}), 400
+    if cpf_donatario:
+        encontrado = obter_linha_por_cpf(session['dataset_ref'], cpf_donatario)
+        dados_donatario = encontrado[1] if encontrado else None
+    else:
+        dados_donatario = obter_linha(session['dataset_ref'], selected_donatario_index)
+    if dados_donatario is None:
+        return jsonify({"erro": "Donatário selecionado não encontrado."}), 400
+
+    job = submeter_job(dados_donatario, valor_bruto_doacao, aliquota_percentual,
+                       request.url_root, current_app.logger,
+                       max_tentativas=current_app.config.get('JOBS_MAX_TENTATIVAS', 3),
+                       upload_folder=current_app.config.get('UPLOAD_FOLDER', 'uploads'))
+    resposta = job.to_dict()
+    resposta["status_url"] = url_for('status_job_contrato', job_id=job.id)
+    resposta["resultado_url"] = url_for('resultado_job_contrato', job_id=job.id)
+    return jsonify(resposta), 202
+
+
+def status_job_contrato(job_id):
+    from utils.job_queue import obter_job
+    job = obter_job(job_id)
+    if job is None:
+        return jsonify({"erro": "Job não encontrado."}), 404
+    resposta = job.to_dict()
+    if job.status == ContratoJob.STATUS_CONCLUIDO:
+        resposta["resultado_url"] = url_for('resultado_job_contrato', job_id=job.id)
+    return jsonify(resposta)
+
+
+def resultado_job_contrato(job_id):
+    from utils.job_queue import obter_job
+    job = obter_job(job_id)
+    if job is None:
+        return jsonify({"erro": "Job não encontrado."}), 404
+    if job.status != ContratoJob.STATUS_CONCLUIDO:
+        return jsonify({"erro": "O PDF ainda não está pronto.", "status": job.status}), 409
+    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+    if job.tipo == ContratoJob.TIPO_PDF_MESCLADO:
+        contratos = listar_contratos_do_job(job.id)
+    else:
+        contratos = [contrato for contrato in [obter_contrato_do_job(job.id)] if contrato is not None]
+    if not contratos or not all(os.path.exists(caminho_contrato(contrato, upload_folder)) for contrato in contratos):
+        # Removido pela retenção. Não cai no arquivo pelo nome: outro contrato pode ter o mesmo nome
+        current_app.logger.info(f"Resultado do job {job.id} pedido, mas o contrato já foi removido.")
+        return jsonify({"erro": "Contrato expirado: o PDF deste job foi removido pela política de retenção.",
+                        "status": job.status}), 410
+    if len(contratos) == 1:
+        return download_contrato_gerado(contratos[0].id)
+
+    # PDF único em vários volumes: ZIP em streaming, lendo um volume por vez do armazenamento
+    def _volumes():
+        for contrato in contratos:
+            with open(caminho_contrato(contrato, upload_folder), 'rb') as f_pdf:
+                yield contrato.nome_arquivo, f_pdf.read()
+
+    return Response(stream_with_context(stream_zip(_volumes())), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{job.nome_arquivo_pdf}"'})
+
+
+def _exigir_planilha_na_sessao(view):
+    """
+    Mesma checagem de acesso das rotas de geração: a sessão precisa ter uma planilha de donatários
+    carregada. Rotas /api/ respondem JSON; as demais voltam para o index com a mensagem.
+    """
+    @functools.wraps(view)
+    def _view_protegida(*args, **kwargs):
+        if obter_dataset(session.get('dataset_ref')) is None:
+            mensagem = "Sessão expirada ou dados dos donatários não encontrados."
+            if request.path.startswith('/api/'):
+                return jsonify({"erro": mensagem}), 400
+            flash(mensagem, "warning")
+            return redirect(url_for('index'))
+        return view(*args, **kwargs)
+    return _view_protegida
+
+
+def api_contratos():
+    """Lista os contratos gerados (mais recentes primeiro), com filtros opcionais cpf e nome."""
+    try:
+        pagina = max(1, int(request.args.get('pagina', 1)))
+        por_pagina = min(max(1, int(request.args.get('por_pagina', 50))), 500)
+    except (ValueError, TypeError):
+        return jsonify({"erro": "Parâmetros de paginação inválidos."}), 400
+    total, contratos = listar_contratos(cpf=request.args.get('cpf'), nome=request.args.get('nome'),
+                                        pagina=pagina, por_pagina=por_pagina)
+    itens = []
+    for contrato in contratos:
+        item = contrato.to_dict()
+        item["download_url"] = url_for('download_contrato_gerado', contrato_id=contrato.id)
+        itens.append(item)
+    return jsonify({"total": total, "pagina": pagina, "por_pagina": por_pagina, "itens": itens})
+
+
+def api_contrato(contrato_id):
+    contrato = obter_contrato(contrato_id)
+    if contrato is None:
+        return jsonify({"erro": "Contrato não encontrado."}), 404
+    resposta = contrato.to_dict()
+    resposta["download_url"] = url_for('download_contrato_gerado', contrato_id=contrato.id)
+    return jsonify(resposta)
+
+
+def download_contrato_gerado(contrato_id):
+    """Baixa um contrato do armazenamento indexado pelo id, com o nome de arquivo original."""
+    contrato = obter_contrato(contrato_id)
+    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+    if contrato is None or not os.path.exists(caminho_contrato(contrato, upload_folder)):
+        current_app.logger.error(f"Download falhou: contrato {contrato_id} não encontrado (removido pela retenção?).")
+        flash("Arquivo não encontrado para download.", "danger")
         return redirect(url_for('index'))
+    current_app.logger.info(f"Download do contrato {contrato_id}: {contrato.nome_arquivo}")
+    return send_from_directory(directory=pasta_contratos(upload_folder), path=contrato.caminho_relativo,
+                               as_attachment=True, download_name=contrato.nome_arquivo)
+
+
+def _parse_indices_lote(indices_brutos, total_donatarios):
+    """Converte 'todos'/'all', lista ou string '1,2,5' em uma lista de índices válidos."""
+    if isinstance(indices_brutos, str):
+        if indices_brutos.strip().lower() in ('all', 'todos'):
+            return list(range(total_donatarios))
+        indices_brutos = [parte for parte in indices_brutos.replace(';', ',').split(',') if parte.strip()]
+    indices = []
+    for indice_bruto in indices_brutos or []:
+        indice = int(indice_bruto)
+        if not (0 <= indice < total_donatarios):
+            raise ValueError(f"Índice de donatário fora do intervalo: {indice}")
+        if indice not in indices:
+            indices.append(indice)
+    return indices
+
+
+def _valores_lote(dados_requisicao, indice):
+    """
+    Retorna (valor_doacao, aliquota) para a linha: usa o valor específico da linha, se houver
+    ('valores' no JSON ou 'valor_doacao_<i>'/'aliquota_<i>' no formulário), senão o valor compartilhado.
+    """
+    por_linha = (dados_requisicao.get('valores') or {}).get(str(indice)) or {}
+    valor_str = por_linha.get('valor_doacao', dados_requisicao.get(f'valor_doacao_{indice}', dados_requisicao.get('valor_doacao')))
+    aliquota_str = por_linha.get('aliquota', dados_requisicao.get(f'aliquota_{indice}', dados_requisicao.get('aliquota')))
+    if valor_str in (None, '') or aliquota_str in (None, ''):
+        raise ValueError(f"Valor da doação ou alíquota ausente para o índice {indice}.")
+    return float(valor_str), float(aliquota_str)
+
+
+def _resposta_pdf_unico(tarefas, registros):
+    """
+    Lote em um único PDF (um contrato por página nova, marcador por donatário). Cada volume de até
+    PDF_MESCLADO_CONTRATOS_POR_VOLUME contratos é renderizado inteiro em um processo do pool;
+    com um volume só, devolve o PDF, senão um ZIP com os volumes.
+    """
+    from utils.pdf_rendering import (renderizar_volume_mesclado_worker, dividir_volumes, mapear_no_pool,
+                                     registrar_metricas_render, nome_arquivo_pdf_unico)
+    contratos = [(registros[tarefa[0]].get('NOME'), tarefa[1]) for tarefa in tarefas]
+    volumes = dividir_volumes(contratos)
+    resultados = mapear_no_pool(renderizar_volume_mesclado_worker,
+                                [(numero, contratos_volume, request.url_root)
+                                 for numero, contratos_volume in enumerate(volumes, start=1)])
+    data_hoje = datetime.date.today().strftime('%Y%m%d')
+    current_app.logger.info(f"Lote em PDF único: {len(contratos)} contratos em {len(volumes)} volume(s).")
+
+    def _volume(resultado):
+        numero_volume, total_contratos, pdf_bytes, tempos_etapas = resultado
+        registrar_metricas_render(tempos_etapas, pdf_bytes)
+        return numero_volume, pdf_bytes
+
+    if len(volumes) == 1:
+        _, resultado, e_render = next(resultados)
+        if e_render is not None:
+            ERROS.inc(etapa='lote_pdf_unico')
+            current_app.logger.error(f"Erro ao gerar o PDF único do lote: {e_render}", exc_info=e_render)
+            raise e_render
+        _, pdf_bytes = _volume(resultado)
+        return Response(pdf_bytes, mimetype='application/pdf',
+                        headers={'Content-Disposition': f'attachment; filename="{nome_arquivo_pdf_unico()}"'})
+
+    def _volumes_prontos():
+        erros = []
+        try:
+            for (numero_volume, _, _), resultado, e_render in resultados:
+                if e_render is not None:
+                    ERROS.inc(etapa='lote_pdf_unico')
+                    current_app.logger.error(f"Erro ao gerar o volume {numero_volume} do PDF único: {e_render}",
+                                             exc_info=e_render)
+                    erros.append(f"Volume {numero_volume}: {e_render}")
+                    continue
+                numero_volume, pdf_bytes = _volume(resultado)
+                yield nome_arquivo_pdf_unico(numero_volume, len(volumes)), pdf_bytes
+            # Um único ERROS.txt no fim (nomes repetidos no ZIP confundem os descompactadores)
+            if erros:
+                yield "ERROS.txt", "\n".join(sorted(erros)).encode('utf-8')
+        finally:
+            resultados.close()
+
+    return Response(stream_with_context(stream_zip(_volumes_prontos())),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="CONTRATOS_{data_hoje}.zip"'})
+
+
+def _enfileirar_pdf_unico(indices, registros, valores_por_indice):
+    """
+    PDF único acima de PDF_MESCLADO_LIMITE_SINCRONO contratos: em vez de renderizar na thread da
+    requisição, cria um job (utils/job_queue.py) e devolve onde acompanhar e baixar o resultado.
+    """
+    from utils.job_queue import submeter_job_pdf_mesclado
+    job = submeter_job_pdf_mesclado([(registros[indice], *valores_por_indice[indice]) for indice in indices],
+                                    request.url_root, current_app.logger,
+                                    max_tentativas=current_app.config.get('JOBS_MAX_TENTATIVAS', 3))
+    status_url = url_for('status_job_contrato', job_id=job.id)
+    resultado_url = url_for('resultado_job_contrato', job_id=job.id)
+    if request.is_json:
+        resposta = job.to_dict()
+        resposta["status_url"] = status_url
+        resposta["resultado_url"] = resultado_url
+        return jsonify(resposta), 202
+    flash(f"O PDF único com {len(indices)} contratos foi enviado para a fila de geração. "
+          f"Acompanhe em {status_url} e baixe em {resultado_url} quando estiver pronto.", "info")
+    return redirect(url_for('index'))
+
+
+def _resposta_docx_lote(tarefas, registros):
+    """Lote em DOCX: ZIP em streaming com um contrato editável por donatário, todos a partir do mesmo modelo indexado."""
+    from utils.docx_rendering import get_template_docx
+    from utils.pdf_rendering import nome_arquivo_contrato
+    # Indexa (ou valida) o modelo antes de começar a resposta, para o erro voltar como mensagem e não como ZIP quebrado
+    template_docx = get_template_docx(current_app.config['DOCX_TEMPLATE_PATH'], current_app.logger)
+
+    def _arquivos_docx():
+        for indice, contexto_contrato, _, _ in tarefas:
+            with TEMPO_ETAPA.medir(etapa='docx'):
+                docx_bytes = template_docx.preencher(contexto_contrato)
+            nome_arquivo = nome_arquivo_contrato(registros[indice].get('NOME'), extensao='docx')
+            yield f"{indice:05d}_{nome_arquivo}", docx_bytes
+        current_app.logger.info(f"Lote DOCX concluído: {len(tarefas)} contratos gerados.")
+
+    nome_zip = f"CONTRATOS_DOCX_{datetime.date.today().strftime('%Y%m%d')}.zip"
+    return Response(stream_with_context(stream_zip(_arquivos_docx())),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{nome_zip}"'})
+
+
+def gerar_contratos_lote():
+    """
+    Gera os contratos de vários donatários em paralelo (pool de processos) e devolve
+    um ZIP em streaming, com cada PDF enviado assim que fica pronto.
+    Aceita JSON ({"indices": "all" | [0, 3], "valor_doacao": ..., "aliquota": ..., "valores": {"3": {...}}})
+    ou formulário (indices="todos" ou "0,3", valor_doacao, aliquota, valor_doacao_<i>, aliquota_<i>).
+    Com formato="pdf", devolve todos os contratos em um único PDF (ver _resposta_pdf_unico);
+    com formato="docx", um ZIP de contratos editáveis (ver _resposta_docx_lote).
+    """
+    from utils.pdf_rendering import (renderizar_contrato_worker, preparar_tarefas_contratos, mapear_no_pool,
+                                     registrar_metricas_render)
+    from utils.pdf_cache import get_cache_pdf, chave_cache_contrato
+    current_app.logger.info("--- ROTA GERAR_CONTRATOS_LOTE ---")
+
+    def _erro(mensagem, categoria="danger"):
+        if request.is_json:
+            return jsonify({"erro": mensagem}), 400
+        flash(mensagem, categoria)
+        return redirect(url_for('index'))
+
+    dados_requisicao = request.get_json(silent=True) if request.is_json else request.form.to_dict()
+    if not dados_requisicao:
+        return _erro("Dados incompletos para gerar os contratos em lote.")
+
+    dataset = obter_dataset(session.get('dataset_ref'))
+    if dataset is None:
+        return _erro("Sessão expirada ou dados dos donatários não encontrados.", "warning")
+
+    formato = str(dados_requisicao.get('formato') or 'zip').lower()
+    try:
+        indices = _parse_indices_lote(dados_requisicao.get('indices'), dataset.total_linhas)
+        valores_por_indice = {indice: _valores_lote(dados_requisicao, indice) for indice in indices}
+        registros = obter_linhas(session['dataset_ref'], indices)
+        # PDF único grande vai para a fila de jobs, que prepara os contextos no worker
+        pdf_unico_em_job = formato == 'pdf' and len(indices) > current_app.config.get('PDF_MESCLADO_LIMITE_SINCRONO', 50)
+        tarefas = [] if pdf_unico_em_job else preparar_tarefas_contratos(
+            indices, [registros[indice] for indice in indices],
+            [valores_por_indice[indice][0] for indice in indices],
+            [valores_por_indice[indice][1] for indice in indices],
+            request.url_root, current_app.logger)
+    except (ValueError, TypeError, AttributeError) as e_conv:
+        current_app.logger.error(f"Erro ao interpretar os dados do lote: {e_conv}", exc_info=True)
+        return _erro(f"Dados inválidos para o lote: {e_conv}")
+
+    if not indices:
+        return _erro("Nenhum donatário selecionado para o lote.")
+
+    if pdf_unico_em_job:
+        return _enfileirar_pdf_unico(indices, registros, valores_por_indice)
+    if formato == 'pdf':
+        try:
+            return _resposta_pdf_unico(tarefas, registros)
+        except Exception as e_pdf:
+            return _erro(f"Erro ao gerar o PDF único: {e_pdf}")
+    if formato == 'docx':
+        try:
+            return _resposta_docx_lote(tarefas, registros)
+        except Exception as e_docx:
+            ERROS.inc(etapa='docx')
+            current_app.logger.error(f"Erro ao preparar o lote DOCX: {e_docx}", exc_info=True)
+            return _erro(f"Erro ao gerar os contratos DOCX: {e_docx}")
+
+    # Contratos já renderizados saem direto do cache; só o restante vai para o pool
+    cache_pdf = get_cache_pdf()
+    prontos_do_cache = []
+    chaves_cache = {}
+    for tarefa in tarefas:
+        chave_cache = chave_cache_contrato(tarefa[1])
+        pdf_bytes = cache_pdf.obter(chave_cache)
+        if pdf_bytes is not None:
+            prontos_do_cache.append((tarefa[0], tarefa[2], pdf_bytes))
+        else:
+            chaves_cache[tarefa[0]] = chave_cache
+    resultados = mapear_no_pool(renderizar_contrato_worker,
+                                [tarefa for tarefa in tarefas if tarefa[0] in chaves_cache])
+    current_app.logger.info(f"Lote: {len(prontos_do_cache)} contratos no cache, {len(chaves_cache)} enviados para o pool de renderização.")
+
+    def _arquivos_prontos():
+        erros = []
+        try:
+            # Prefixo com o índice evita colisão entre donatários de mesmo nome
+            for indice, nome_arquivo_pdf, pdf_bytes in prontos_do_cache:
+                yield f"{indice:05d}_{nome_arquivo_pdf}", pdf_bytes
+            for tarefa, resultado, e_render in resultados:
+                indice = tarefa[0]
+                if e_render is not None:
+                    ERROS.inc(etapa='lote_render')
+                    current_app.logger.error(f"Erro ao gerar contrato do índice {indice}: {e_render}",
+                                             exc_info=e_render)
+                    erros.append(f"{indice}: {e_render}")
+                    continue
+                _, nome_arquivo_pdf, pdf_bytes, tempos_etapas = resultado
+                registrar_metricas_render(tempos_etapas, pdf_bytes)
+                cache_pdf.guardar(chaves_cache[indice], pdf_bytes)
+                yield f"{indice:05d}_{nome_arquivo_pdf}", pdf_bytes
+            if erros:
+                yield "ERROS.txt", "\n".join(erros).encode('utf-8')
+            current_app.logger.info(f"Lote concluído: {len(tarefas) - len(erros)} contratos gerados, {len(erros)} erros.")
+        finally:
+            # Se o cliente desconectar, não renderiza o que ainda não começou
+            resultados.close()
+
+    nome_zip = f"CONTRATOS_{datetime.date.today().strftime('%Y%m%d')}.zip"
+    return Response(stream_with_context(stream_zip(_arquivos_prontos())),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{nome_zip}"'})
+
+
+def metricas():
+    """
+    Métricas (tempos por etapa, caches, erros, tamanho dos PDFs) no formato do Prometheus: as do processo
+    que responde ou, com PROMETHEUS_MULTIPROC_DIR, a soma de todos os workers.
+    """
+    return Response(exportar_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
-@app.route('/download_contrato/<path:filename>')
 def download_contrato(filename):
-    app.logger.info(f"Download requisitado para: {filename}")
-    diretorio_contratos = os.path.join(app.config.get('UPLOAD_FOLDER', 'uploads'), 'contratos_gerados')
+    current_app.logger.info(f"Download requisitado para: {filename}")
+    diretorio_contratos = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), 'contratos_gerados')
     try:
         return send_from_directory(directory=diretorio_contratos, path=filename, as_attachment=True)
     except FileNotFoundError:
-        app.logger.error(f"Download falhou: arquivo não encontrado em {diretorio_contratos}/{filename}")
+        current_app.logger.error(f"Download falhou: arquivo não encontrado em {diretorio_contratos}/{filename}")
         flash("Arquivo não encontrado para download.", "danger")
         return redirect(url_for('index'))
     except Exception as e:
-        app.logger.error(f"Erro no download: {e}", exc_info=True)
+        current_app.logger.error(f"Erro no download: {e}", exc_info=True)
         flash(f"Erro interno ao processar download: {e}", "danger")
         return redirect(url_for('index'))
 
 if __name__ == '__main__':
+    # Servidor de desenvolvimento; em produção: gunicorn -c gunicorn.conf.py wsgi:app
+    # Com debug, o reloader roda este bloco também no processo que só vigia os arquivos: o pool de
+    # renderização e as threads de jobs sobem apenas no processo que atende (WERKZEUG_RUN_MAIN)
+    app = create_app(iniciar_servicos_agora=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
     upload_dir = app.config.get('UPLOAD_FOLDER')
     if upload_dir:
         if not os.path.exists(upload_dir): os.makedirs(upload_dir)
@@ -259,4 +778,4 @@ if __name__ == '__main__':
     else:
         app.logger.critical("UPLOAD_FOLDER não configurado. O aplicativo não pode iniciar.")
     
-    app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8000, debug=True)
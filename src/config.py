@@ -9,10 +9,69 @@ class Config:
     COLUNA_NOME_PADRAO = 'NOME'
     COLUNA_CPF_PADRAO = 'CPF'
 
+    # Cache dos dados das planilhas (utils/google_services.py), em segundos
+    SHEETS_CACHE_TTL = int(os.environ.get('SHEETS_CACHE_TTL', 300))
+    # Sincronização incremental: relê só as linhas novas/alteradas de uma planilha já carregada
+    SHEETS_SYNC_INCREMENTAL = os.environ.get('SHEETS_SYNC_INCREMENTAL', '1') == '1'
+    # A cada mudança na planilha, relê todos os valores numa chamada e compara o hash de cada linha (pega
+    # edições de CPF, banco, conta). Com '0', só detecta linhas novas/removidas/deslocadas pela coluna NOME
+    SHEETS_SYNC_VERIFICAR_EDICOES = os.environ.get('SHEETS_SYNC_VERIFICAR_EDICOES', '1') == '1'
+    SHEETS_SYNC_TAMANHO_BLOCO = 500
+    # Quantos snapshots de cada planilha o dataset store mantém (utils/dataset_store.py)
+    DATASET_VERSOES_MANTIDAS = 3
+    # Listagem paginada de donatários (/api/donatarios)
+    DONATARIOS_POR_PAGINA = 50
+    DONATARIOS_POR_PAGINA_MAXIMO = 500
+
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'flask_session.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SESSION_TYPE = 'sqlalchemy'
     SESSION_PERMANENT = False
     SESSION_USE_SIGNER = True
     SESSION_SQLALCHEMY_TABLE = 'sessions'
+    # Flask-Session apaga as sessões expiradas a cada ~N requisições (a tabela não cresce sem limite)
+    SESSION_CLEANUP_N_REQUESTS = int(os.environ.get('SESSION_CLEANUP_N_REQUESTS', 100))
+
+    # Nível de log do app e dos processos de renderização (DEBUG formata dicionários grandes no caminho quente)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+    # Geração de contratos em lote (pool de processos de renderização)
+    PDF_POOL_WORKERS = int(os.environ.get('PDF_POOL_WORKERS', os.cpu_count() or 1))
+    # Render de aquecimento em cada processo do pool, para o 1º contrato após o deploy não pagar o custo a frio
+    PDF_AQUECER_RENDERIZADOR = os.environ.get('PDF_AQUECER_RENDERIZADOR', '1') == '1'
+
+    # PDF único com vários contratos (gerar_contratos_lote com formato=pdf): layout em blocos de N contratos
+    # e, acima de CONTRATOS_POR_VOLUME, o lote sai em vários PDFs (volumes) dentro de um ZIP
+    PDF_MESCLADO_CONTRATOS_POR_BLOCO = int(os.environ.get('PDF_MESCLADO_CONTRATOS_POR_BLOCO', 25))
+    PDF_MESCLADO_CONTRATOS_POR_VOLUME = int(os.environ.get('PDF_MESCLADO_CONTRATOS_POR_VOLUME', 500))
+    # Acima deste número de contratos o PDF único vira um job (fila de jobs) em vez de ocupar a requisição
+    PDF_MESCLADO_LIMITE_SINCRONO = int(os.environ.get('PDF_MESCLADO_LIMITE_SINCRONO', 50))
+
+    # Modelo do contrato editável (formato=docx), indexado uma vez por processo (utils/docx_rendering.py)
+    DOCX_TEMPLATE_PATH = os.environ.get('DOCX_TEMPLATE_PATH', os.path.join(basedir, 'uploads', 'CONTRATO MODELO DOACAO.docx'))
+
+    # Template compilado: Markdown -> HTML uma vez, só os valores do donatário por contrato
+    TEMPLATE_COMPILADO = os.environ.get('TEMPLATE_COMPILADO', '1') == '1'
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR', os.path.join(basedir, '.jinja_cache'))
+
+    # Cache de PDFs endereçado por conteúdo (utils/pdf_cache.py)
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(UPLOAD_FOLDER, 'cache_pdf'))
+    PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+    # Armazenamento e retenção de contratos_gerados (utils/armazenamento_contratos.py); 0 desativa a regra
+    CONTRATOS_RETENCAO_DIAS = int(os.environ.get('CONTRATOS_RETENCAO_DIAS', 90))
+    CONTRATOS_MAX_BYTES = int(os.environ.get('CONTRATOS_MAX_BYTES', 0))
+    CONTRATOS_RETENCAO_INTERVALO = int(os.environ.get('CONTRATOS_RETENCAO_INTERVALO', 3600))
+
+    # Métricas de /metrics somadas entre os workers do gunicorn (utils/metricas.py); vazio = só as do processo
+    PROMETHEUS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR', '')
+    METRICAS_INTERVALO_GRAVACAO = float(os.environ.get('METRICAS_INTERVALO_GRAVACAO', 5))
+
+    # Fila de jobs de geração de PDF (utils/job_queue.py)
+    JOBS_MAX_RENDERS_CONCORRENTES = int(os.environ.get('JOBS_MAX_RENDERS_CONCORRENTES', 2))
+    JOBS_MAX_TENTATIVAS = 3
+    JOBS_BACKOFF_SEGUNDOS = 2
+    JOBS_INTERVALO_POLL = 1.0
+    JOBS_TIMEOUT_SEGUNDOS = 600
+    JOBS_HEARTBEAT_SEGUNDOS = 30 # bem abaixo do timeout: um volume longo não é tomado por travado
     # ... outras configs ...
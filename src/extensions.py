@@ -0,0 +1,5 @@
+# extensions.py
+# Instâncias das extensões compartilhadas entre app.py, models.py e utils/
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
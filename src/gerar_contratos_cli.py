@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# gerar_contratos_cli.py
+"""
+Geração de contratos em lote pela linha de comando, sem o Flask e sem o Google Sheets.
+
+Lê os donatários de um CSV, XLSX ou Parquet local em blocos (sem carregar o arquivo inteiro),
+roda o mesmo pipeline do app (preparar_dados_para_contrato -> template -> WeasyPrint) num pool
+de processos e grava um manifesto de checkpoint: se a execução for interrompida, rodar o mesmo
+comando de novo continua de onde parou. As linhas que falharam ficam listadas em ERROS.txt.
+
+Exemplos (a partir de src/):
+
+    python gerar_contratos_cli.py donatarios.csv --saida contratos_maio --valor 1500 --aliquota 4
+    python gerar_contratos_cli.py donatarios.xlsx --saida contratos_maio --coluna-valor VALOR --aliquota 4 --workers 8
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from concurrent.futures import wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from config import Config
+from utils.contract_processing import preparar_dados_para_contrato_lote, converter_valores_numericos
+from utils.pdf_rendering import (nome_arquivo_contrato, renderizar_contrato_worker, submeter_no_pool,
+                                 descartar_process_pool, encerrar_process_pool)
+
+NOME_MANIFESTO = 'manifesto.jsonl'
+NOME_ERROS = 'ERROS.txt'
+
+logger = logging.getLogger('gerar_contratos_cli')
+
+
+def ler_blocos(caminho, tamanho_bloco, aba=None):
+    """Gera DataFrames de até tamanho_bloco linhas a partir de um CSV, XLSX ou Parquet."""
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao in ('.csv', '.txt'):
+        # dtype=str preserva zeros à esquerda (CPF, CEP, agência); célula vazia vira ''
+        yield from pd.read_csv(caminho, chunksize=tamanho_bloco, dtype=str, keep_default_na=False,
+                               sep=None, engine='python', encoding='utf-8-sig')
+    elif extensao in ('.xlsx', '.xlsm'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise SystemExit("Leitura de XLSX requer o pacote openpyxl (pip install openpyxl).")
+        # read_only: o openpyxl lê a planilha em streaming, linha a linha
+        planilha = load_workbook(caminho, read_only=True, data_only=True)
+        try:
+            aba_planilha = planilha[aba] if aba else planilha.worksheets[0]
+            linhas = aba_planilha.iter_rows(values_only=True)
+            cabecalho = [str(coluna).strip() if coluna is not None else '' for coluna in next(linhas, [])]
+            bloco = []
+            for linha in linhas:
+                if all(valor is None for valor in linha):
+                    continue
+                bloco.append(['' if valor is None else valor for valor in linha[:len(cabecalho)]])
+                if len(bloco) >= tamanho_bloco:
+                    yield pd.DataFrame(bloco, columns=cabecalho, dtype=object)
+                    bloco = []
+            if bloco:
+                yield pd.DataFrame(bloco, columns=cabecalho, dtype=object)
+        finally:
+            planilha.close()
+    elif extensao in ('.parquet', '.pq'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Leitura de Parquet requer o pacote pyarrow (pip install pyarrow).")
+        for lote in pq.ParquetFile(caminho).iter_batches(batch_size=tamanho_bloco):
+            yield lote.to_pandas()
+    else:
+        raise SystemExit(f"Formato não suportado: '{extensao}'. Use CSV, XLSX ou Parquet.")
+
+
+def assinatura_execucao(args):
+    """Identifica a execução (arquivo + parâmetros) para não retomar um manifesto de outra entrada."""
+    estado = os.stat(args.entrada)
+    dados = {
+        "entrada": os.path.abspath(args.entrada),
+        "tamanho": estado.st_size,
+        "mtime": int(estado.st_mtime),
+        "valor": args.valor, "coluna_valor": args.coluna_valor,
+        "aliquota": args.aliquota, "coluna_aliquota": args.coluna_aliquota,
+    }
+    return hashlib.sha1(json.dumps(dados, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def carregar_manifesto(caminho_manifesto, assinatura, forcar):
+    """Retorna o conjunto de linhas já concluídas (com PDF gravado) do manifesto, se houver."""
+    concluidas = set()
+    if not os.path.exists(caminho_manifesto):
+        return concluidas
+    with open(caminho_manifesto, encoding='utf-8') as f_manifesto:
+        for numero, texto in enumerate(f_manifesto):
+            try:
+                registro = json.loads(texto)
+            except json.JSONDecodeError:
+                continue # última linha cortada por uma interrupção
+            if numero == 0 and registro.get("assinatura"):
+                if registro["assinatura"] != assinatura and not forcar:
+                    raise SystemExit(f"O manifesto em '{caminho_manifesto}' é de outra entrada/parâmetros. "
+                                     "Use outra pasta de saída ou --forcar para reaproveitá-lo.")
+                continue
+            if "arquivo" in registro:
+                concluidas.add(registro["linha"])
+    return concluidas
+
+
+def _gravar_pdf(pasta_saida, nome_arquivo, pdf_bytes):
+    caminho = os.path.join(pasta_saida, nome_arquivo)
+    caminho_temporario = f"{caminho}.tmp"
+    with open(caminho_temporario, 'wb') as f_pdf:
+        f_pdf.write(pdf_bytes)
+    os.replace(caminho_temporario, caminho)
+
+
+def gravar_erros(pasta_saida, caminho_manifesto):
+    """
+    Grava ERROS.txt na pasta de saída com as linhas cuja última entrada no manifesto é um erro (valor
+    inválido ou falha na renderização); sem erros, remove o ERROS.txt de uma execução anterior.
+    Retorna o número de linhas com erro.
+    """
+    ultimo_por_linha = {}
+    with open(caminho_manifesto, encoding='utf-8') as f_manifesto:
+        for texto in f_manifesto:
+            try:
+                registro = json.loads(texto)
+            except json.JSONDecodeError:
+                continue
+            if "linha" in registro:
+                ultimo_por_linha[registro["linha"]] = registro
+    linhas_erro = [f"Linha {linha}: {registro['erro']}" for linha, registro in sorted(ultimo_por_linha.items())
+                   if "erro" in registro]
+    caminho_erros = os.path.join(pasta_saida, NOME_ERROS)
+    if linhas_erro:
+        _gravar_pdf(pasta_saida, NOME_ERROS, ("\n".join(linhas_erro) + "\n").encode('utf-8'))
+    elif os.path.exists(caminho_erros):
+        os.remove(caminho_erros)
+    return len(linhas_erro)
+
+
+def gerar(args):
+    os.makedirs(args.saida, exist_ok=True)
+    caminho_manifesto = os.path.join(args.saida, NOME_MANIFESTO)
+    assinatura = assinatura_execucao(args)
+    concluidas = carregar_manifesto(caminho_manifesto, assinatura, args.forcar)
+    if concluidas:
+        logger.info(f"Retomando execução: {len(concluidas)} contrato(s) já gerado(s) serão pulados.")
+
+    tamanho_manifesto = os.path.getsize(caminho_manifesto) if os.path.exists(caminho_manifesto) else 0
+    if tamanho_manifesto:
+        with open(caminho_manifesto, 'rb') as f_manifesto:
+            f_manifesto.seek(-1, os.SEEK_END)
+            linha_incompleta = f_manifesto.read(1) != b'\n'
+    manifesto = open(caminho_manifesto, 'a', encoding='utf-8')
+    if not tamanho_manifesto:
+        manifesto.write(json.dumps({"assinatura": assinatura, "entrada": os.path.abspath(args.entrada)}) + '\n')
+        manifesto.flush()
+    elif linha_incompleta:
+        manifesto.write('\n') # fecha a linha cortada pela interrupção anterior
+
+    gerados = erros = pulados = 0
+    inicio = time.perf_counter()
+    maximo_em_andamento = args.workers * 4 # limita a memória: poucos blocos de tarefas em voo por vez
+    # Mesmo pool de renderização do app (utils/pdf_rendering), com --workers processos e sem render de aquecimento
+    Config.PDF_POOL_WORKERS = args.workers
+    Config.PDF_AQUECER_RENDERIZADOR = False
+    em_andamento = {} # future -> (linha, tarefa, pool usado, já reenviada)
+
+    def _submeter(linha, tarefa, reenviada=False):
+        future, pool = submeter_no_pool(renderizar_contrato_worker, tarefa)
+        em_andamento[future] = (linha, tarefa, pool, reenviada)
+
+    def _registrar(futures_prontos):
+        nonlocal gerados, erros
+        for future in futures_prontos:
+            linha, tarefa, pool, reenviada = em_andamento.pop(future)
+            try:
+                _, nome_arquivo_pdf, pdf_bytes, _ = future.result()
+                nome_arquivo = f"{linha:06d}_{nome_arquivo_pdf}"
+                _gravar_pdf(args.saida, nome_arquivo, pdf_bytes)
+                registro = {"linha": linha, "arquivo": nome_arquivo, "bytes": len(pdf_bytes)}
+                gerados += 1
+            except BrokenProcessPool as e_pool:
+                # Um processo filho morreu (OOM, segfault): pool novo e mais uma tentativa para a linha,
+                # como em pdf_rendering.mapear_no_pool
+                descartar_process_pool(pool)
+                if not reenviada:
+                    _submeter(linha, tarefa, reenviada=True)
+                    continue
+                logger.error(f"Erro ao gerar o contrato da linha {linha}: processo de renderização encerrado ({e_pool})")
+                registro = {"linha": linha, "erro": f"Processo de renderização encerrado: {e_pool}"[:500]}
+                erros += 1
+            except Exception as e_render:
+                logger.error(f"Erro ao gerar o contrato da linha {linha}: {e_render}")
+                registro = {"linha": linha, "erro": str(e_render)[:500]}
+                erros += 1
+            manifesto.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        manifesto.flush()
+        os.fsync(manifesto.fileno())
+        processados = gerados + erros
+        if processados and processados % args.intervalo_progresso < len(futures_prontos):
+            decorrido = time.perf_counter() - inicio
+            logger.info(f"{processados} contrato(s) processado(s) ({processados / decorrido:.1f}/s).")
+
+    try:
+        linha_inicial = 0
+        for bloco in ler_blocos(args.entrada, args.tamanho_bloco, args.aba):
+            bloco = bloco.reset_index(drop=True)
+            linhas = list(range(linha_inicial, linha_inicial + len(bloco)))
+            linha_inicial += len(bloco)
+            pendentes = [posicao for posicao, linha in enumerate(linhas) if linha not in concluidas]
+            pulados += len(bloco) - len(pendentes)
+            if not pendentes:
+                continue
+            bloco = bloco.iloc[pendentes].reset_index(drop=True)
+
+            for coluna, descricao in ((args.coluna_valor, 'valor'), (args.coluna_aliquota, 'alíquota')):
+                if coluna and coluna not in bloco.columns:
+                    raise SystemExit(f"Coluna de {descricao} '{coluna}' não encontrada no arquivo.")
+            valores, valores_invalidos = (converter_valores_numericos(bloco[args.coluna_valor], args.coluna_valor)
+                                          if args.coluna_valor else (args.valor, {}))
+            aliquotas, aliquotas_invalidas = (converter_valores_numericos(bloco[args.coluna_aliquota],
+                                                                          args.coluna_aliquota)
+                                              if args.coluna_aliquota else (args.aliquota, {}))
+            invalidas = valores_invalidos.keys() | aliquotas_invalidas.keys()
+            if invalidas:
+                # Linha com valor ou alíquota inválidos: erro no manifesto (retentada na próxima execução)
+                for posicao in sorted(invalidas):
+                    linha = linhas[pendentes[posicao]]
+                    mensagem = "; ".join(invalidos[posicao] for invalidos in (valores_invalidos, aliquotas_invalidas)
+                                         if posicao in invalidos)
+                    logger.error(f"Erro ao gerar o contrato da linha {linha}: {mensagem}")
+                    manifesto.write(json.dumps({"linha": linha, "erro": mensagem}, ensure_ascii=False) + '\n')
+                    erros += 1
+                manifesto.flush()
+                validas = [posicao for posicao in range(len(bloco)) if posicao not in invalidas]
+                bloco = bloco.iloc[validas].reset_index(drop=True)
+                pendentes = [pendentes[posicao] for posicao in validas]
+                if isinstance(valores, list):
+                    valores = [valores[posicao] for posicao in validas]
+                if isinstance(aliquotas, list):
+                    aliquotas = [aliquotas[posicao] for posicao in validas]
+                if not pendentes:
+                    continue
+            contextos = preparar_dados_para_contrato_lote(bloco, valores, aliquotas, logger)
+            nomes = bloco['NOME'].tolist() if 'NOME' in bloco.columns else [None] * len(bloco)
+
+            for posicao, contexto_contrato in enumerate(contextos):
+                linha = linhas[pendentes[posicao]]
+                _submeter(linha, (linha, contexto_contrato, nome_arquivo_contrato(nomes[posicao]), None))
+                if len(em_andamento) >= maximo_em_andamento:
+                    prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                    _registrar(prontos)
+        while em_andamento:
+            prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+            _registrar(prontos)
+    except KeyboardInterrupt:
+        logger.warning("Interrompido. Rode o mesmo comando para continuar a partir do manifesto.")
+        encerrar_process_pool(cancelar_pendentes=True)
+        raise SystemExit(130)
+    finally:
+        manifesto.close()
+        gravar_erros(args.saida, caminho_manifesto)
+    encerrar_process_pool()
+
+    decorrido = time.perf_counter() - inicio
+    vazao = gerados / decorrido if decorrido > 0 else 0.0
+    print(f"Contratos gerados: {gerados} | erros: {erros} | já existentes (pulados): {pulados}")
+    print(f"Tempo total: {decorrido:.1f}s | vazão: {vazao:.2f} contratos/s com {args.workers} processo(s)")
+    print(f"Manifesto: {caminho_manifesto}")
+    if os.path.exists(os.path.join(args.saida, NOME_ERROS)):
+        print(f"Linhas com erro: {os.path.join(args.saida, NOME_ERROS)}")
+    return 1 if erros else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera contratos em PDF a partir de um CSV/XLSX/Parquet local.")
+    parser.add_argument('entrada', help="Arquivo de donatários (.csv, .xlsx ou .parquet), com as colunas da planilha.")
+    parser.add_argument('--saida', required=True, help="Pasta onde os PDFs e o manifesto serão gravados.")
+    grupo_valor = parser.add_mutually_exclusive_group(required=True)
+    grupo_valor.add_argument('--valor', type=float, help="Valor da doação (R$) para todos os donatários.")
+    grupo_valor.add_argument('--coluna-valor', help="Coluna do arquivo com o valor da doação de cada donatário.")
+    grupo_aliquota = parser.add_mutually_exclusive_group(required=True)
+    grupo_aliquota.add_argument('--aliquota', type=float, help="Alíquota do ITCMD (%%) para todos os donatários.")
+    grupo_aliquota.add_argument('--coluna-aliquota', help="Coluna do arquivo com a alíquota de cada donatário.")
+    parser.add_argument('--workers', type=int, default=Config.PDF_POOL_WORKERS, help="Processos de renderização.")
+    parser.add_argument('--tamanho-bloco', type=int, default=500, help="Linhas lidas do arquivo por vez.")
+    parser.add_argument('--aba', default=None, help="Aba do XLSX (padrão: a primeira).")
+    parser.add_argument('--intervalo-progresso', type=int, default=100, help="Mostra o progresso a cada N contratos.")
+    parser.add_argument('--forcar', action='store_true', help="Reaproveita um manifesto de outra entrada/parâmetros.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s %(levelname)s %(message)s')
+    if not os.path.exists(args.entrada):
+        parser.error(f"arquivo não encontrado: {args.entrada}")
+    return gerar(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
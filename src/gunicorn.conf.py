@@ -0,0 +1,54 @@
+# gunicorn.conf.py
+# Servidor de produção: gunicorn -c gunicorn.conf.py wsgi:app (ver Dockerfile)
+import os
+import multiprocessing
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+# Cada worker tem seu próprio pool de renderização; poucos workers com threads rendem mais que muitos workers
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Lotes e o PDF único respondem em streaming/síncrono e podem levar minutos
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+graceful_timeout = 30
+keepalive = 5
+# Recicla workers aos poucos (jitter evita reiniciar todos juntos); o novo worker se aquece no post_fork
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+# Heartbeat dos workers em memória (no disco do container ele pode travar o worker sob I/O)
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+# App e módulos pesados carregados uma vez no mestre (wsgi.py); estado por processo só depois do fork
+preload_app = True
+os.environ['WSGI_SERVICOS_NO_POST_FORK'] = '1'
+# Divide as CPUs entre os pools de renderização dos workers (PDF_POOL_WORKERS explícito tem prioridade)
+os.environ.setdefault('PDF_POOL_WORKERS', str(max(1, multiprocessing.cpu_count() // workers)))
+# /metrics soma as séries de todos os workers a partir deste diretório (ver utils/metricas.py)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(worker_tmp_dir or '/tmp', 'metricas_contratos'))
+
+
+def on_starting(server):
+    from utils.metricas import limpar_diretorio_multiprocesso
+    # Séries de uma execução anterior não entram na soma
+    limpar_diretorio_multiprocesso(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+def child_exit(server, worker):
+    from utils.metricas import encerrar_processo
+    # Worker reciclado (max_requests) ou morto: as séries dele passam para metricas_encerrados.json
+    encerrar_processo(os.environ['PROMETHEUS_MULTIPROC_DIR'], worker.pid)
+
+
+def post_fork(server, worker):
+    from wsgi import app
+    from app import iniciar_servicos
+    from extensions import db
+
+    # Conexões SQLite abertas pelo mestre (create_all) não podem ser usadas no processo filho
+    with app.app_context():
+        db.engine.dispose(close=False)
+    iniciar_servicos(app)
+    server.log.info(f"Worker {worker.pid} aquecido (templates, renderização, modelo DOCX, cliente do Sheets).")
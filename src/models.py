@@ -0,0 +1,117 @@
+# models.py
+import datetime
+
+from extensions import db
+
+
+class ContratoJob(db.Model):
+    """Job de geração de PDF processado em segundo plano (ver utils/job_queue.py)."""
+    # Tabelas criadas antes da coluna tipo são migradas na inicialização (utils/migracoes_banco.py)
+    __tablename__ = 'contrato_jobs'
+
+    STATUS_PENDENTE = 'pendente'
+    STATUS_PROCESSANDO = 'processando'
+    STATUS_CONCLUIDO = 'concluido'
+    STATUS_ERRO = 'erro'
+
+    TIPO_CONTRATO = 'contrato'
+    TIPO_PDF_MESCLADO = 'pdf_mesclado'
+
+    id = db.Column(db.String(32), primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False, default=TIPO_CONTRATO)
+    total_contratos = db.Column(db.Integer, nullable=False, default=1)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDENTE, index=True)
+    progresso = db.Column(db.Integer, nullable=False, default=0)
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=3)
+    proxima_tentativa_em = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
+    # contrato: dict do donatário; pdf_mesclado: lista de {"dados", "valor_bruto_doacao", "aliquota_percentual"}
+    dados_donatario_json = db.Column(db.Text, nullable=False)
+    nome_donatario = db.Column(db.String(255))
+    valor_bruto_doacao = db.Column(db.Float) # None em pdf_mesclado (cada contrato tem o seu)
+    aliquota_percentual = db.Column(db.Float)
+    base_url = db.Column(db.String(255))
+
+    nome_arquivo_pdf = db.Column(db.String(255))
+    erro = db.Column(db.Text)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow,
+                              onupdate=datetime.datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "tipo": self.tipo,
+            "total_contratos": self.total_contratos,
+            "status": self.status,
+            "progresso": self.progresso,
+            "tentativas": self.tentativas,
+            "max_tentativas": self.max_tentativas,
+            "nome_donatario": self.nome_donatario,
+            "nome_arquivo_pdf": self.nome_arquivo_pdf if self.status == self.STATUS_CONCLUIDO else None,
+            "erro": self.erro,
+            "criado_em": self.criado_em.isoformat() if self.criado_em else None,
+            "atualizado_em": self.atualizado_em.isoformat() if self.atualizado_em else None,
+        }
+
+
+class DatasetDonatarios(db.Model):
+    """Snapshot dos donatários de uma planilha, identificado por (sheet_id, versao). Ver utils/dataset_store.py."""
+    # Snapshots gravados com as linhas em JSON são descartados na inicialização (utils/migracoes_banco.py)
+    __tablename__ = 'datasets_donatarios'
+    __table_args__ = (db.UniqueConstraint('sheet_id', 'versao', name='uq_dataset_sheet_versao'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    sheet_id = db.Column(db.String(255), nullable=False, index=True)
+    versao = db.Column(db.String(40), nullable=False)
+    revisao = db.Column(db.String(64)) # modifiedTime da planilha quando o snapshot foi lido
+    colunas_json = db.Column(db.Text, nullable=False, default='[]')
+    total_linhas = db.Column(db.Integer, nullable=False, default=0)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+
+class DatasetLinha(db.Model):
+    """Uma linha (donatário) de um snapshot, com NOME/CPF em colunas próprias para busca direta."""
+    __tablename__ = 'datasets_linhas'
+    __table_args__ = (db.Index('ix_dataset_linha_cpf', 'dataset_id', 'cpf_normalizado'),)
+
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets_donatarios.id', ondelete='CASCADE'), primary_key=True)
+    indice = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    nome = db.Column(db.String(255))
+    cpf = db.Column(db.String(64))
+    cpf_normalizado = db.Column(db.String(32))
+    hash = db.Column(db.String(40), nullable=False) # hash do conteúdo da linha (sincronização incremental)
+    dados = db.Column(db.LargeBinary, nullable=False) # RegistroDonatario.serializar()
+
+
+class ContratoGerado(db.Model):
+    """PDF de contrato gravado em contratos_gerados, com os metadados para busca e retenção. Ver utils/armazenamento_contratos.py."""
+    __tablename__ = 'contratos_gerados'
+
+    id = db.Column(db.String(32), primary_key=True)
+    job_id = db.Column(db.String(32), index=True)
+    nome_donatario = db.Column(db.String(255))
+    cpf = db.Column(db.String(64))
+    cpf_normalizado = db.Column(db.String(32), index=True)
+    valor_bruto_doacao = db.Column(db.Float)
+    aliquota_percentual = db.Column(db.Float)
+    nome_arquivo = db.Column(db.String(255), nullable=False) # nome usado no download
+    caminho_relativo = db.Column(db.String(255), nullable=False) # relativo a UPLOAD_FOLDER/contratos_gerados
+    tamanho_bytes = db.Column(db.Integer, nullable=False, default=0)
+    sha256 = db.Column(db.String(64))
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            "contrato_id": self.id,
+            "job_id": self.job_id,
+            "nome_donatario": self.nome_donatario,
+            "cpf": self.cpf,
+            "valor_bruto_doacao": self.valor_bruto_doacao,
+            "aliquota_percentual": self.aliquota_percentual,
+            "nome_arquivo": self.nome_arquivo,
+            "tamanho_bytes": self.tamanho_bytes,
+            "sha256": self.sha256,
+            "criado_em": self.criado_em.isoformat() if self.criado_em else None,
+        }
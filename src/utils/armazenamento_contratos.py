@@ -0,0 +1,225 @@
+# utils/armazenamento_contratos.py
+import os
+import fcntl
+import uuid
+import time
+import hashlib
+import datetime
+import threading
+
+from extensions import db
+from models import ContratoGerado
+from utils.dataset_store import normalizar_cpf
+
+PASTA_CONTRATOS = 'contratos_gerados'
+
+_retencao_thread = None
+_retencao_lock = threading.Lock()
+
+
+def pasta_contratos(upload_folder):
+    return os.path.join(upload_folder, PASTA_CONTRATOS)
+
+
+def _caminho_relativo(contrato_id, criado_em):
+    """Subdiretórios por data e pelo início do id: <AAAA>/<MM>/<DD>/<ab>/<id>.pdf"""
+    return os.path.join(criado_em.strftime('%Y'), criado_em.strftime('%m'), criado_em.strftime('%d'),
+                        contrato_id[:2], f"{contrato_id}.pdf")
+
+
+def caminho_contrato(contrato, upload_folder):
+    return os.path.join(pasta_contratos(upload_folder), contrato.caminho_relativo)
+
+
+def gravar_contrato(pdf_bytes, nome_arquivo_pdf, dados_donatario, valor_bruto_doacao, aliquota_percentual,
+                    logger, upload_folder='uploads', job_id=None, coluna_cpf='CPF'):
+    """
+    Grava o PDF com um id único (escrita atômica) e registra os metadados no índice SQLite.
+    Retorna o ContratoGerado. Dois contratos da mesma pessoa no mesmo dia não se sobrescrevem mais.
+    """
+    contrato_id = uuid.uuid4().hex
+    criado_em = datetime.datetime.utcnow()
+    caminho_relativo = _caminho_relativo(contrato_id, criado_em)
+    caminho = os.path.join(pasta_contratos(upload_folder), caminho_relativo)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    caminho_temporario = f"{caminho}.tmp"
+    with open(caminho_temporario, 'wb') as f_pdf:
+        f_pdf.write(pdf_bytes)
+    os.replace(caminho_temporario, caminho)
+
+    cpf = dados_donatario.get(coluna_cpf)
+    contrato = ContratoGerado(
+        id=contrato_id,
+        job_id=job_id,
+        nome_donatario=str(dados_donatario.get('NOME', '')),
+        cpf=None if cpf is None else str(cpf),
+        cpf_normalizado=normalizar_cpf(cpf),
+        valor_bruto_doacao=valor_bruto_doacao,
+        aliquota_percentual=aliquota_percentual,
+        nome_arquivo=nome_arquivo_pdf,
+        caminho_relativo=caminho_relativo,
+        tamanho_bytes=len(pdf_bytes),
+        sha256=hashlib.sha256(pdf_bytes).hexdigest(),
+        criado_em=criado_em,
+    )
+    db.session.add(contrato)
+    db.session.commit()
+    logger.info(f"Contrato {contrato_id} gravado em {caminho_relativo} ({len(pdf_bytes)} bytes).")
+    return contrato
+
+
+def obter_contrato(contrato_id):
+    return db.session.get(ContratoGerado, contrato_id)
+
+
+def obter_contrato_do_job(job_id):
+    """Contrato mais recente gravado para o job (None para jobs concluídos antes do índice existir)."""
+    return (ContratoGerado.query
+            .filter_by(job_id=job_id)
+            .order_by(ContratoGerado.criado_em.desc())
+            .first())
+
+
+def listar_contratos_do_job(job_id):
+    """Todos os PDFs gravados para o job, pelo nome (os volumes de um PDF único ficam em ordem)."""
+    return (ContratoGerado.query
+            .filter_by(job_id=job_id)
+            .order_by(ContratoGerado.nome_arquivo, ContratoGerado.criado_em)
+            .all())
+
+
+def listar_contratos(cpf=None, nome=None, pagina=1, por_pagina=50):
+    """Retorna (total, [ContratoGerado]) do mais recente para o mais antigo, filtrando por CPF e/ou parte do nome."""
+    consulta = ContratoGerado.query
+    if cpf:
+        consulta = consulta.filter(ContratoGerado.cpf_normalizado == normalizar_cpf(cpf))
+    if nome:
+        # % e _ digitados são literais, não curingas do LIKE
+        nome_escapado = nome.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        consulta = consulta.filter(ContratoGerado.nome_donatario.ilike(f"%{nome_escapado}%", escape='\\'))
+    total = consulta.count()
+    contratos = (consulta
+                 .order_by(ContratoGerado.criado_em.desc())
+                 .offset((pagina - 1) * por_pagina)
+                 .limit(por_pagina)
+                 .all())
+    return total, contratos
+
+
+def _remover_arquivo(caminho, raiz):
+    """Remove o arquivo e os subdiretórios que ficarem vazios (sem sair de raiz)."""
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+    diretorio = os.path.dirname(caminho)
+    while os.path.abspath(diretorio) != os.path.abspath(raiz):
+        try:
+            os.rmdir(diretorio)
+        except OSError:
+            break
+        diretorio = os.path.dirname(diretorio)
+
+
+def aplicar_retencao(upload_folder, logger, retencao_dias=90, tamanho_maximo_bytes=0, tamanho_lote=500):
+    """
+    Remove contratos mais antigos que retencao_dias e, se tamanho_maximo_bytes > 0, os mais antigos
+    até o total caber no limite (0 desativa cada regra). Também limpa PDFs soltos do formato antigo
+    (direto em contratos_gerados) mais velhos que o prazo. Retorna quantos contratos foram removidos.
+    """
+    raiz = pasta_contratos(upload_folder)
+    removidos = 0
+
+    if retencao_dias:
+        limite = datetime.datetime.utcnow() - datetime.timedelta(days=retencao_dias)
+        while True:
+            vencidos = (ContratoGerado.query
+                        .filter(ContratoGerado.criado_em < limite)
+                        .order_by(ContratoGerado.criado_em)
+                        .limit(tamanho_lote)
+                        .all())
+            if not vencidos:
+                break
+            for contrato in vencidos:
+                _remover_arquivo(caminho_contrato(contrato, upload_folder), raiz)
+                db.session.delete(contrato)
+            db.session.commit()
+            removidos += len(vencidos)
+
+        # Arquivos do layout antigo (sem registro no índice)
+        if os.path.isdir(raiz):
+            limite_mtime = time.time() - retencao_dias * 86400
+            for nome_arquivo in os.listdir(raiz):
+                caminho = os.path.join(raiz, nome_arquivo)
+                if nome_arquivo.endswith('.pdf') and os.path.isfile(caminho) and os.path.getmtime(caminho) < limite_mtime:
+                    os.remove(caminho)
+                    removidos += 1
+
+    if tamanho_maximo_bytes:
+        tamanho_total = db.session.query(db.func.coalesce(db.func.sum(ContratoGerado.tamanho_bytes), 0)).scalar()
+        while tamanho_total > tamanho_maximo_bytes:
+            mais_antigos = (ContratoGerado.query
+                            .order_by(ContratoGerado.criado_em)
+                            .limit(tamanho_lote)
+                            .all())
+            if not mais_antigos:
+                break
+            for contrato in mais_antigos:
+                if tamanho_total <= tamanho_maximo_bytes:
+                    break
+                _remover_arquivo(caminho_contrato(contrato, upload_folder), raiz)
+                db.session.delete(contrato)
+                tamanho_total -= contrato.tamanho_bytes
+                removidos += 1
+            db.session.commit()
+
+    if removidos:
+        logger.info(f"Retenção de contratos: {removidos} arquivo(s) removido(s).")
+    return removidos
+
+
+def _obter_lock_retencao(upload_folder):
+    """
+    Lock de arquivo (não bloqueante) que elege um único processo para aplicar a retenção quando
+    vários workers do gunicorn rodam o mesmo loop. O SO libera o lock se o processo morrer.
+    Retorna o arquivo aberto (manter a referência mantém o lock) ou None se outro processo o tem.
+    """
+    os.makedirs(pasta_contratos(upload_folder), exist_ok=True)
+    arquivo_lock = open(os.path.join(pasta_contratos(upload_folder), '.retencao.lock'), 'a')
+    try:
+        fcntl.flock(arquivo_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        arquivo_lock.close()
+        return None
+    return arquivo_lock
+
+
+def _loop_retencao(app):
+    intervalo = app.config.get('CONTRATOS_RETENCAO_INTERVALO', 3600)
+    upload_folder = app.config.get('UPLOAD_FOLDER', 'uploads')
+    lock = None
+    while True:
+        try:
+            if lock is None:
+                lock = _obter_lock_retencao(upload_folder)
+            if lock is not None:
+                with app.app_context():
+                    aplicar_retencao(upload_folder, app.logger,
+                                     retencao_dias=app.config.get('CONTRATOS_RETENCAO_DIAS', 90),
+                                     tamanho_maximo_bytes=app.config.get('CONTRATOS_MAX_BYTES', 0))
+        except Exception as e_retencao:
+            app.logger.error(f"Erro na retenção de contratos: {e_retencao}", exc_info=True)
+        time.sleep(intervalo)
+
+
+def iniciar_retencao(app):
+    """Inicia a thread daemon que aplica a política de retenção a cada CONTRATOS_RETENCAO_INTERVALO segundos."""
+    global _retencao_thread
+    with _retencao_lock:
+        if _retencao_thread is not None:
+            return
+        if not app.config.get('CONTRATOS_RETENCAO_DIAS') and not app.config.get('CONTRATOS_MAX_BYTES'):
+            app.logger.info("Retenção de contratos desativada.")
+            return
+        _retencao_thread = threading.Thread(target=_loop_retencao, args=(app,), name="contratos-retencao", daemon=True)
+        _retencao_thread.start()
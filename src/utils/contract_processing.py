@@ -1,117 +1,233 @@
 # utils/contract_processing.py
-import datetime
-from num2words import num2words
-import os # Adicionado para os.path.exists e os.makedirs, embora não usado diretamente aqui, mas pode ser útil para funções relacionadas
+import logging
+# numpy/pandas são importados só pelas funções de lote: o contrato avulso não carrega esses módulos
+
+from utils.formatacao_ptbr import formatar_numero_br, formatar_percentual, moeda_por_extenso, local_data_completa
 
 # Não precisamos de 'app' ou 'current_app' aqui se passarmos o logger
 
+ERRO_EXTENSO = "[ERRO NA GERAÇÃO POR EXTENSO]"
+
+# !! ADAPTE AS COLUNAS PARA CORRESPONDER ÀS SUAS PLANILHAS !!
+# (placeholder, coluna da planilha, valor padrão, transformação do texto)
+CAMPOS_DONATARIO = [
+    ("NOME_DONATARIO", 'NOME', '', 'upper'),
+    ("NACIONALIDADE_DONATARIO", 'NACIONALIDADE', 'N/D', 'lower'),
+    ("ESTADO_CIVIL_DONATARIO", 'ESTADO_CIVIL', 'N/D', 'lower'),
+    ("PROFISSAO_DONATARIO", 'PROFISSAO', 'N/D', 'lower'),
+    ("RG_DONATARIO", 'RG', 'N/D', 'upper'),
+    ("CPF_DONATARIO", 'CPF', '', None),
+    ("ENDERECO_DONATARIO", 'ENDERECO', 'N/D', 'lower_capitalize'),
+    ("CIDADE_UF_DONATARIO", 'CIDADE_UF', 'N/D', 'capitalize'),
+    ("CEP_DONATARIO", 'CEP', 'N/D', None),
+    ("TELEFONE_DONATARIO", 'TELEFONE', 'N/D', None),
+    ("EMAIL_DONATARIO", 'EMAIL', 'N/D', 'lower'),
+    ("BANCO_DONATARIO", 'BANCO', 'N/D', 'upper'),
+    ("AGENCIA_DONATARIO", 'AGENCIA', 'N/D', 'upper'),
+    ("CONTA_DONATARIO", 'CONTA', 'N/D', 'upper'),
+    ("CONTA_TIPO", 'OPERACAO', 'N/D', 'lower'),
+]
+
+# Todas as chaves do dicionário de substituições (campos do donatário + valores calculados)
+PLACEHOLDERS_CONTRATO = [placeholder for placeholder, _, _, _ in CAMPOS_DONATARIO] + [
+    "VALOR_BRUTO_DOACAO_NUM", "VALOR_BRUTO_DOACAO_EXTENSO", "ALIQUOTA_ITCMD_PERCENTUAL",
+    "VALOR_ITCMD_NUM", "VALOR_ITCMD_EXTENSO", "VALOR_LIQUIDO_DOACAO_NUM", "VALOR_LIQUIDO_DOACAO_EXTENSO",
+    "LOCAL_DATA_COMPLETA",
+]
+
+
+def _transformar_texto(texto, transformacao):
+    texto = texto.strip()
+    if transformacao == 'upper':
+        return texto.upper()
+    if transformacao == 'lower':
+        return texto.lower()
+    if transformacao == 'capitalize':
+        return texto.capitalize()
+    if transformacao == 'lower_capitalize':
+        return texto.lower().capitalize()
+    return texto
+
+
+def _transformar_coluna(serie, transformacao):
+    """
+    Mesma transformação de _transformar_texto para uma coluna inteira (lista de str na ordem das linhas).
+    Aplica as operações vetorizadas do pandas só nos valores distintos (pd.factorize) e expande pelos
+    códigos; colunas como ESTADO_CIVIL, BANCO e CIDADE_UF têm poucos valores distintos.
+    dtype object: os métodos .str usam os métodos do próprio str do Python.
+    """
+    import pandas as pd
+
+    codigos, distintos = pd.factorize(serie)
+    distintos = pd.Series(distintos, dtype=object).str.strip()
+    if transformacao == 'upper':
+        distintos = distintos.str.upper()
+    elif transformacao == 'lower':
+        distintos = distintos.str.lower()
+    elif transformacao == 'capitalize':
+        distintos = distintos.str.capitalize()
+    elif transformacao == 'lower_capitalize':
+        distintos = distintos.str.lower().str.capitalize()
+    return distintos.to_numpy(dtype=object)[codigos].tolist()
+
+
+def _valores_por_extenso(valores, app_logger):
+    """
+    Valores por extenso (em maiúsculas), na ordem recebida. Se o num2words falhar, o valor que falhou
+    e os seguintes ficam com ERRO_EXTENSO, para que o contrato possa ser gerado e o erro notado.
+    """
+    extensos = [ERRO_EXTENSO] * len(valores)
+    try:
+        for posicao, valor in enumerate(valores):
+            extensos[posicao] = moeda_por_extenso(valor)
+    except Exception as e_num2words:
+        app_logger.error(f"Erro ao converter números para extenso com num2words: {e_num2words}", exc_info=True)
+    return extensos
+
+
 def preparar_dados_para_contrato(selected_donatario_data, valor_bruto_doacao, aliquota_percentual, app_logger, cidade_doador_fixo="Mossoró", uf_doador_fixo="RN"):
     """
     Prepara o dicionário de substituições para o contrato.
     Calcula impostos, valores líquidos e formata dados.
     Retorna um dicionário de substituições.
     """
-    app_logger.debug(f"Preparando dados para contrato: Donatário={selected_donatario_data.get('NOME')}, Valor Bruto={valor_bruto_doacao}, Alíquota={aliquota_percentual}%")
+    if app_logger.isEnabledFor(logging.DEBUG):
+        app_logger.debug(f"Preparando dados para contrato: Donatário={selected_donatario_data.get('NOME')}, Valor Bruto={valor_bruto_doacao}, Alíquota={aliquota_percentual}%")
     
     # Cálculos
     valor_itcmd = (valor_bruto_doacao * aliquota_percentual) / 100.0
     valor_liquido_doacao = valor_bruto_doacao - valor_itcmd
 
-    # Data por extenso
-    data_atual = datetime.date.today()
-    meses_extenso = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", 
-                     "julho", "agosto", "setembro", "outubro", "novembro", "dezembro"]
-    try:
-        data_formatada_extenso = f"{cidade_doador_fixo}/{uf_doador_fixo}, {data_atual.day} de {meses_extenso[data_atual.month - 1]} de {data_atual.year}"
-    except IndexError:
-        app_logger.warning("Mês inválido para formatação de data por extenso, usando formato numérico.")
-        data_formatada_extenso = f"{cidade_doador_fixo}/{uf_doador_fixo}, {data_atual.strftime('%d/%m/%Y')}"
-
     # Valores por extenso
-    valor_bruto_extenso = "[ERRO NA GERAÇÃO POR EXTENSO]"
-    valor_itcmd_extenso = "[ERRO NA GERAÇÃO POR EXTENSO]"
-    valor_liquido_extenso = "[ERRO NA GERAÇÃO POR EXTENSO]"
-    try:
-        valor_bruto_extenso = num2words(valor_bruto_doacao, lang='pt_BR', to='currency')
-        valor_itcmd_extenso = num2words(valor_itcmd, lang='pt_BR', to='currency')
-        valor_liquido_extenso = num2words(valor_liquido_doacao, lang='pt_BR', to='currency')
-    except Exception as e_num2words:
-        app_logger.error(f"Erro ao converter números para extenso com num2words: {e_num2words}", exc_info=True)
-        # Mantém o valor de erro definido acima para que o contrato possa ser gerado e o erro notado
+    valor_bruto_extenso, valor_itcmd_extenso, valor_liquido_extenso = _valores_por_extenso(
+        [valor_bruto_doacao, valor_itcmd, valor_liquido_doacao], app_logger)
 
-    # !! ADAPTE AS CHAVES DE selected_donatario_data PARA CORRESPONDER ÀS SUAS COLUNAS !!
     substituicoes = {
-        "NOME_DONATARIO": str(selected_donatario_data.get('NOME', '')).strip().upper(),
-        "NACIONALIDADE_DONATARIO": str(selected_donatario_data.get('NACIONALIDADE', 'N/D')).strip().lower(),
-        "ESTADO_CIVIL_DONATARIO": str(selected_donatario_data.get('ESTADO_CIVIL', 'N/D')).strip().lower(),
-        "PROFISSAO_DONATARIO": str(selected_donatario_data.get('PROFISSAO', 'N/D')).strip().lower(),
-        "RG_DONATARIO": str(selected_donatario_data.get('RG', 'N/D')).strip().upper(),
-        "CPF_DONATARIO": str(selected_donatario_data.get('CPF', '')).strip(),
-        "ENDERECO_DONATARIO": str(selected_donatario_data.get('ENDERECO', 'N/D')).strip().lower().capitalize(),
-        "CIDADE_UF_DONATARIO": str(selected_donatario_data.get('CIDADE_UF', 'N/D')).strip().capitalize(),
-        "CEP_DONATARIO": str(selected_donatario_data.get('CEP', 'N/D')).strip(),
-        "TELEFONE_DONATARIO": str(selected_donatario_data.get('TELEFONE', 'N/D')).strip(),
-        "EMAIL_DONATARIO": str(selected_donatario_data.get('EMAIL', 'N/D')).strip().lower(),
-        "BANCO_DONATARIO": str(selected_donatario_data.get('BANCO', 'N/D')).strip().upper(),
-        "AGENCIA_DONATARIO": str(selected_donatario_data.get('AGENCIA', 'N/D')).strip().upper(),
-        "CONTA_DONATARIO": str(selected_donatario_data.get('CONTA', 'N/D')).strip().upper(),
-        "CONTA_TIPO": str(selected_donatario_data.get('OPERACAO', 'N/D')).strip().lower(),
-
-        "VALOR_BRUTO_DOACAO_NUM": f"{valor_bruto_doacao:,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
-        "VALOR_BRUTO_DOACAO_EXTENSO": valor_bruto_extenso.upper(),
-        "ALIQUOTA_ITCMD_PERCENTUAL": f"{aliquota_percentual:,.2f}%".replace('.', ','),
-        "VALOR_ITCMD_NUM": f"{valor_itcmd:,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
-        "VALOR_ITCMD_EXTENSO": valor_itcmd_extenso.upper(),
-        "VALOR_LIQUIDO_DOACAO_NUM": f"{valor_liquido_doacao:,.2f}".replace('.', '#').replace(',', '.').replace('#', ','),
-        "VALOR_LIQUIDO_DOACAO_EXTENSO": valor_liquido_extenso.upper(),
-        "LOCAL_DATA_COMPLETA": data_formatada_extenso.upper(),
+        placeholder: _transformar_texto(str(selected_donatario_data.get(coluna, padrao)), transformacao)
+        for placeholder, coluna, padrao, transformacao in CAMPOS_DONATARIO
     }
-    app_logger.debug(f"Dicionário de substituições preparado: {substituicoes}")
+    substituicoes.update({
+        "VALOR_BRUTO_DOACAO_NUM": formatar_numero_br(valor_bruto_doacao),
+        "VALOR_BRUTO_DOACAO_EXTENSO": valor_bruto_extenso,
+        "ALIQUOTA_ITCMD_PERCENTUAL": formatar_percentual(aliquota_percentual),
+        "VALOR_ITCMD_NUM": formatar_numero_br(valor_itcmd),
+        "VALOR_ITCMD_EXTENSO": valor_itcmd_extenso,
+        "VALOR_LIQUIDO_DOACAO_NUM": formatar_numero_br(valor_liquido_doacao),
+        "VALOR_LIQUIDO_DOACAO_EXTENSO": valor_liquido_extenso,
+        "LOCAL_DATA_COMPLETA": local_data_completa(cidade_doador_fixo, uf_doador_fixo),
+    })
+    if app_logger.isEnabledFor(logging.DEBUG): # evita formatar o dicionário inteiro fora do modo debug
+        app_logger.debug(f"Dicionário de substituições preparado: {substituicoes}")
     return substituicoes
 
+
+def _eh_escalar(parametro):
+    import numpy as np
+    return not isinstance(parametro, str) and np.ndim(parametro) == 0
+
+
+def converter_valores_numericos(valores, nome_parametro):
     """
-    Carrega um template DOCX, substitui os placeholders e retorna o objeto Document modificado.
-    Levanta FileNotFoundError se o template não for encontrado, ou outras exceções.
+    Converte uma coluna de valores ou alíquotas (textos da planilha ou do CSV, ou números) em floats, de uma
+    vez com pd.to_numeric. Aceita '1500', '2000.5', '1.500,00', 'R$ 1.500,00' e '4%'; com vírgula, o
+    texto é lido no formato pt-BR (ponto de milhar, vírgula decimal).
+    Retorna (valores, invalidos): valores tem None nas células que não são número (ou vazias) e
+    invalidos mapeia a posição da linha para a mensagem de erro.
     """
-    app_logger.debug(f"Preenchendo template DOCX: {caminho_template}")
-    try:
-        if not os.path.exists(caminho_template):
-            app_logger.error(f"Arquivo de template DOCX não encontrado em: {caminho_template}")
-            raise FileNotFoundError(f"O arquivo de template '{caminho_template}' não foi encontrado.")
-
-        document = Document(caminho_template)
-        
-        # Substituição em parágrafos
-        for paragraph in document.paragraphs:
-            for run in paragraph.runs:
-                text = run.text
-                modified = False
-                for key, value in dados_substituicao.items():
-                    if key in text:
-                        text = text.replace(key, str(value))
-                        modified = True
-                if modified:
-                    run.text = text
-        
-        # Substituição em tabelas
-        for table in document.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        for run in paragraph.runs:
-                            text = run.text
-                            modified = False
-                            for key, value in dados_substituicao.items():
-                                if key in text:
-                                    text = text.replace(key, str(value))
-                                    modified = True
-                            if modified:
-                                run.text = text
-        app_logger.debug("Template DOCX preenchido com sucesso.")
-        return document
-    except FileNotFoundError as fnf_error: # Re-levanta FileNotFoundError especificamente
-        app_logger.error(f"FileNotFoundError ao tentar abrir/preencher o template DOCX '{caminho_template}': {fnf_error}", exc_info=True)
-        raise
-    except Exception as e:
-        app_logger.error(f"Erro genérico ao preencher o template DOCX '{caminho_template}': {e}", exc_info=True)
-        raise # Re-levanta outras exceções para serem tratadas pela rota
\ No newline at end of file
+    import pandas as pd
+
+    serie = pd.Series(list(valores), dtype=object)
+    eh_texto = serie.map(lambda valor: isinstance(valor, str)).astype(bool)
+    normalizados = serie.copy()
+    if eh_texto.any():
+        textos = (serie[eh_texto].str.replace('R$', '', regex=False).str.replace('%', '', regex=False)
+                  .str.strip())
+        formato_br = textos.str.contains(',', regex=False)
+        normalizados[eh_texto] = textos.where(
+            ~formato_br, textos.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    numeros = pd.to_numeric(normalizados, errors='coerce').astype(float)
+    invalidos = {posicao: f"Valor inválido para {nome_parametro}: {serie[posicao]!r}"
+                 for posicao in numeros.index[numeros.isna()]}
+    return [None if posicao in invalidos else numero for posicao, numero in enumerate(numeros.tolist())], invalidos
+
+
+def _valores_por_linha(parametro, donatarios_df, nome_parametro):
+    """Escalar (mesmo valor para todas as linhas), nome de coluna do DataFrame ou sequência com um valor por linha."""
+    if isinstance(parametro, str):
+        valores, invalidos = converter_valores_numericos(donatarios_df[parametro], nome_parametro)
+        if invalidos:
+            raise ValueError(f"Coluna '{parametro}' com {len(invalidos)} valor(es) inválido(s): "
+                             + "; ".join(f"linha {posicao}: {mensagem}" for posicao, mensagem in sorted(invalidos.items())))
+        return valores
+    if _eh_escalar(parametro):
+        return [parametro] * len(donatarios_df)
+    valores = list(parametro)
+    if len(valores) != len(donatarios_df):
+        raise ValueError(f"'{nome_parametro}' tem {len(valores)} valores para {len(donatarios_df)} donatários.")
+    return valores
+
+
+def preparar_dados_para_contrato_lote(donatarios_df, valor_bruto_doacao, aliquota_percentual, app_logger, cidade_doador_fixo="Mossoró", uf_doador_fixo="RN"):
+    """
+    Versão em lote de preparar_dados_para_contrato para um DataFrame inteiro de donatários.
+    valor_bruto_doacao e aliquota_percentual podem ser um escalar, o nome de uma coluna do DataFrame
+    ou uma sequência com um valor por linha.
+    Retorna a lista de dicionários de substituições, na ordem das linhas, idênticos aos da versão
+    escalar aplicada a cada linha como RegistroDonatario: células vazias (NaN/None, ex.: colunas que
+    faltam em parte dos registros) contam como coluna ausente e recebem o valor padrão do campo.
+    """
+    import numpy as np
+    import pandas as pd
+
+    total_linhas = len(donatarios_df)
+    app_logger.debug(f"Preparando dados em lote para {total_linhas} contratos.")
+    if total_linhas == 0:
+        return []
+
+    valores_brutos = _valores_por_linha(valor_bruto_doacao, donatarios_df, 'valor_bruto_doacao')
+    aliquotas = _valores_por_linha(aliquota_percentual, donatarios_df, 'aliquota_percentual')
+
+    # Cálculos em arrays (mesmas operações de ponto flutuante da versão escalar)
+    array_brutos = np.asarray(valores_brutos, dtype=float)
+    array_itcmd = (array_brutos * np.asarray(aliquotas, dtype=float)) / 100.0
+    valores_itcmd = array_itcmd.tolist()
+    valores_liquidos = (array_brutos - array_itcmd).tolist()
+
+    # Colunas normalizadas com operações de string vetorizadas
+    colunas = {}
+    for placeholder, coluna, padrao, transformacao in CAMPOS_DONATARIO:
+        if coluna in donatarios_df.columns:
+            serie = donatarios_df[coluna]
+            serie = serie.where(serie.notna(), padrao).map(str).astype(object)
+        else:
+            serie = pd.Series([str(padrao)] * total_linhas, dtype=object)
+        colunas[placeholder] = _transformar_coluna(serie, transformacao)
+
+    # Por extenso: num2words roda uma vez por combinação distinta de valores (chave inclui o tipo do
+    # valor bruto, pois num2words trata int como centavos)
+    if _eh_escalar(valor_bruto_doacao) and _eh_escalar(aliquota_percentual):
+        extensos = [_valores_por_extenso([valores_brutos[0], valores_itcmd[0], valores_liquidos[0]], app_logger)] * total_linhas
+    else:
+        extensos_por_valores = {}
+        extensos = []
+        for valor_bruto, valor_itcmd, valor_liquido in zip(valores_brutos, valores_itcmd, valores_liquidos):
+            chave = (type(valor_bruto), valor_bruto, valor_itcmd, valor_liquido)
+            if chave not in extensos_por_valores:
+                extensos_por_valores[chave] = _valores_por_extenso([valor_bruto, valor_itcmd, valor_liquido], app_logger)
+            extensos.append(extensos_por_valores[chave])
+    brutos_extenso, itcmd_extenso, liquidos_extenso = (list(coluna) for coluna in zip(*extensos))
+
+    colunas.update({
+        "VALOR_BRUTO_DOACAO_NUM": [formatar_numero_br(valor) for valor in valores_brutos],
+        "VALOR_BRUTO_DOACAO_EXTENSO": brutos_extenso,
+        "ALIQUOTA_ITCMD_PERCENTUAL": [formatar_percentual(aliquota) for aliquota in aliquotas],
+        "VALOR_ITCMD_NUM": [formatar_numero_br(valor) for valor in valores_itcmd],
+        "VALOR_ITCMD_EXTENSO": itcmd_extenso,
+        "VALOR_LIQUIDO_DOACAO_NUM": [formatar_numero_br(valor) for valor in valores_liquidos],
+        "VALOR_LIQUIDO_DOACAO_EXTENSO": liquidos_extenso,
+        "LOCAL_DATA_COMPLETA": [local_data_completa(cidade_doador_fixo, uf_doador_fixo)] * total_linhas,
+    })
+    placeholders = list(colunas)
+    lista_substituicoes = [dict(zip(placeholders, linha)) for linha in zip(*colunas.values())]
+    app_logger.debug(f"Dados em lote preparados para {total_linhas} contratos.")
+    return lista_substituicoes
@@ -0,0 +1,281 @@
+# utils/dataset_store.py
+import re
+import json
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import insert, select, literal
+
+from extensions import db
+from models import DatasetDonatarios, DatasetLinha
+from utils.registro_donatario import RegistroDonatario
+
+# Cache em memória de (sheet_id, versao) -> id do dataset, para evitar a consulta a cada requisição
+_cache_ids = OrderedDict()
+_cache_ids_lock = threading.Lock()
+_CACHE_IDS_MAXIMO = 64
+
+_TAMANHO_LOTE_INSERT = 1000
+
+
+def normalizar_cpf(cpf):
+    """Mantém apenas os dígitos do CPF (ex.: '012.345.678-90' -> '01234567890')."""
+    return re.sub(r'\D', '', str(cpf or ''))
+
+
+def serializar_registro(registro):
+    """Bytes gravados na coluna DatasetLinha.dados (aceita dict ou RegistroDonatario)."""
+    return RegistroDonatario.from_dict(registro).serializar()
+
+
+def hash_registro(registro):
+    """Hash do conteúdo de uma linha; usado para detectar linhas alteradas na sincronização incremental."""
+    return hashlib.sha1(serializar_registro(registro)).hexdigest()
+
+
+def _versao_por_hashes(hashes):
+    """A versão do snapshot é o hash da sequência de hashes das linhas (mesmo conteúdo -> mesma versão)."""
+    hash_conteudo = hashlib.sha1()
+    for hash_linha in hashes:
+        hash_conteudo.update(hash_linha.encode('ascii'))
+        hash_conteudo.update(b'\n')
+    return hash_conteudo.hexdigest()
+
+
+def _linha_para_insert(dataset_id, indice, registro, dados, hash_linha, coluna_nome, coluna_cpf):
+    cpf = registro.get(coluna_cpf)
+    return {
+        "dataset_id": dataset_id,
+        "indice": indice,
+        "nome": None if registro.get(coluna_nome) is None else str(registro.get(coluna_nome)),
+        "cpf": None if cpf is None else str(cpf),
+        "cpf_normalizado": normalizar_cpf(cpf),
+        "hash": hash_linha,
+        "dados": dados,
+    }
+
+
+def _inserir_em_lotes(linhas):
+    for inicio in range(0, len(linhas), _TAMANHO_LOTE_INSERT):
+        db.session.execute(insert(DatasetLinha), linhas[inicio:inicio + _TAMANHO_LOTE_INSERT])
+
+
+def criar_referencia(sheet_id, versao):
+    """Referência pequena ao dataset, que é o que fica guardado na sessão."""
+    return {"sheet_id": sheet_id, "versao": versao}
+
+
+def salvar_dataset(sheet_id, registros, logger, coluna_nome='NOME', coluna_cpf='CPF', versoes_mantidas=3, revisao=None):
+    """
+    Grava um snapshot dos registros da planilha e retorna a referência {sheet_id, versao}.
+    A versão é derivada do conteúdo: recarregar a mesma planilha sem mudanças reaproveita o snapshot.
+    Mantém apenas as `versoes_mantidas` versões mais recentes de cada planilha.
+    """
+    linhas_serializadas = [serializar_registro(registro) for registro in registros]
+    hashes = [hashlib.sha1(linha).hexdigest() for linha in linhas_serializadas]
+    versao = _versao_por_hashes(hashes)
+
+    existente = DatasetDonatarios.query.filter_by(sheet_id=sheet_id, versao=versao).first()
+    if existente is not None:
+        logger.info(f"Snapshot {versao[:8]} da planilha '{sheet_id}' já existe. Reaproveitando.")
+        existente.revisao = revisao or existente.revisao
+        existente.criado_em = datetime.datetime.utcnow() # volta a ser o snapshot mais recente
+        db.session.commit()
+        return criar_referencia(sheet_id, versao)
+
+    colunas = list(registros[0].keys()) if registros else []
+    dataset = DatasetDonatarios(sheet_id=sheet_id, versao=versao, revisao=revisao,
+                                colunas_json=json.dumps(colunas, ensure_ascii=False),
+                                total_linhas=len(registros))
+    db.session.add(dataset)
+    db.session.flush()
+
+    _inserir_em_lotes([
+        _linha_para_insert(dataset.id, indice, registro, dados, hash_linha, coluna_nome, coluna_cpf)
+        for indice, (registro, dados, hash_linha) in enumerate(zip(registros, linhas_serializadas, hashes))
+    ])
+
+    _remover_versoes_antigas(sheet_id, versoes_mantidas, manter_id=dataset.id)
+    db.session.commit()
+    logger.info(f"Snapshot {versao[:8]} da planilha '{sheet_id}' salvo com {len(registros)} linhas.")
+    return criar_referencia(sheet_id, versao)
+
+
+def obter_snapshot_para_sincronizacao(sheet_id):
+    """
+    Retorna o snapshot mais recente da planilha no formato esperado por
+    google_services.sincronizar_planilha ({versao, revisao, colunas, nomes, hashes}), ou None.
+    """
+    dataset = (DatasetDonatarios.query
+               .filter_by(sheet_id=sheet_id)
+               .order_by(DatasetDonatarios.criado_em.desc(), DatasetDonatarios.id.desc())
+               .first())
+    if dataset is None:
+        return None
+    linhas = (DatasetLinha.query
+              .filter_by(dataset_id=dataset.id)
+              .order_by(DatasetLinha.indice)
+              .with_entities(DatasetLinha.nome, DatasetLinha.hash)
+              .all())
+    return {
+        "versao": dataset.versao,
+        "revisao": dataset.revisao,
+        "colunas": colunas_dataset(dataset),
+        "nomes": [nome for nome, _ in linhas],
+        "hashes": [hash_linha for _, hash_linha in linhas],
+    }
+
+
+def aplicar_diff(sheet_id, versao_base, sincronizacao, logger, coluna_nome='NOME', coluna_cpf='CPF', versoes_mantidas=3):
+    """
+    Cria um novo snapshot a partir de `versao_base` aplicando o resultado de sincronizar_planilha:
+    as linhas inalteradas são copiadas dentro do próprio SQLite (INSERT ... SELECT) e apenas as
+    linhas novas/alteradas são serializadas e inseridas. Retorna a referência do novo snapshot.
+    """
+    base = obter_dataset(criar_referencia(sheet_id, versao_base))
+    if base is None:
+        raise ValueError(f"Snapshot base {versao_base} da planilha '{sheet_id}' não encontrado.")
+
+    alteracoes = sincronizacao["alteracoes"]
+    total_linhas = sincronizacao["total_linhas"]
+    hashes = [hash_linha for (hash_linha,) in (DatasetLinha.query
+                                                .filter(DatasetLinha.dataset_id == base.id,
+                                                        DatasetLinha.indice < total_linhas)
+                                                .order_by(DatasetLinha.indice)
+                                                .with_entities(DatasetLinha.hash))]
+    hashes.extend([None] * (total_linhas - len(hashes)))
+    linhas_serializadas = {indice: serializar_registro(registro) for indice, registro in alteracoes.items()}
+    for indice, dados in linhas_serializadas.items():
+        hashes[indice] = hashlib.sha1(dados).hexdigest()
+    versao = _versao_por_hashes(hashes)
+
+    existente = DatasetDonatarios.query.filter_by(sheet_id=sheet_id, versao=versao).first()
+    if existente is not None:
+        existente.revisao = sincronizacao.get("revisao") or existente.revisao
+        existente.criado_em = datetime.datetime.utcnow()
+        db.session.commit()
+        return criar_referencia(sheet_id, versao)
+
+    dataset = DatasetDonatarios(sheet_id=sheet_id, versao=versao, revisao=sincronizacao.get("revisao"),
+                                colunas_json=base.colunas_json, total_linhas=total_linhas)
+    db.session.add(dataset)
+    db.session.flush()
+
+    colunas_copia = ['indice', 'nome', 'cpf', 'cpf_normalizado', 'hash', 'dados']
+    db.session.execute(
+        insert(DatasetLinha).from_select(
+            ['dataset_id'] + colunas_copia,
+            select(literal(dataset.id), *[getattr(DatasetLinha, coluna) for coluna in colunas_copia])
+            .where(DatasetLinha.dataset_id == base.id, DatasetLinha.indice < total_linhas)
+        )
+    )
+    indices_alterados = sorted(alteracoes)
+    for inicio in range(0, len(indices_alterados), 500):
+        (DatasetLinha.query
+         .filter(DatasetLinha.dataset_id == dataset.id,
+                 DatasetLinha.indice.in_(indices_alterados[inicio:inicio + 500]))
+         .delete(synchronize_session=False))
+    _inserir_em_lotes([
+        _linha_para_insert(dataset.id, indice, alteracoes[indice], linhas_serializadas[indice],
+                           hashes[indice], coluna_nome, coluna_cpf)
+        for indice in indices_alterados
+    ])
+
+    _remover_versoes_antigas(sheet_id, versoes_mantidas, manter_id=dataset.id)
+    db.session.commit()
+    logger.info(f"Snapshot {versao[:8]} da planilha '{sheet_id}' criado a partir de {versao_base[:8]} "
+                f"({len(alteracoes)} linhas gravadas, {total_linhas} no total).")
+    return criar_referencia(sheet_id, versao)
+
+
+def _remover_versoes_antigas(sheet_id, versoes_mantidas, manter_id):
+    antigos = (DatasetDonatarios.query
+               .filter(DatasetDonatarios.sheet_id == sheet_id, DatasetDonatarios.id != manter_id)
+               .order_by(DatasetDonatarios.criado_em.desc(), DatasetDonatarios.id.desc())
+               .offset(max(0, versoes_mantidas - 1))
+               .all())
+    for dataset in antigos:
+        DatasetLinha.query.filter_by(dataset_id=dataset.id).delete(synchronize_session=False)
+        db.session.delete(dataset)
+        with _cache_ids_lock:
+            _cache_ids.pop((dataset.sheet_id, dataset.versao), None)
+
+
+def obter_dataset(referencia):
+    """Retorna o DatasetDonatarios da referência guardada na sessão, ou None se não existir mais."""
+    if not referencia:
+        return None
+    chave = (referencia.get("sheet_id"), referencia.get("versao"))
+    with _cache_ids_lock:
+        dataset_id = _cache_ids.get(chave)
+        if dataset_id is not None:
+            _cache_ids.move_to_end(chave)
+    if dataset_id is not None:
+        dataset = db.session.get(DatasetDonatarios, dataset_id)
+        # O id pode ter sido reaproveitado (ex.: SQLite depois de remover o dataset): confere a chave
+        if dataset is not None and (dataset.sheet_id, dataset.versao) == chave:
+            return dataset
+
+    dataset = DatasetDonatarios.query.filter_by(sheet_id=chave[0], versao=chave[1]).first()
+    if dataset is not None:
+        with _cache_ids_lock:
+            _cache_ids[chave] = dataset.id
+            while len(_cache_ids) > _CACHE_IDS_MAXIMO:
+                _cache_ids.popitem(last=False)
+    return dataset
+
+
+def colunas_dataset(dataset):
+    return json.loads(dataset.colunas_json or '[]')
+
+
+def obter_linha(referencia, indice):
+    """Retorna o RegistroDonatario da linha `indice` do dataset, ou None. Consulta direta pela chave primária."""
+    dataset = obter_dataset(referencia)
+    if dataset is None:
+        return None
+    linha = db.session.get(DatasetLinha, (dataset.id, int(indice)))
+    return RegistroDonatario.desserializar(linha.dados) if linha is not None else None
+
+
+def obter_linha_por_cpf(referencia, cpf):
+    """Retorna (indice, registro) do primeiro donatário com o CPF informado (com ou sem pontuação), ou None."""
+    dataset = obter_dataset(referencia)
+    if dataset is None:
+        return None
+    linha = (DatasetLinha.query
+             .filter_by(dataset_id=dataset.id, cpf_normalizado=normalizar_cpf(cpf))
+             .order_by(DatasetLinha.indice)
+             .first())
+    return (linha.indice, RegistroDonatario.desserializar(linha.dados)) if linha is not None else None
+
+
+def obter_linhas(referencia, indices, tamanho_lote=500):
+    """Retorna {indice: RegistroDonatario} para os índices pedidos (consultas em lotes com IN)."""
+    dataset = obter_dataset(referencia)
+    if dataset is None:
+        return {}
+    indices = [int(indice) for indice in indices]
+    resultado = {}
+    for inicio in range(0, len(indices), tamanho_lote):
+        lote = indices[inicio:inicio + tamanho_lote]
+        linhas = (DatasetLinha.query
+                  .filter(DatasetLinha.dataset_id == dataset.id, DatasetLinha.indice.in_(lote))
+                  .with_entities(DatasetLinha.indice, DatasetLinha.dados))
+        for indice, dados in linhas:
+            resultado[indice] = RegistroDonatario.desserializar(dados)
+    return resultado
+
+
+def listar_nome_cpf(referencia):
+    """Lista [(indice, nome, cpf)] do dataset em ordem, sem decodificar os registros completos."""
+    dataset = obter_dataset(referencia)
+    if dataset is None:
+        return []
+    return (DatasetLinha.query
+            .filter_by(dataset_id=dataset.id)
+            .order_by(DatasetLinha.indice)
+            .with_entities(DatasetLinha.indice, DatasetLinha.nome, DatasetLinha.cpf)
+            .all())
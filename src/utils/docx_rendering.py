@@ -0,0 +1,158 @@
+# utils/docx_rendering.py
+import io
+import os
+import re
+import logging
+import zipfile
+import threading
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.opc.part import XmlPart
+from docx.oxml.ns import qn
+
+from utils.contract_processing import PLACEHOLDERS_CONTRATO
+
+logger_docx = logging.getLogger(__name__)
+
+# Partes do pacote que podem ter placeholders (corpo, cabeçalhos, rodapés e notas)
+_PARTES_COM_TEXTO = re.compile(r"^/word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$")
+
+_SLOT = "ZQXDOCXSLOT{}XQZ"
+_SLOT_REGEX = re.compile(r"ZQXDOCXSLOT(\d+)XQZ")
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def _regex_placeholders(placeholders):
+    # Mais longos primeiro: VALOR_BRUTO_DOACAO_EXTENSO não pode casar só como VALOR_BRUTO_DOACAO_...
+    return re.compile('|'.join(re.escape(placeholder) for placeholder in sorted(placeholders, key=len, reverse=True)))
+
+
+def _textos_do_paragrafo(paragrafo):
+    """<w:t> do parágrafo em ordem, sem os de parágrafos aninhados (caixas de texto)."""
+    return [texto for texto in paragrafo.iter(qn('w:t'))
+            if next(texto.iterancestors(qn('w:p'))) is paragrafo]
+
+
+def _unir_runs_divididos(textos, padrao):
+    """
+    Junta no primeiro <w:t> cada placeholder que o Word quebrou em vários runs (ex.: 'NOME_' + 'DONATARIO'),
+    mantendo a formatação do run onde o placeholder começa. Retorna os <w:t> que ficaram com placeholders.
+    """
+    conteudos = [texto.text or '' for texto in textos]
+    inicios = []
+    posicao = 0
+    for conteudo in conteudos:
+        inicios.append(posicao)
+        posicao += len(conteudo)
+    completo = ''.join(conteudos)
+
+    def _indice_em(posicao_texto):
+        indice = 0
+        while indice + 1 < len(inicios) and inicios[indice + 1] <= posicao_texto:
+            indice += 1
+        return indice
+
+    # Da direita para a esquerda: o início de cada <w:t> só muda depois do trecho já tratado
+    for ocorrencia in reversed(list(padrao.finditer(completo))):
+        primeiro, ultimo = _indice_em(ocorrencia.start()), _indice_em(ocorrencia.end() - 1)
+        if primeiro == ultimo:
+            continue
+        conteudos[primeiro] = conteudos[primeiro][:ocorrencia.start() - inicios[primeiro]] + ocorrencia.group(0)
+        for indice in range(primeiro + 1, ultimo):
+            conteudos[indice] = ''
+        conteudos[ultimo] = conteudos[ultimo][ocorrencia.end() - inicios[ultimo]:]
+
+    afetados = []
+    for texto, conteudo in zip(textos, conteudos):
+        if conteudo != (texto.text or ''):
+            texto.text = conteudo
+            texto.set('{http://www.w3.org/XML/1998/namespace}space', 'preserve')
+        if padrao.search(conteudo):
+            afetados.append(texto)
+    return afetados
+
+
+class TemplateDocx:
+    """
+    Modelo DOCX indexado uma única vez: os placeholders quebrados em vários runs são unidos e cada
+    <w:t> que contém placeholder vira um slot no XML serializado. Por contrato só esses trechos passam
+    pela regex de substituição; as demais partes do pacote (estilos, fontes, imagens) são copiadas
+    já comprimidas de um ZIP base.
+    """
+
+    def __init__(self, caminho_template, placeholders=PLACEHOLDERS_CONTRATO, logger=logger_docx):
+        if not os.path.exists(caminho_template):
+            raise FileNotFoundError(f"O arquivo de template '{caminho_template}' não foi encontrado.")
+        self.caminho = caminho_template
+        self.mtime = os.path.getmtime(caminho_template)
+        self.padrao = _regex_placeholders(placeholders)
+
+        documento = Document(caminho_template)
+        textos_slots = []
+        for parte in documento.part.package.iter_parts():
+            if not isinstance(parte, XmlPart) or not _PARTES_COM_TEXTO.match(str(parte.partname)):
+                continue
+            for paragrafo in parte.element.iter(qn('w:p')):
+                for texto in _unir_runs_divididos(_textos_do_paragrafo(paragrafo), self.padrao):
+                    texto.text, conteudo = _SLOT.format(len(textos_slots)), texto.text
+                    textos_slots.append(conteudo)
+
+        pacote = io.BytesIO()
+        documento.save(pacote)
+
+        # Partes com slots: [(nome, [texto_xml, slot, texto_xml, ..., texto_xml])]; o resto vai para o ZIP base
+        self.partes_variaveis = []
+        zip_base = io.BytesIO()
+        with zipfile.ZipFile(pacote) as zip_template, \
+                zipfile.ZipFile(zip_base, 'w', zipfile.ZIP_DEFLATED) as zip_saida:
+            for info in zip_template.infolist():
+                conteudo = zip_template.read(info)
+                if info.filename.endswith('.xml') and _SLOT_REGEX.search(conteudo.decode('utf-8')):
+                    partes = _SLOT_REGEX.split(conteudo.decode('utf-8'))
+                    # partes alterna [xml, numero_slot, xml, numero_slot, ..., xml]
+                    self.partes_variaveis.append((info.filename, partes[0::2],
+                                                  [textos_slots[int(numero)] for numero in partes[1::2]]))
+                else:
+                    zip_saida.writestr(info, conteudo, compress_type=zipfile.ZIP_DEFLATED)
+        self.zip_base = zip_base.getvalue()
+        logger.info(f"Modelo DOCX '{os.path.basename(caminho_template)}' indexado: {len(textos_slots)} trecho(s) "
+                    f"com placeholders em {len(self.partes_variaveis)} parte(s).")
+
+    def desatualizado(self):
+        return os.path.getmtime(self.caminho) != self.mtime
+
+    def preencher(self, substituicoes):
+        """Retorna os bytes do DOCX com os placeholders trocados pelos valores de substituicoes."""
+        def _valor(ocorrencia):
+            return str(substituicoes.get(ocorrencia.group(0), ocorrencia.group(0)))
+
+        saida = io.BytesIO(self.zip_base)
+        saida.seek(0, io.SEEK_END)
+        with zipfile.ZipFile(saida, 'a', zipfile.ZIP_DEFLATED) as zip_saida:
+            for nome_parte, textos_xml, textos_slots in self.partes_variaveis:
+                partes = [textos_xml[0]]
+                for texto_slot, texto_xml in zip(textos_slots, textos_xml[1:]):
+                    partes.append(escape(self.padrao.sub(_valor, texto_slot)))
+                    partes.append(texto_xml)
+                zip_saida.writestr(nome_parte, ''.join(partes).encode('utf-8'))
+        return saida.getvalue()
+
+
+def get_template_docx(caminho_template, logger=logger_docx):
+    """Retorna o modelo DOCX indexado, reindexando quando o arquivo muda (mtime)."""
+    with _templates_lock:
+        template = _templates.get(caminho_template)
+        if template is None or template.desatualizado():
+            template = TemplateDocx(caminho_template, logger=logger)
+            _templates[caminho_template] = template
+        return template
+
+
+def gerar_docx_bytes(substituicoes, logger, caminho_template):
+    """Preenche o modelo DOCX (indexado uma vez por processo) e retorna os bytes do contrato editável."""
+    docx_bytes = get_template_docx(caminho_template, logger).preencher(substituicoes)
+    logger.debug(f"DOCX gerado a partir de '{caminho_template}' ({len(docx_bytes)} bytes).")
+    return docx_bytes
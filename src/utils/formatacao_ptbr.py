@@ -0,0 +1,58 @@
+# utils/formatacao_ptbr.py
+import datetime
+import functools
+
+from num2words import CONVERTER_CLASSES
+
+MESES_EXTENSO = ["janeiro", "fevereiro", "março", "abril", "maio", "junho",
+                 "julho", "agosto", "setembro", "outubro", "novembro", "dezembro"]
+
+# Conversor pt_BR do num2words resolvido uma vez; num2words(..., lang='pt_BR', to='currency')
+# procura a língua e o tipo de conversão a cada chamada antes de chegar nele
+_CONVERSOR_PT_BR = CONVERTER_CLASSES['pt_BR']
+
+# Limites das caches: valores de doação, alíquotas e datas se repetem muito entre contratos
+_TAMANHO_CACHE_NUMEROS = 4096
+_TAMANHO_CACHE_EXTENSO = 4096
+_TAMANHO_CACHE_DATAS = 64
+
+
+@functools.lru_cache(maxsize=_TAMANHO_CACHE_NUMEROS, typed=True)
+def formatar_numero_br(valor):
+    """
+    Formata 1234.5 como '1.234,50'. O agrupamento com '_' deixa o ponto decimal como único '.', então
+    bastam duas trocas diretas (sem o caractere temporário da troca tripla). Memorizado.
+    """
+    return f"{valor:_.2f}".replace('.', ',').replace('_', '.')
+
+
+@functools.lru_cache(maxsize=1024, typed=True)
+def formatar_percentual(aliquota_percentual):
+    return f"{aliquota_percentual:,.2f}%".replace('.', ',')
+
+
+@functools.lru_cache(maxsize=_TAMANHO_CACHE_EXTENSO, typed=True)
+def moeda_por_extenso(valor):
+    """
+    Valor em reais por extenso, em maiúsculas (mesmo texto de num2words(valor, lang='pt_BR', to='currency')).
+    typed=True: num2words trata int como centavos, então 1000 e 1000.0 não podem dividir a mesma entrada.
+    """
+    if isinstance(valor, str):
+        valor = _CONVERSOR_PT_BR.str_to_number(valor)
+    return _CONVERSOR_PT_BR.to_currency(valor).upper()
+
+
+@functools.lru_cache(maxsize=_TAMANHO_CACHE_DATAS)
+def _local_data_do_dia(cidade, uf, data):
+    return f"{cidade}/{uf}, {data.day} de {MESES_EXTENSO[data.month - 1]} de {data.year}".upper()
+
+
+def local_data_completa(cidade, uf, data=None):
+    """'MOSSORÓ/RN, 5 DE MARÇO DE 2025' para a data informada (padrão: hoje); montado uma vez por dia."""
+    return _local_data_do_dia(cidade, uf, data or datetime.date.today())
+
+
+def limpar_caches():
+    """Esvazia as caches de formatação (ex.: para medir o custo sem memorização)."""
+    for funcao in (formatar_numero_br, formatar_percentual, moeda_por_extenso, _local_data_do_dia):
+        funcao.cache_clear()
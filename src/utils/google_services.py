@@ -1,11 +1,14 @@
 # utils/google_services.py
 import os
+import time
+import threading
 import gspread
-import pandas as pd
 from oauth2client.service_account import ServiceAccountCredentials
 from google.oauth2 import service_account
 from flask import flash, current_app # Para usar logger e flash
 from config import Config
+from utils.dataset_store import hash_registro
+from utils.metricas import CACHE
 
 
 CREDENTIALS_FILE = Config.CREDENTIALS_FILE
@@ -15,29 +18,132 @@ CREDENTIALS_FILE = Config.CREDENTIALS_FILE
 SCOPES_GSPREAD = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
 SCOPES_DRIVE = ['https://www.googleapis.com/auth/drive.readonly']
 
+# Cliente autorizado reutilizado por todo o processo (ver get_google_sheets_client)
+_cliente_cache = {"client": None, "creds": None, "credentials_file": None, "mtime": None}
+_cliente_lock = threading.Lock()
+# Cliente injetado (ex.: backend gspread falso em testes e benchmarks); tem prioridade sobre o real
+_cliente_injetado = None
+
+# Cache dos dados das planilhas: sheet_id -> {"registros", "revisao", "carregado_em"}
+_cache_planilhas = {}
+_cache_planilhas_lock = threading.Lock()
+
+
+def definir_cliente_sheets(client):
+    """Injeta um cliente compatível com gspread (ou None para voltar ao cliente real) e limpa os caches."""
+    global _cliente_injetado
+    _cliente_injetado = client
+    limpar_cache_planilhas()
+
+
+def limpar_cache_planilhas(sheet_id=None):
+    """Remove do cache os dados de uma planilha (ou de todas, se sheet_id for None)."""
+    with _cache_planilhas_lock:
+        if sheet_id is None:
+            _cache_planilhas.clear()
+        else:
+            _cache_planilhas.pop(sheet_id, None)
+
+
+def _renovar_token_se_expirado(creds, logger):
+    """Renova o token de acesso apenas quando ele expirou (oauth2client ou google-auth)."""
+    if getattr(creds, 'access_token_expired', False): # oauth2client
+        logger.info("Token do Google Sheets expirado. Renovando...")
+        creds.get_access_token()
+    elif getattr(creds, 'expired', False) and hasattr(creds, 'refresh'): # google-auth
+        from google.auth.transport.requests import Request
+        logger.info("Token do Google Sheets expirado. Renovando...")
+        creds.refresh(Request())
+
 
 def get_google_sheets_client(logger, credentials_file_path=CREDENTIALS_FILE):
+    """
+    Retorna o cliente gspread autorizado, compartilhado pelo processo.
+    As credenciais só são relidas se o arquivo mudar; o token só é renovado quando expira.
+    """
+    if _cliente_injetado is not None:
+        return _cliente_injetado
+
     logger.debug(f"Tentando autenticar Google Sheets com credenciais: {credentials_file_path}")
     try:
         if not os.path.exists(credentials_file_path):
             logger.error(f"Arquivo de credenciais '{credentials_file_path}' não encontrado.")
             # Não chame flash aqui, deixe a rota tratar. Retorne None ou levante uma exceção.
             return None # Exemplo
-        creds = ServiceAccountCredentials.from_json_keyfile_name(credentials_file_path, SCOPES_GSPREAD)
-        client = gspread.authorize(creds)
+        mtime_credenciais = os.path.getmtime(credentials_file_path)
+
+        with _cliente_lock:
+            if (_cliente_cache["client"] is not None
+                    and _cliente_cache["credentials_file"] == credentials_file_path
+                    and _cliente_cache["mtime"] == mtime_credenciais):
+                _renovar_token_se_expirado(_cliente_cache["creds"], logger)
+                logger.debug("Reutilizando cliente Google Sheets já autenticado.")
+                return _cliente_cache["client"]
+
+            creds = ServiceAccountCredentials.from_json_keyfile_name(credentials_file_path, SCOPES_GSPREAD)
+            client = gspread.authorize(creds)
+            _cliente_cache.update(client=client, creds=creds,
+                                  credentials_file=credentials_file_path, mtime=mtime_credenciais)
         logger.info("Cliente Google Sheets autenticado com sucesso.")
         return client
     except Exception as e:
         logger.error(f"Erro ao autenticar com Google Sheets: {e}", exc_info=True)
         return None
-    
 
-def get_sheet_data(sheet_url_or_id, logger):
-    """Busca dados de uma Planilha Google e retorna como DataFrame."""
+
+def revisao_em_cache(sheet_id):
+    """Revisão (modifiedTime) da última leitura completa da planilha guardada no cache, se houver."""
+    with _cache_planilhas_lock:
+        return (_cache_planilhas.get(sheet_id) or {}).get("revisao")
+
+
+def extrair_id_planilha(sheet_url_or_id):
+    """Extrai o ID da planilha de uma URL do Google Sheets (ou retorna o próprio ID)."""
+    sheet_url_or_id = sheet_url_or_id.strip()
+    if "docs.google.com/spreadsheets/d/" in sheet_url_or_id:
+        return sheet_url_or_id.split('/d/')[1].split('/')[0]
+    return sheet_url_or_id
+
+
+def _obter_revisao(sheet, logger):
+    """Retorna o modifiedTime da planilha (Drive API), ou None se não for possível obtê-lo."""
+    try:
+        if hasattr(sheet, 'get_lastUpdateTime'):
+            return sheet.get_lastUpdateTime()
+        return getattr(sheet, 'lastUpdateTime', None)
+    except Exception as e:
+        logger.warning(f"Não foi possível obter a revisão (modifiedTime) da planilha: {e}")
+        return None
+
+
+def _ler_registros(worksheet):
+    """
+    Registros da aba como texto, exatamente como aparecem na planilha: sem numericise, CPF, CEP,
+    agência e conta com zeros à esquerda não viram números.
+    """
+    return worksheet.get_all_records(numericise_ignore=['all'])
+
+
+def get_sheet_records(sheet_url_or_id, logger, client=None, usar_cache=True):
+    """
+    Busca dados de uma Planilha Google e retorna a lista de registros (dict coluna -> texto).
+    Usa um cache por ID de planilha: dentro de SHEETS_CACHE_TTL não há nenhuma chamada à API;
+    depois do TTL, só recarrega os registros se o modifiedTime da planilha tiver mudado.
+    """
+    sheet_id = extrair_id_planilha(sheet_url_or_id)
+    ttl = getattr(Config, 'SHEETS_CACHE_TTL', 0)
+
+    with _cache_planilhas_lock:
+        entrada_cache = _cache_planilhas.get(sheet_id) if usar_cache else None
+    if entrada_cache and time.monotonic() - entrada_cache["carregado_em"] < ttl:
+        logger.info(f"Dados da planilha '{sheet_id}' servidos do cache (TTL).")
+        CACHE.inc(cache='planilhas', resultado='acerto_ttl')
+        return entrada_cache["registros"]
+
     logger.info(f"Tentando obter cliente Google Sheets para: {sheet_url_or_id}")
-    client = get_google_sheets_client(logger=logger, credentials_file_path=CREDENTIALS_FILE)
+    client = client or get_google_sheets_client(logger=logger, credentials_file_path=CREDENTIALS_FILE)
     if not client:
-        logger.error("Cliente autenticação não fornecido para get_sheet_data.")
+        logger.error("Cliente autenticação não fornecido para get_sheet_records.")
         return None
     
     try:
@@ -62,17 +168,31 @@ def get_sheet_data(sheet_url_or_id, logger):
             sheet = client.open_by_key(sheet_url_or_id)
 
         logger.info(f"Planilha '{sheet.title}' aberta com sucesso.")
+
+        revisao = _obter_revisao(sheet, logger) if usar_cache else None
+        if entrada_cache and revisao is not None and revisao == entrada_cache["revisao"]:
+            logger.info(f"Planilha '{sheet_id}' não mudou desde a última leitura (revisão {revisao}). Usando cache.")
+            with _cache_planilhas_lock:
+                entrada_cache["carregado_em"] = time.monotonic()
+            CACHE.inc(cache='planilhas', resultado='acerto_revisao')
+            return entrada_cache["registros"]
         
         worksheet = sheet.sheet1 # Assume a primeira aba
         logger.info(f"Acessando primeira aba (worksheet): '{worksheet.title}'.")
         
-        data = worksheet.get_all_records() # Espera cabeçalhos na primeira linha
+        data = _ler_registros(worksheet) # Espera cabeçalhos na primeira linha
+        if usar_cache:
+            CACHE.inc(cache='planilhas', resultado='falha')
         logger.info(f"Dados lidos da planilha: {len(data)} registros.")
         
         if not data:
             logger.warning(f"Nenhum dado encontrado na planilha '{sheet.title}' (worksheet: '{worksheet.title}'). Verifique se há dados e cabeçalhos.")
 
-        return pd.DataFrame(data)
+        if usar_cache:
+            with _cache_planilhas_lock:
+                _cache_planilhas[sheet_id] = {"registros": data, "revisao": revisao, "carregado_em": time.monotonic()}
+
+        return data
 
     except gspread.exceptions.SpreadsheetNotFound:
         logger.error(f"SpreadsheetNotFound para o identificador: '{sheet_url_or_id}' (ID tentado: '{actual_id_to_open if 'actual_id_to_open' in locals() else sheet_url_or_id}').")
@@ -83,3 +203,131 @@ def get_sheet_data(sheet_url_or_id, logger):
     except Exception as e:
         logger.error(f"Erro inesperado ao ler planilha '{sheet_url_or_id}': {e}", exc_info=True)
         return None
+
+
+def _agrupar_intervalos(indices, tamanho_bloco):
+    """Agrupa índices ordenados em intervalos contíguos [inicio, fim], com no máximo tamanho_bloco linhas cada."""
+    intervalos = []
+    for indice in sorted(indices):
+        if intervalos and indice == intervalos[-1][1] + 1 and indice - intervalos[-1][0] < tamanho_bloco:
+            intervalos[-1][1] = indice
+        else:
+            intervalos.append([indice, indice])
+    return intervalos
+
+
+def _linha_para_registro(cabecalho, valores):
+    """Converte a linha bruta em registro no mesmo formato de _ler_registros (valores como texto)."""
+    valores = list(valores) + [''] * (len(cabecalho) - len(valores))
+    return dict(zip(cabecalho, valores[:len(cabecalho)]))
+
+
+def sincronizar_planilha(sheet_url_or_id, logger, snapshot, client=None, coluna_chave='NOME',
+                         verificar_edicoes=True, tamanho_bloco=500):
+    """
+    Sincroniza incrementalmente a primeira aba da planilha com o último snapshot local
+    (ver dataset_store.obter_snapshot_para_sincronizacao).
+
+    - Se o modifiedTime não mudou, nada é lido.
+    - Com verificar_edicoes=True (padrão), lê todo o intervalo de valores da aba numa única chamada
+      (worksheet.batch_get) e compara o hash de cada linha com o do snapshot: pega edições em qualquer
+      coluna (CPF, banco, agência, conta), além de linhas novas e removidas.
+    - Com verificar_edicoes=False, só lê a coluna-chave (NOME) e as linhas novas ou deslocadas, junto com
+      as linhas depois da última chave preenchida (até worksheet.row_count), que definem o total real.
+      Uma edição em outra coluna de uma linha cuja chave não mudou não é detectada nesse modo.
+
+    Retorna um dict com 'modo' ('sem_alteracoes', 'incremental' ou 'completo'), 'revisao', 'total_linhas',
+    'alteracoes' ({indice: registro}), 'adicionadas', 'alteradas', 'removidas' e 'linhas_lidas'.
+    No modo 'completo' (cabeçalho mudou), 'registros' traz a planilha inteira. Retorna None em caso de erro.
+    """
+    sheet_id = extrair_id_planilha(sheet_url_or_id)
+    client = client or get_google_sheets_client(logger=logger, credentials_file_path=CREDENTIALS_FILE)
+    if not client:
+        logger.error("Cliente autenticação não fornecido para sincronizar_planilha.")
+        return None
+
+    try:
+        sheet = client.open_by_key(sheet_id)
+        revisao = _obter_revisao(sheet, logger)
+        if revisao is not None and revisao == snapshot.get("revisao"):
+            logger.info(f"Planilha '{sheet_id}' sem alterações desde o último snapshot (revisão {revisao}).")
+            return {"modo": "sem_alteracoes", "revisao": revisao, "total_linhas": len(snapshot["hashes"]),
+                    "alteracoes": {}, "adicionadas": [], "alteradas": [], "removidas": [], "linhas_lidas": 0}
+
+        worksheet = sheet.sheet1 # Assume a primeira aba
+        cabecalho = worksheet.row_values(1)
+        if cabecalho != snapshot["colunas"] or coluna_chave not in cabecalho:
+            logger.info(f"Cabeçalho da planilha '{sheet_id}' mudou. Fazendo leitura completa.")
+            registros = _ler_registros(worksheet)
+            return {"modo": "completo", "revisao": revisao, "total_linhas": len(registros), "registros": registros,
+                    "alteracoes": dict(enumerate(registros)), "adicionadas": list(range(len(registros))),
+                    "alteradas": [], "removidas": [], "linhas_lidas": len(registros)}
+
+        total_antigo = len(snapshot["hashes"])
+        ultima_coluna = gspread.utils.rowcol_to_a1(1, len(cabecalho)).rstrip('0123456789')
+        # row_count é o tamanho da grade (inclui linhas vazias, que a API corta da resposta)
+        ultima_linha_grade = worksheet.row_count
+
+        if verificar_edicoes:
+            # Todas as linhas de dados numa chamada; o hash por linha separa o que mudou do que não mudou
+            valores_por_range = (worksheet.batch_get([f"A2:{ultima_coluna}{ultima_linha_grade}"])
+                                 if ultima_linha_grade > 1 else [[]])
+            total_novo = len(valores_por_range[0])
+            intervalos = [[0, total_novo - 1]] if total_novo else []
+            linhas_lidas, total_ranges = total_novo, 1
+        else:
+            # A API corta as células vazias do fim da coluna-chave: linhas finais com NOME vazio (mas outras
+            # colunas preenchidas) ficam de fora de `chaves` e são lidas pelo intervalo da cauda abaixo
+            chaves = worksheet.col_values(cabecalho.index(coluna_chave) + 1)[1:]
+            total_chaves = len(chaves)
+            indices_para_ler = set(range(total_antigo, total_chaves))
+            nomes_antigos = snapshot["nomes"]
+            for indice in range(min(total_chaves, total_antigo)):
+                if chaves[indice] != nomes_antigos[indice]:
+                    indices_para_ler.add(indice)
+
+            intervalos = _agrupar_intervalos(indices_para_ler, tamanho_bloco)
+            ranges = [f"A{inicio + 2}:{ultima_coluna}{fim + 2}" for inicio, fim in intervalos]
+            # Cauda: da linha seguinte à última chave até o fim da grade, na mesma chamada. O que vier
+            # nela completa o total de linhas de dados.
+            if ultima_linha_grade > total_chaves + 1:
+                ranges.append(f"A{total_chaves + 2}:{ultima_coluna}{ultima_linha_grade}")
+            valores_por_range = worksheet.batch_get(ranges) if ranges else []
+            cauda = list(valores_por_range[len(intervalos)]) if len(valores_por_range) > len(intervalos) else []
+            total_novo = total_chaves + len(cauda)
+            if cauda:
+                intervalos.append([total_chaves, total_novo - 1])
+            linhas_lidas, total_ranges = len(indices_para_ler) + len(cauda), len(ranges)
+        logger.info(f"Sincronização de '{sheet_id}': {linhas_lidas} linhas lidas em {total_ranges} intervalo(s).")
+
+        alteracoes, adicionadas, alteradas = {}, [], []
+        for (inicio, fim), valores in zip(intervalos, valores_por_range):
+            valores = list(valores)
+            for deslocamento in range(fim - inicio + 1):
+                indice = inicio + deslocamento
+                linha = valores[deslocamento] if deslocamento < len(valores) else []
+                registro = _linha_para_registro(cabecalho, linha)
+                if indice >= total_antigo:
+                    adicionadas.append(indice)
+                elif hash_registro(registro) != snapshot["hashes"][indice]:
+                    alteradas.append(indice)
+                else:
+                    continue
+                alteracoes[indice] = registro
+
+        removidas = list(range(total_novo, total_antigo))
+        logger.info(f"Sincronização de '{sheet_id}': {len(adicionadas)} adicionadas, "
+                    f"{len(alteradas)} alteradas, {len(removidas)} removidas.")
+        return {"modo": "incremental", "revisao": revisao, "total_linhas": total_novo, "alteracoes": alteracoes,
+                "adicionadas": adicionadas, "alteradas": alteradas, "removidas": removidas,
+                "linhas_lidas": linhas_lidas}
+
+    except gspread.exceptions.SpreadsheetNotFound:
+        logger.error(f"SpreadsheetNotFound para o identificador: '{sheet_url_or_id}' (ID tentado: '{sheet_id}').")
+        return None
+    except gspread.exceptions.APIError as api_e:
+        logger.error(f"gspread.exceptions.APIError ao sincronizar planilha '{sheet_url_or_id}': {api_e}", exc_info=True)
+        return None
+    except Exception as e:
+        logger.error(f"Erro inesperado ao sincronizar planilha '{sheet_url_or_id}': {e}", exc_info=True)
+        return None
@@ -0,0 +1,105 @@
+# utils/indice_donatarios.py
+import bisect
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from utils.dataset_store import listar_nome_cpf, normalizar_cpf
+
+# Índices em memória por snapshot (sheet_id, versao). Um snapshot nunca muda, então o índice
+# é montado uma vez e só sai do cache por LRU.
+_indices = OrderedDict()
+_indices_lock = threading.Lock()
+_INDICES_MAXIMO = 16
+
+
+# Termo que pode ser um CPF: só dígitos e a pontuação do CPF ('012.345', '678-90')
+_CARACTERES_TERMO_CPF = frozenset('0123456789.-/ ')
+
+
+def normalizar_nome(nome):
+    """Nome para busca: sem acentos, minúsculo e com espaços simples ('  José  SILVA' -> 'jose silva')."""
+    decomposto = unicodedata.normalize('NFKD', str(nome or ''))
+    sem_acentos = ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+class IndiceDonatarios:
+    """
+    Índice NOME/CPF de um snapshot, para listagem paginada e busca por prefixo/substring.
+    Prefixos usam busca binária em listas ordenadas; substrings varrem as chaves já normalizadas.
+    """
+
+    def __init__(self, linhas):
+        # linhas: [(indice, nome, cpf)] na ordem da planilha (dataset_store.listar_nome_cpf)
+        self.indices = [indice for indice, _, _ in linhas]
+        self.nomes = [nome for _, nome, _ in linhas]
+        self.cpfs = [cpf for _, _, cpf in linhas]
+        self.nomes_busca = [normalizar_nome(nome) for nome in self.nomes]
+        self.cpfs_busca = [normalizar_cpf(cpf) for cpf in self.cpfs]
+        self._nomes_ordenados = sorted((nome, posicao) for posicao, nome in enumerate(self.nomes_busca))
+        self._cpfs_ordenados = sorted((cpf, posicao) for posicao, cpf in enumerate(self.cpfs_busca))
+
+    def __len__(self):
+        return len(self.indices)
+
+    @staticmethod
+    def _prefixo(ordenados, termo):
+        inicio = bisect.bisect_left(ordenados, (termo, -1))
+        posicoes = []
+        for chave, posicao in ordenados[inicio:]:
+            if not chave.startswith(termo):
+                break
+            posicoes.append(posicao)
+        return posicoes
+
+    def buscar(self, termo):
+        """
+        Posições das linhas que casam com o termo: primeiro as que começam com ele (NOME ou CPF só com dígitos),
+        depois as que só o contêm, cada grupo na ordem da planilha. Termo vazio retorna todas.
+        O CPF só é consultado quando o termo tem apenas dígitos e pontuação de CPF: em 'Maria 2' o '2'
+        é parte do nome, não um prefixo de CPF.
+        """
+        termo_nome = normalizar_nome(termo)
+        termo_cpf = normalizar_cpf(termo) if set(str(termo or '')) <= _CARACTERES_TERMO_CPF else ''
+        if not termo_nome:
+            return list(range(len(self.indices)))
+
+        prefixos = set(self._prefixo(self._nomes_ordenados, termo_nome))
+        if termo_cpf:
+            prefixos.update(self._prefixo(self._cpfs_ordenados, termo_cpf))
+        contem = set()
+        for posicao, nome in enumerate(self.nomes_busca):
+            if posicao not in prefixos and termo_nome in nome:
+                contem.add(posicao)
+        if termo_cpf:
+            for posicao, cpf in enumerate(self.cpfs_busca):
+                if posicao not in prefixos and termo_cpf in cpf:
+                    contem.add(posicao)
+        return sorted(prefixos) + sorted(contem)
+
+    def pagina(self, termo='', pagina=1, por_pagina=50):
+        """Retorna (total, [{'indice', 'nome', 'cpf'}]) da página pedida (começando em 1)."""
+        posicoes = self.buscar(termo)
+        inicio = (pagina - 1) * por_pagina
+        itens = [{"indice": self.indices[posicao], "nome": self.nomes[posicao], "cpf": self.cpfs[posicao]}
+                 for posicao in posicoes[inicio:inicio + por_pagina]]
+        return len(posicoes), itens
+
+
+def obter_indice(referencia):
+    """Retorna o IndiceDonatarios do snapshot referenciado na sessão, montando-o na primeira consulta."""
+    if not referencia:
+        return None
+    chave = (referencia.get("sheet_id"), referencia.get("versao"))
+    with _indices_lock:
+        indice = _indices.get(chave)
+        if indice is not None:
+            _indices.move_to_end(chave)
+            return indice
+    indice = IndiceDonatarios(listar_nome_cpf(referencia))
+    with _indices_lock:
+        _indices[chave] = indice
+        while len(_indices) > _INDICES_MAXIMO:
+            _indices.popitem(last=False)
+    return indice
@@ -0,0 +1,272 @@
+# utils/job_queue.py
+import json
+import uuid
+import datetime
+import threading
+import time
+
+from extensions import db
+from models import ContratoJob
+from utils.pdf_rendering import (renderizar_contrato_worker, renderizar_volume_mesclado_worker,
+                                 preparar_tarefa_contrato, preparar_tarefas_contratos, dividir_volumes,
+                                 nome_arquivo_pdf_unico, executar_no_pool, registrar_metricas_render)
+from utils.pdf_cache import get_cache_pdf, chave_cache_contrato
+from utils.metricas import ERROS
+from utils.armazenamento_contratos import gravar_contrato, listar_contratos_do_job
+from utils.registro_donatario import RegistroDonatario
+
+# Acorda os workers assim que um job novo é enfileirado (sem esperar o intervalo de polling)
+_novo_job = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+_ultima_recuperacao = 0.0
+
+
+def submeter_job(dados_donatario, valor_bruto_doacao, aliquota_percentual, base_url, logger, max_tentativas=3,
+                 upload_folder='uploads'):
+    """
+    Cria um job de geração de PDF e retorna o objeto ContratoJob.
+    Se o mesmo contrato já estiver no cache de PDFs, o job já nasce concluído.
+    """
+    dados_donatario = RegistroDonatario.from_dict(dados_donatario)
+    job = ContratoJob(
+        id=uuid.uuid4().hex,
+        dados_donatario_json=json.dumps(dados_donatario.to_dict(), ensure_ascii=False),
+        nome_donatario=str(dados_donatario.get('NOME', '')),
+        valor_bruto_doacao=valor_bruto_doacao,
+        aliquota_percentual=aliquota_percentual,
+        base_url=base_url,
+        max_tentativas=max_tentativas,
+    )
+
+    _, contexto_contrato, nome_arquivo_pdf, _ = preparar_tarefa_contrato(
+        0, dados_donatario, valor_bruto_doacao, aliquota_percentual, base_url, logger)
+    pdf_bytes = get_cache_pdf().obter(chave_cache_contrato(contexto_contrato))
+    if pdf_bytes is not None:
+        gravar_contrato(pdf_bytes, nome_arquivo_pdf, dados_donatario, valor_bruto_doacao, aliquota_percentual,
+                        logger, upload_folder=upload_folder, job_id=job.id)
+        job.nome_arquivo_pdf = nome_arquivo_pdf
+        job.status = ContratoJob.STATUS_CONCLUIDO
+        job.progresso = 100
+        logger.info(f"Contrato de '{job.nome_donatario}' encontrado no cache de PDFs.")
+
+    db.session.add(job)
+    db.session.commit()
+    if job.status != ContratoJob.STATUS_CONCLUIDO:
+        logger.info(f"Job {job.id} enfileirado para o donatário '{job.nome_donatario}'.")
+        _novo_job.set()
+    return job
+
+
+def submeter_job_pdf_mesclado(itens, base_url, logger, max_tentativas=3):
+    """
+    Cria um job que gera o PDF único de um lote (ver _gerar_pdf_mesclado_do_job) e retorna o ContratoJob.
+    itens: [(dados_donatario, valor_bruto_doacao, aliquota_percentual)], na ordem dos contratos no PDF.
+    """
+    dados_itens = [{"dados": RegistroDonatario.from_dict(dados_donatario).to_dict(),
+                    "valor_bruto_doacao": valor_bruto_doacao, "aliquota_percentual": aliquota_percentual}
+                   for dados_donatario, valor_bruto_doacao, aliquota_percentual in itens]
+    job = ContratoJob(
+        id=uuid.uuid4().hex,
+        tipo=ContratoJob.TIPO_PDF_MESCLADO,
+        total_contratos=len(dados_itens),
+        dados_donatario_json=json.dumps(dados_itens, ensure_ascii=False),
+        nome_donatario=f"Lote de {len(dados_itens)} donatários",
+        base_url=base_url,
+        max_tentativas=max_tentativas,
+    )
+    db.session.add(job)
+    db.session.commit()
+    logger.info(f"Job {job.id} enfileirado: PDF único com {len(dados_itens)} contratos.")
+    _novo_job.set()
+    return job
+
+
+def obter_job(job_id):
+    return db.session.get(ContratoJob, job_id)
+
+
+def _reservar_proximo_job():
+    """
+    Reserva atomicamente o próximo job pendente (UPDATE condicional no status),
+    para que dois workers nunca processem o mesmo job.
+    """
+    agora = datetime.datetime.utcnow()
+    candidatos = (ContratoJob.query
+                  .filter(ContratoJob.status == ContratoJob.STATUS_PENDENTE,
+                          ContratoJob.proxima_tentativa_em <= agora)
+                  .order_by(ContratoJob.criado_em)
+                  .with_entities(ContratoJob.id)
+                  .limit(5)
+                  .all())
+    for (job_id,) in candidatos:
+        reservados = (ContratoJob.query
+                      .filter(ContratoJob.id == job_id, ContratoJob.status == ContratoJob.STATUS_PENDENTE)
+                      .update({ContratoJob.status: ContratoJob.STATUS_PROCESSANDO,
+                               ContratoJob.progresso: 10,
+                               ContratoJob.atualizado_em: agora},
+                              synchronize_session=False))
+        db.session.commit()
+        if reservados:
+            return db.session.get(ContratoJob, job_id)
+    return None
+
+
+def _atualizar_progresso(job, progresso):
+    job.progresso = progresso
+    db.session.commit()
+
+
+def _heartbeat(job):
+    """Renova atualizado_em enquanto o job renderiza, para _recuperar_jobs_travados não tomá-lo por interrompido."""
+    job.atualizado_em = datetime.datetime.utcnow()
+    db.session.commit()
+
+
+def _gerar_contrato_do_job(app, job):
+    """Renderiza o PDF do contrato no pool de processos e grava o resultado no armazenamento de contratos."""
+    dados_donatario = RegistroDonatario.from_dict(json.loads(job.dados_donatario_json))
+    tarefa = preparar_tarefa_contrato(0, dados_donatario, job.valor_bruto_doacao, job.aliquota_percentual,
+                                      job.base_url, app.logger)
+    cache_pdf = get_cache_pdf()
+    chave_cache = chave_cache_contrato(tarefa[1])
+    # Outro job idêntico (ex.: clique duplo) pode ter preenchido o cache desde a submissão
+    pdf_bytes = cache_pdf.obter(chave_cache, registrar_falha=False)
+    nome_arquivo_pdf = tarefa[2]
+    if pdf_bytes is None:
+        _, nome_arquivo_pdf, pdf_bytes, tempos_etapas = executar_no_pool(renderizar_contrato_worker, tarefa)
+        registrar_metricas_render(tempos_etapas, pdf_bytes)
+        cache_pdf.guardar(chave_cache, pdf_bytes)
+    _atualizar_progresso(job, 80)
+
+    gravar_contrato(pdf_bytes, nome_arquivo_pdf, dados_donatario, job.valor_bruto_doacao, job.aliquota_percentual,
+                    app.logger, upload_folder=app.config.get('UPLOAD_FOLDER', 'uploads'), job_id=job.id,
+                    coluna_cpf=app.config.get('COLUNA_CPF_PADRAO', 'CPF'))
+    job.nome_arquivo_pdf = nome_arquivo_pdf
+
+
+def _gerar_pdf_mesclado_do_job(app, job):
+    """
+    Renderiza o PDF único do lote, um volume (PDF_MESCLADO_CONTRATOS_POR_VOLUME contratos) por vez no
+    pool de processos, e grava cada volume no armazenamento de contratos com o job_id. Numa nova
+    tentativa, os volumes já gravados não são renderizados de novo.
+    """
+    itens = json.loads(job.dados_donatario_json)
+    registros = [RegistroDonatario.from_dict(item["dados"]) for item in itens]
+    tarefas = preparar_tarefas_contratos(list(range(len(itens))), registros,
+                                         [item["valor_bruto_doacao"] for item in itens],
+                                         [item["aliquota_percentual"] for item in itens], job.base_url, app.logger)
+    volumes = dividir_volumes([(registro.get('NOME'), tarefa[1]) for registro, tarefa in zip(registros, tarefas)])
+    # Nomes pela data do job: uma nova tentativa no dia seguinte reconhece os volumes já gravados
+    data_job = job.criado_em.date()
+    ja_gravados = {contrato.nome_arquivo for contrato in listar_contratos_do_job(job.id)}
+
+    for numero_volume, contratos_volume in enumerate(volumes, start=1):
+        nome_arquivo_pdf = nome_arquivo_pdf_unico(numero_volume, len(volumes), data_job)
+        if nome_arquivo_pdf not in ja_gravados:
+            # Um volume pode levar minutos: o heartbeat mantém o job vivo além de JOBS_TIMEOUT_SEGUNDOS
+            _, _, pdf_bytes, tempos_etapas = executar_no_pool(
+                renderizar_volume_mesclado_worker, (numero_volume, contratos_volume, job.base_url),
+                ao_aguardar=lambda: _heartbeat(job),
+                intervalo_aguardar=app.config.get('JOBS_HEARTBEAT_SEGUNDOS', 30))
+            registrar_metricas_render(tempos_etapas, pdf_bytes)
+            gravar_contrato(pdf_bytes, nome_arquivo_pdf, {'NOME': job.nome_donatario}, None, None, app.logger,
+                            upload_folder=app.config.get('UPLOAD_FOLDER', 'uploads'), job_id=job.id)
+        _atualizar_progresso(job, 10 + 85 * numero_volume // len(volumes))
+
+    job.nome_arquivo_pdf = (nome_arquivo_pdf_unico(data=data_job) if len(volumes) == 1
+                            else f"CONTRATOS_{data_job.strftime('%Y%m%d')}.zip")
+
+
+def _processar_job(app, job):
+    """Executa o job (contrato de um donatário ou PDF único de um lote), com novas tentativas em caso de erro."""
+    try:
+        if job.tipo == ContratoJob.TIPO_PDF_MESCLADO:
+            _gerar_pdf_mesclado_do_job(app, job)
+        else:
+            _gerar_contrato_do_job(app, job)
+        job.status = ContratoJob.STATUS_CONCLUIDO
+        job.progresso = 100
+        job.erro = None
+        db.session.commit()
+        app.logger.info(f"Job {job.id} concluído: {job.nome_arquivo_pdf}")
+    except Exception as e_job:
+        db.session.rollback()
+        ERROS.inc(etapa='job_render')
+        job.tentativas += 1
+        job.erro = str(e_job)[:500]
+        if job.tentativas < job.max_tentativas:
+            # Backoff exponencial simples entre as tentativas
+            espera = app.config.get('JOBS_BACKOFF_SEGUNDOS', 2) * (2 ** (job.tentativas - 1))
+            job.status = ContratoJob.STATUS_PENDENTE
+            job.progresso = 0
+            job.proxima_tentativa_em = datetime.datetime.utcnow() + datetime.timedelta(seconds=espera)
+            app.logger.warning(f"Job {job.id} falhou (tentativa {job.tentativas}/{job.max_tentativas}), nova tentativa em {espera}s: {e_job}")
+        else:
+            job.status = ContratoJob.STATUS_ERRO
+            app.logger.error(f"Job {job.id} falhou definitivamente após {job.tentativas} tentativas: {e_job}", exc_info=True)
+        db.session.commit()
+
+
+def _recuperar_jobs_travados(app):
+    """
+    Devolve para a fila os jobs que ficaram 'processando' além de JOBS_TIMEOUT_SEGUNDOS sem heartbeat
+    (ex.: processo reiniciado no meio da renderização). Cada recuperação conta como uma tentativa:
+    um job que derruba o processo toda vez termina em erro após max_tentativas, em vez de voltar
+    para a fila para sempre. Roda no máximo uma vez por timeout.
+    """
+    global _ultima_recuperacao
+    timeout = app.config.get('JOBS_TIMEOUT_SEGUNDOS', 600)
+    if time.monotonic() - _ultima_recuperacao < timeout:
+        return
+    _ultima_recuperacao = time.monotonic()
+    limite = datetime.datetime.utcnow() - datetime.timedelta(seconds=timeout)
+    travados = ContratoJob.query.filter(ContratoJob.status == ContratoJob.STATUS_PROCESSANDO,
+                                        ContratoJob.atualizado_em < limite)
+    esgotados = (travados
+                 .filter(ContratoJob.tentativas + 1 >= ContratoJob.max_tentativas)
+                 .update({ContratoJob.status: ContratoJob.STATUS_ERRO,
+                          ContratoJob.tentativas: ContratoJob.tentativas + 1,
+                          ContratoJob.erro: "Job interrompido durante a renderização em todas as tentativas."},
+                         synchronize_session=False))
+    recuperados = travados.update({ContratoJob.status: ContratoJob.STATUS_PENDENTE, ContratoJob.progresso: 0,
+                                   ContratoJob.tentativas: ContratoJob.tentativas + 1},
+                                  synchronize_session=False)
+    db.session.commit()
+    if recuperados:
+        app.logger.warning(f"{recuperados} job(s) interrompido(s) devolvido(s) para a fila.")
+    if esgotados:
+        ERROS.inc(esgotados, etapa='job_render')
+        app.logger.error(f"{esgotados} job(s) interrompido(s) sem tentativas restantes marcado(s) como erro.")
+
+
+def _loop_worker(app):
+    intervalo = app.config.get('JOBS_INTERVALO_POLL', 1.0)
+    while True:
+        try:
+            with app.app_context():
+                job = _reservar_proximo_job()
+                if job is not None:
+                    _processar_job(app, job)
+                    continue
+                _recuperar_jobs_travados(app)
+        except Exception as e_loop:
+            app.logger.error(f"Erro no worker de jobs: {e_loop}", exc_info=True)
+        _novo_job.wait(intervalo)
+        _novo_job.clear()
+
+
+def iniciar_workers(app):
+    """
+    Inicia os workers de jobs em threads daemon. O número de workers é o limite de
+    renderizações simultâneas (JOBS_MAX_RENDERS_CONCORRENTES).
+    """
+    with _workers_lock:
+        if _workers:
+            return
+        total_workers = max(1, int(app.config.get('JOBS_MAX_RENDERS_CONCORRENTES', 2)))
+        for numero in range(total_workers):
+            worker = threading.Thread(target=_loop_worker, args=(app,), name=f"contrato-job-worker-{numero}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+        app.logger.info(f"{total_workers} worker(s) de geração de PDF iniciado(s).")
@@ -0,0 +1,315 @@
+# utils/metricas.py
+import os
+import glob
+import json
+import time
+import fcntl
+import atexit
+import threading
+from contextlib import contextmanager
+
+# Métricas simples em memória, exportadas no formato de texto do Prometheus em /metrics.
+# Cada processo conta as suas. Com vários workers do gunicorn, PROMETHEUS_MULTIPROC_DIR ativa o modo
+# multiprocesso (configurar_multiprocesso): cada worker grava periodicamente as suas séries em
+# <dir>/metricas_<pid>.json e /metrics soma os arquivos de todos, em qualquer worker que responda.
+# As séries de workers encerrados são somadas em metricas_encerrados.json (o mestre chama
+# encerrar_processo no child_exit), para os contadores não voltarem para trás.
+
+_registro = []
+_registro_lock = threading.Lock()
+
+_ARQUIVO_ENCERRADOS = 'metricas_encerrados.json'
+_diretorio_multiprocesso = None
+_pid_multiprocesso = None
+_gravacao_thread = None
+_multiprocesso_lock = threading.Lock()
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKETS_BYTES = (10_000, 25_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000)
+
+
+def _escapar_rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(nomes_rotulos, valores_rotulos, extra=None):
+    pares = list(zip(nomes_rotulos, valores_rotulos))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ''
+    texto = ','.join(f'{nome}="{_escapar_rotulo(valor)}"' for nome, valor in pares)
+    return '{' + texto + '}'
+
+
+def _formatar_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monotônico com rótulos opcionais (ex.: etapa, resultado)."""
+
+    tipo = 'counter'
+
+    def __init__(self, nome, descricao, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+        _registrar(self)
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(rotulos.get(nome, '') for nome in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        chave = tuple(rotulos.get(nome, '') for nome in self.rotulos)
+        with self._lock:
+            return self._valores.get(chave, 0)
+
+    def estado(self):
+        """Séries do processo em formato JSON: [[rótulos, valor], ...]."""
+        with self._lock:
+            return self.estado_de(self._valores)
+
+    @staticmethod
+    def estado_de(series):
+        return [[list(chave), valor] for chave, valor in series.items()]
+
+    @staticmethod
+    def somar_estado(destino, estado):
+        for chave, valor in estado:
+            chave = tuple(chave)
+            destino[chave] = destino.get(chave, 0) + valor
+
+    def linhas_prometheus(self, series=None):
+        if series is None:
+            with self._lock:
+                series = dict(self._valores)
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}"
+                for chave, valor in sorted(series.items())]
+
+
+class Histograma:
+    """Histograma cumulativo (buckets fixos), com soma e contagem por combinação de rótulos."""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, descricao, buckets=BUCKETS_SEGUNDOS, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.buckets = tuple(sorted(buckets))
+        self.rotulos = tuple(rotulos)
+        self._series = {} # chave dos rótulos -> [contagens por bucket, soma, contagem]
+        self._lock = threading.Lock()
+        _registrar(self)
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(rotulos.get(nome, '') for nome in self.rotulos)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * len(self.buckets), 0.0, 0]
+            for posicao, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][posicao] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    @contextmanager
+    def medir(self, **rotulos):
+        """Mede o tempo (segundos) do bloco with, inclusive quando ele termina com exceção."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def contagem(self, **rotulos):
+        chave = tuple(rotulos.get(nome, '') for nome in self.rotulos)
+        with self._lock:
+            serie = self._series.get(chave)
+            return serie[2] if serie else 0
+
+    def estado(self):
+        """Séries do processo em formato JSON: [[rótulos, contagens por bucket, soma, contagem], ...]."""
+        with self._lock:
+            return self.estado_de(self._series)
+
+    @staticmethod
+    def estado_de(series):
+        return [[list(chave), list(serie[0]), serie[1], serie[2]] for chave, serie in series.items()]
+
+    @staticmethod
+    def somar_estado(destino, estado):
+        for chave, contagens, soma, contagem in estado:
+            chave = tuple(chave)
+            serie = destino.get(chave)
+            if serie is None:
+                destino[chave] = [list(contagens), soma, contagem]
+            else:
+                serie[0] = [atual + novo for atual, novo in zip(serie[0], contagens)]
+                serie[1] += soma
+                serie[2] += contagem
+
+    def linhas_prometheus(self, series=None):
+        if series is None:
+            with self._lock:
+                series = {chave: (list(serie[0]), serie[1], serie[2]) for chave, serie in self._series.items()}
+        linhas = []
+        for chave, (contagens, soma, contagem) in sorted(series.items()):
+            for limite, acumulado in zip(self.buckets, contagens):
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, ('le', _formatar_numero(float(limite))))} {acumulado}")
+            linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, ('le', '+Inf'))} {contagem}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(self.rotulos, chave)} {contagem}")
+        return linhas
+
+
+def _registrar(metrica):
+    with _registro_lock:
+        _registro.append(metrica)
+
+
+def _metricas_registradas():
+    with _registro_lock:
+        return list(_registro)
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as f_metricas:
+            return json.load(f_metricas)
+    except (FileNotFoundError, ValueError): # removido (worker encerrado) ou gravação de outra versão
+        return {}
+
+
+def _gravar_json(caminho, dados):
+    caminho_temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(caminho_temporario, 'w', encoding='utf-8') as f_metricas:
+        json.dump(dados, f_metricas)
+    os.replace(caminho_temporario, caminho)
+
+
+@contextmanager
+def _lock_diretorio(diretorio, modo):
+    """Lock de arquivo entre processos: leitura (LOCK_SH) em /metrics, escrita (LOCK_EX) em encerrar_processo."""
+    with open(os.path.join(diretorio, '.metricas.lock'), 'a') as arquivo_lock:
+        fcntl.flock(arquivo_lock, modo)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo_lock, fcntl.LOCK_UN)
+
+
+def _somar_estados(metricas, estados):
+    """{nome: séries somadas} a partir de vários {nome: estado} (um por processo)."""
+    por_nome = {metrica.nome: metrica for metrica in metricas}
+    somadas = {metrica.nome: {} for metrica in metricas}
+    for estado in estados:
+        for nome, estado_metrica in estado.items():
+            if nome in por_nome:
+                por_nome[nome].somar_estado(somadas[nome], estado_metrica)
+    return somadas
+
+
+def gravar_metricas_processo():
+    """Grava as séries deste processo no diretório multiprocesso (nada fora do modo multiprocesso)."""
+    diretorio = _diretorio_multiprocesso
+    # Processos filhos (pool de renderização) herdam o módulo pelo fork, mas não gravam pelo worker
+    if diretorio is None or os.getpid() != _pid_multiprocesso:
+        return
+    _gravar_json(os.path.join(diretorio, f"metricas_{os.getpid()}.json"),
+                 {metrica.nome: metrica.estado() for metrica in _metricas_registradas()})
+
+
+def _loop_gravacao(intervalo_segundos):
+    while True:
+        time.sleep(intervalo_segundos)
+        try:
+            gravar_metricas_processo()
+        except OSError:
+            pass # tenta de novo no próximo intervalo
+
+
+def configurar_multiprocesso(diretorio, intervalo_segundos=5.0):
+    """
+    Ativa o modo multiprocesso neste processo: grava as séries em diretorio a cada intervalo_segundos
+    (thread daemon) e ao sair. Roda uma vez por worker (iniciar_servicos).
+    """
+    global _diretorio_multiprocesso, _pid_multiprocesso, _gravacao_thread
+    with _multiprocesso_lock:
+        if _gravacao_thread is not None and _pid_multiprocesso == os.getpid():
+            return
+        os.makedirs(diretorio, exist_ok=True)
+        _diretorio_multiprocesso, _pid_multiprocesso = diretorio, os.getpid()
+        gravar_metricas_processo()
+        _gravacao_thread = threading.Thread(target=_loop_gravacao, args=(intervalo_segundos,),
+                                            name="metricas-gravacao", daemon=True)
+        _gravacao_thread.start()
+        atexit.register(gravar_metricas_processo)
+
+
+def limpar_diretorio_multiprocesso(diretorio):
+    """Remove as séries de uma execução anterior (mestre do gunicorn, on_starting)."""
+    os.makedirs(diretorio, exist_ok=True)
+    for caminho in glob.glob(os.path.join(diretorio, 'metricas_*.json')):
+        os.remove(caminho)
+
+
+def encerrar_processo(diretorio, pid):
+    """Soma as séries do worker encerrado (pid) em metricas_encerrados.json e remove o arquivo dele."""
+    caminho_processo = os.path.join(diretorio, f"metricas_{pid}.json")
+    if not os.path.exists(caminho_processo):
+        return
+    caminho_encerrados = os.path.join(diretorio, _ARQUIVO_ENCERRADOS)
+    with _lock_diretorio(diretorio, fcntl.LOCK_EX):
+        metricas = _metricas_registradas()
+        somadas = _somar_estados(metricas, [_ler_json(caminho_encerrados), _ler_json(caminho_processo)])
+        _gravar_json(caminho_encerrados, {metrica.nome: metrica.estado_de(somadas[metrica.nome])
+                                          for metrica in metricas})
+        os.remove(caminho_processo)
+
+
+def exportar_prometheus():
+    """
+    Texto no formato de exposição do Prometheus (version=0.0.4) com todas as métricas: as do processo
+    ou, no modo multiprocesso, a soma das de todos os workers (vivos e encerrados).
+    """
+    metricas = _metricas_registradas()
+    series = None
+    diretorio = _diretorio_multiprocesso
+    if diretorio is not None:
+        gravar_metricas_processo()
+        with _lock_diretorio(diretorio, fcntl.LOCK_SH):
+            estados = [_ler_json(caminho) for caminho in sorted(glob.glob(os.path.join(diretorio, 'metricas_*.json')))]
+        series = _somar_estados(metricas, estados)
+    linhas = []
+    for metrica in metricas:
+        linhas.append(f"# HELP {metrica.nome} {metrica.descricao}")
+        linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        linhas.extend(metrica.linhas_prometheus(None if series is None else series[metrica.nome]))
+    return '\n'.join(linhas) + '\n'
+
+
+# --- Métricas do pipeline de contratos ---
+
+TEMPO_REQUISICAO = Histograma('contratos_requisicao_segundos', 'Duração das rotas do pipeline de contratos.',
+                              rotulos=('rota',))
+TEMPO_ETAPA = Histograma('contratos_etapa_segundos',
+                         'Duração de cada etapa (sheets, dataset_store, preparar_dados, jinja, markdown, weasyprint...).',
+                         rotulos=('etapa',))
+TAMANHO_PDF = Histograma('contratos_pdf_bytes', 'Tamanho dos PDFs renderizados.', buckets=BUCKETS_BYTES)
+CACHE = Contador('contratos_cache_total', 'Consultas aos caches (planilhas e PDFs) por resultado.',
+                 rotulos=('cache', 'resultado'))
+ERROS = Contador('contratos_erros_total', 'Erros por etapa do pipeline de contratos.', rotulos=('etapa',))
+
+
+def registrar_tempos_etapas(tempos_etapas):
+    """Registra no processo atual os tempos por etapa medidos em outro processo (pool de renderização)."""
+    for etapa, segundos in (tempos_etapas or {}).items():
+        TEMPO_ETAPA.observar(segundos, etapa=etapa)
@@ -0,0 +1,65 @@
+# utils/migracoes_banco.py
+"""
+Migrações do esquema do banco SQLite, aplicadas em create_app antes de db.create_all().
+
+db.create_all() só cria as tabelas que ainda não existem: colunas novas ou restrições alteradas
+em tabelas criadas por versões anteriores do app são ajustadas aqui, de forma explícita.
+"""
+from sqlalchemy import inspect, text
+
+from models import ContratoJob, DatasetDonatarios, DatasetLinha
+
+
+def _colunas_tabela(conexao, tabela):
+    """Nomes das colunas da tabela no banco, ou None se ela não existe."""
+    inspetor = inspect(conexao)
+    if not inspetor.has_table(tabela):
+        return None
+    return [coluna['name'] for coluna in inspetor.get_columns(tabela)]
+
+
+def _migrar_contrato_jobs(conexao, logger):
+    """
+    contrato_jobs anterior aos jobs de PDF mesclado: sem as colunas tipo e total_contratos e com
+    valor_bruto_doacao/aliquota_percentual NOT NULL. O SQLite não remove NOT NULL com ALTER TABLE,
+    então a tabela é recriada no formato atual e os jobs existentes são copiados como TIPO_CONTRATO.
+    """
+    colunas = _colunas_tabela(conexao, ContratoJob.__tablename__)
+    if colunas is None or 'tipo' in colunas:
+        return
+    # Os índices são globais no SQLite: os da tabela antiga sairiam em conflito com os da nova
+    for indice in inspect(conexao).get_indexes(ContratoJob.__tablename__):
+        conexao.execute(text(f'DROP INDEX "{indice["name"]}"'))
+    conexao.execute(text(f'ALTER TABLE {ContratoJob.__tablename__} RENAME TO contrato_jobs_antiga'))
+    ContratoJob.__table__.create(conexao)
+    copiadas = ', '.join(coluna for coluna in colunas if coluna in ContratoJob.__table__.c)
+    total = conexao.execute(text(f"INSERT INTO {ContratoJob.__tablename__} ({copiadas}, tipo, total_contratos) "
+                                 f"SELECT {copiadas}, :tipo, 1 FROM contrato_jobs_antiga"),
+                            {"tipo": ContratoJob.TIPO_CONTRATO}).rowcount
+    conexao.execute(text('DROP TABLE contrato_jobs_antiga'))
+    logger.info(f"Tabela {ContratoJob.__tablename__} migrada para o formato com tipo de job ({total} job(s) copiado(s)).")
+
+
+def _migrar_datasets(conexao, logger):
+    """
+    datasets_linhas anterior ao formato binário de RegistroDonatario: cada linha em JSON (dados_json).
+    Os snapshots são só uma cópia da planilha, relida no próximo carregamento, então as duas tabelas
+    são removidas e recriadas por db.create_all() em vez de convertidas linha a linha.
+    """
+    colunas = _colunas_tabela(conexao, DatasetLinha.__tablename__)
+    if colunas is None or 'dados' in colunas:
+        return
+    total = 0
+    conexao.execute(text(f'DROP TABLE {DatasetLinha.__tablename__}'))
+    if _colunas_tabela(conexao, DatasetDonatarios.__tablename__) is not None:
+        total = conexao.execute(text(f'SELECT COUNT(*) FROM {DatasetDonatarios.__tablename__}')).scalar()
+        conexao.execute(text(f'DROP TABLE {DatasetDonatarios.__tablename__}'))
+    logger.warning(f"Snapshots de planilhas no formato antigo (JSON) removidos ({total} snapshot(s)); "
+                   "as planilhas serão lidas de novo no próximo carregamento.")
+
+
+def migrar_esquema(engine, logger):
+    """Aplica as migrações pendentes numa única transação. Seguro de chamar a cada inicialização."""
+    with engine.begin() as conexao:
+        _migrar_contrato_jobs(conexao, logger)
+        _migrar_datasets(conexao, logger)
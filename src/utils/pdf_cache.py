@@ -0,0 +1,185 @@
+# utils/pdf_cache.py
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from config import Config
+from utils.pdf_rendering import MARKDOWN_TEMPLATE_DIR, TEMPLATE_CONTRATO, CSS_CONTRATO
+from utils.metricas import CACHE
+
+logger_cache = logging.getLogger(__name__)
+
+# Hash do conteúdo de arquivos (template/CSS), recalculado só quando mtime/tamanho mudam
+_hashes_arquivos = {}
+_hashes_arquivos_lock = threading.Lock()
+
+_cache_pdf = None
+_cache_pdf_lock = threading.Lock()
+
+
+def hash_arquivo(caminho):
+    """sha256 do conteúdo do arquivo (ou '' se não existir), memorizado por (mtime, tamanho)."""
+    try:
+        estado = os.stat(caminho)
+    except FileNotFoundError:
+        return ''
+    assinatura = (estado.st_mtime_ns, estado.st_size)
+    with _hashes_arquivos_lock:
+        memorizado = _hashes_arquivos.get(caminho)
+        if memorizado and memorizado[0] == assinatura:
+            return memorizado[1]
+    with open(caminho, 'rb') as f_arquivo:
+        hash_conteudo = hashlib.sha256(f_arquivo.read()).hexdigest()
+    with _hashes_arquivos_lock:
+        _hashes_arquivos[caminho] = (assinatura, hash_conteudo)
+    return hash_conteudo
+
+
+def chave_cache_contrato(contexto_contrato, nome_template=TEMPLATE_CONTRATO, css_filepath=CSS_CONTRATO):
+    """
+    Chave do cache: hash do contexto preparado (saída de preparar_dados_para_contrato)
+    mais os hashes do conteúdo do template Markdown e do CSS usados na renderização.
+    """
+    hash_chave = hashlib.sha256()
+    hash_chave.update(json.dumps(contexto_contrato, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    hash_chave.update(hash_arquivo(os.path.join(MARKDOWN_TEMPLATE_DIR, nome_template)).encode('ascii'))
+    hash_chave.update(hash_arquivo(css_filepath).encode('ascii'))
+    return hash_chave.hexdigest()
+
+
+class CachePDF:
+    """
+    Cache de PDFs endereçado por conteúdo, gravado em disco (<diretorio>/<ab>/<chave>.pdf),
+    com limite de tamanho total e remoção LRU. Conta acertos e falhas.
+    O diretório é compartilhado pelos workers do gunicorn: cada processo tem seu índice em memória,
+    adota os arquivos gravados pelos outros quando os encontra e reconta o diretório antes de remover.
+    """
+
+    def __init__(self, diretorio, tamanho_maximo_bytes, logger=logger_cache):
+        self.diretorio = diretorio
+        self.tamanho_maximo_bytes = tamanho_maximo_bytes
+        self.logger = logger
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self._entradas = OrderedDict() # chave -> tamanho em bytes, do menos para o mais recente
+        self._tamanho_total = 0
+        # Bytes gravados por este processo desde a última recontagem do diretório; a cada 10% do limite
+        # o total é recontado, já que os outros processos também gravam no mesmo diretório
+        self._gravados_desde_recontagem = 0
+        self._intervalo_recontagem = max(1, tamanho_maximo_bytes // 10)
+        self._lock = threading.Lock()
+        self._carregar_existentes()
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave[:2], f"{chave}.pdf")
+
+    def _carregar_existentes(self):
+        self._reindexar_do_disco()
+        self._remover_excedentes()
+
+    def _reindexar_do_disco(self):
+        """
+        Reconstrói o índice LRU a partir dos arquivos do diretório, inclusive os gravados por outros
+        processos (ordem pelo último acesso: obter atualiza o mtime). Arquivos com o mesmo mtime
+        (resolução do sistema de arquivos) mantêm a ordem que já tinham no índice deste processo.
+        """
+        posicoes = {chave: posicao for posicao, chave in enumerate(self._entradas)}
+        existentes = []
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for nome_arquivo in arquivos:
+                if nome_arquivo.endswith('.pdf'):
+                    try:
+                        estado = os.stat(os.path.join(raiz, nome_arquivo))
+                    except FileNotFoundError: # removido por outro processo durante a varredura
+                        continue
+                    chave = nome_arquivo[:-4]
+                    existentes.append((estado.st_mtime_ns, posicoes.get(chave, -1), chave, estado.st_size))
+        self._entradas = OrderedDict((chave, tamanho) for _, _, chave, tamanho in sorted(existentes))
+        self._tamanho_total = sum(self._entradas.values())
+        self._gravados_desde_recontagem = 0
+
+    def _remover_excedentes(self):
+        if (self._tamanho_total > self.tamanho_maximo_bytes
+                or self._gravados_desde_recontagem >= self._intervalo_recontagem):
+            self._reindexar_do_disco()
+        while self._tamanho_total > self.tamanho_maximo_bytes and self._entradas:
+            chave, tamanho = self._entradas.popitem(last=False)
+            self._tamanho_total -= tamanho
+            self.remocoes += 1
+            try:
+                os.remove(self._caminho(chave))
+            except FileNotFoundError:
+                pass
+            self.logger.debug(f"PDF {chave[:12]} removido do cache (LRU).")
+
+    def obter(self, chave, registrar_falha=True):
+        """
+        Retorna os bytes do PDF em cache, ou None (falha).
+        registrar_falha=False evita contar duas vezes a falha de um contrato já consultado antes.
+        """
+        with self._lock:
+            # O índice é do processo: o arquivo é procurado no disco mesmo sem entrada no índice
+            try:
+                with open(self._caminho(chave), 'rb') as f_pdf:
+                    pdf_bytes = f_pdf.read()
+            except FileNotFoundError:
+                if chave in self._entradas: # removido por outro processo que compartilha o diretório
+                    self._tamanho_total -= self._entradas.pop(chave)
+                if registrar_falha:
+                    self.falhas += 1
+                    CACHE.inc(cache='pdf', resultado='falha')
+                return None
+            # Gravado por outro processo: o arquivo passa a fazer parte do índice deste
+            self._tamanho_total += len(pdf_bytes) - self._entradas.get(chave, 0)
+            self._entradas[chave] = len(pdf_bytes)
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            CACHE.inc(cache='pdf', resultado='acerto')
+        try:
+            os.utime(self._caminho(chave)) # preserva a ordem LRU entre reinícios
+        except OSError:
+            pass
+        return pdf_bytes
+
+    def guardar(self, chave, pdf_bytes):
+        """Grava o PDF no cache (escrita atômica) e aplica o limite de tamanho."""
+        if len(pdf_bytes) > self.tamanho_maximo_bytes:
+            return
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        caminho_temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(caminho_temporario, 'wb') as f_pdf:
+            f_pdf.write(pdf_bytes)
+        os.replace(caminho_temporario, caminho)
+        with self._lock:
+            if chave in self._entradas:
+                self._tamanho_total -= self._entradas[chave]
+            self._entradas[chave] = len(pdf_bytes)
+            self._entradas.move_to_end(chave)
+            self._tamanho_total += len(pdf_bytes)
+            self._gravados_desde_recontagem += len(pdf_bytes)
+            self._remover_excedentes()
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "remocoes": self.remocoes,
+                "entradas": len(self._entradas),
+                "tamanho_bytes": self._tamanho_total,
+                "tamanho_maximo_bytes": self.tamanho_maximo_bytes,
+            }
+
+
+def get_cache_pdf():
+    """Retorna o cache de PDFs do processo, criado sob demanda a partir da Config."""
+    global _cache_pdf
+    with _cache_pdf_lock:
+        if _cache_pdf is None:
+            _cache_pdf = CachePDF(Config.PDF_CACHE_DIR, Config.PDF_CACHE_MAX_BYTES)
+        return _cache_pdf
@@ -0,0 +1,474 @@
+# utils/pdf_rendering.py
+import os
+import html
+import datetime
+import logging
+import pathlib
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+import markdown2 # Para converter Markdown em HTML
+from weasyprint import HTML, CSS # Para converter HTML em PDF
+from weasyprint.text.fonts import FontConfiguration
+
+from utils.contract_processing import preparar_dados_para_contrato, preparar_dados_para_contrato_lote
+from utils.registro_donatario import RegistroDonatario
+from utils.template_compilado import get_template_compilado
+from utils.metricas import TEMPO_ETAPA, TAMANHO_PDF, registrar_tempos_etapas
+from config import Config
+
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MARKDOWN_TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates', 'markdown_templates')
+TEMPLATE_CONTRATO = 'CONTRATO_MODELO_DOACAO.md.jinja'
+CSS_CONTRATO = os.path.join(BASE_DIR, 'static', 'css', 'contrato_estilo.css')
+MARKDOWN_EXTRAS = ["tables", "smarty-pants", "cuddled-lists", "footnotes"]
+
+# Logger usado quando a renderização roda fora do Flask (processos do pool)
+logger_renderizacao = logging.getLogger(__name__)
+
+_jinja_markdown_env = None
+_process_pool = None
+_process_pool_lock = threading.Lock()
+_renderizador_pdf = None
+_renderizador_pdf_lock = threading.Lock()
+
+# HTML mínimo usado para aquecer o WeasyPrint (fontes, CSS, layout) ao iniciar um processo
+_HTML_AQUECIMENTO = "<h1>Contrato</h1><p>Aquecimento do renderizador: á é í ó ú ç ã õ.</p>"
+
+# Estilos extras do PDF único com vários contratos: cada contrato começa em página nova e o marcador
+# (bookmark) de 1º nível é o nome do donatário; as seções de cada contrato ficam abaixo dele
+_CSS_MESCLADO = """
+.contrato-mesclado + .contrato-mesclado { break-before: page; }
+.marcador-donatario { bookmark-level: 1; bookmark-label: attr(data-nome); height: 0; margin: 0; }
+.contrato-mesclado h1, .contrato-mesclado h4, .contrato-mesclado h5, .contrato-mesclado h6 { bookmark-level: none; }
+.contrato-mesclado h2 { bookmark-level: 2; }
+.contrato-mesclado h3 { bookmark-level: 3; }
+"""
+
+
+def get_jinja_markdown_env():
+    """Retorna o ambiente Jinja2 (único por processo) que carrega os templates Markdown."""
+    global _jinja_markdown_env
+    if _jinja_markdown_env is None:
+        # Bytecode cache em disco: workers novos carregam os modelos sem recompilar o Jinja
+        bytecode_cache = None
+        if Config.JINJA_BYTECODE_CACHE_DIR:
+            os.makedirs(Config.JINJA_BYTECODE_CACHE_DIR, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(Config.JINJA_BYTECODE_CACHE_DIR)
+        _jinja_markdown_env = Environment(
+            loader=FileSystemLoader(MARKDOWN_TEMPLATE_DIR),
+            autoescape=True, # Autoescape é bom para HTML, pode não ser estritamente necessário para MD->HTML
+            bytecode_cache=bytecode_cache,
+        )
+    return _jinja_markdown_env
+
+
+def compilar_templates(logger, nomes_templates=(TEMPLATE_CONTRATO,)):
+    """Pré-compila os templates (Markdown -> HTML com slots) na inicialização do processo."""
+    for nome_template in nomes_templates:
+        get_template_compilado(get_jinja_markdown_env(), nome_template, MARKDOWN_EXTRAS, logger)
+
+
+def renderizar_html_contrato(contexto_contrato, logger, nome_template=TEMPLATE_CONTRATO, tempos_etapas=None):
+    """
+    Gera o HTML do contrato. No modo compilado (TEMPLATE_COMPILADO) só encaixa os valores no HTML
+    pré-convertido; valores que o markdown2 transformaria caem no pipeline completo abaixo.
+    Se tempos_etapas (dict) for passado, soma nele a duração de cada etapa em segundos.
+    """
+    tempos_etapas = {} if tempos_etapas is None else tempos_etapas
+    if Config.TEMPLATE_COMPILADO:
+        inicio = time.perf_counter()
+        compilado = get_template_compilado(get_jinja_markdown_env(), nome_template, MARKDOWN_EXTRAS, logger)
+        html_content = compilado.preencher(contexto_contrato)
+        tempos_etapas['template_compilado'] = tempos_etapas.get('template_compilado', 0.0) + time.perf_counter() - inicio
+        if html_content is not None:
+            logger.debug("HTML gerado pelo template compilado.")
+            return html_content
+        logger.debug("Valores exigem o pipeline completo (Jinja2 -> markdown2).")
+
+    inicio = time.perf_counter()
+    template_md = get_jinja_markdown_env().get_template(nome_template)
+    markdown_renderizado = template_md.render(contexto_contrato)
+    tempos_etapas['jinja'] = tempos_etapas.get('jinja', 0.0) + time.perf_counter() - inicio
+    logger.debug("Template Markdown renderizado com Jinja2.")
+
+    inicio = time.perf_counter()
+    html_content = markdown2.markdown(markdown_renderizado, extras=MARKDOWN_EXTRAS)
+    tempos_etapas['markdown'] = tempos_etapas.get('markdown', 0.0) + time.perf_counter() - inicio
+    logger.debug("Markdown convertido para HTML.")
+    return html_content
+
+
+class RenderizadorPDF:
+    """
+    Contexto do WeasyPrint reaproveitado entre contratos (um por processo): guarda o CSS já
+    interpretado, uma FontConfiguration compartilhada e a base URL padrão resolvida.
+    O CSS só é recarregado quando o arquivo muda (mtime).
+    """
+
+    def __init__(self, css_filepath=CSS_CONTRATO, logger=logger_renderizacao):
+        self.css_filepath = css_filepath
+        self.logger = logger
+        self.base_url_padrao = pathlib.Path(BASE_DIR).as_uri() + '/'
+        self.font_config = None
+        self.stylesheets = None
+        self._mtime_css = None
+        self._lock = threading.Lock()
+        self._carregar_css()
+
+    def _carregar_css(self):
+        try:
+            mtime_css = os.path.getmtime(self.css_filepath)
+        except OSError:
+            mtime_css = None
+        # Fontes declaradas via @font-face ficam registradas na FontConfiguration do CSS
+        self.font_config = FontConfiguration()
+        if mtime_css is None:
+            self.stylesheets = None
+            self.logger.warning(f"Arquivo CSS '{self.css_filepath}' não encontrado. Usando estilos padrão do browser/WeasyPrint.")
+        else:
+            self.stylesheets = [CSS(filename=self.css_filepath, font_config=self.font_config)]
+            self.logger.debug(f"CSS '{self.css_filepath}' carregado para o PDF.")
+        self.stylesheets_mesclado = (self.stylesheets or []) + [CSS(string=_CSS_MESCLADO, font_config=self.font_config)]
+        self._mtime_css = mtime_css
+
+    def _recarregar_se_alterado(self):
+        try:
+            mtime_css = os.path.getmtime(self.css_filepath)
+        except OSError:
+            mtime_css = None
+        if mtime_css != self._mtime_css:
+            with self._lock:
+                if mtime_css != self._mtime_css:
+                    self.logger.info(f"CSS '{self.css_filepath}' alterado, recarregando o renderizador.")
+                    self._carregar_css()
+
+    def gerar_pdf_bytes(self, html_content, base_url=None):
+        self._recarregar_se_alterado()
+        html_doc = HTML(string=html_content, base_url=base_url or self.base_url_padrao)
+        return html_doc.write_pdf(stylesheets=self.stylesheets, font_config=self.font_config)
+
+    def renderizar_documento_mesclado(self, html_content, base_url=None):
+        """Layout (sem gerar o PDF) de um bloco de contratos do PDF único; ver gerar_pdf_mesclado."""
+        self._recarregar_se_alterado()
+        html_doc = HTML(string=html_content, base_url=base_url or self.base_url_padrao)
+        return html_doc.render(stylesheets=self.stylesheets_mesclado, font_config=self.font_config)
+
+    def aquecer(self):
+        """Renderiza um documento pequeno para carregar fontes e layout antes do primeiro contrato."""
+        self.gerar_pdf_bytes(_HTML_AQUECIMENTO)
+        self.logger.info(f"Renderizador de PDF aquecido (processo {os.getpid()}).")
+
+
+def get_renderizador_pdf(css_filepath=CSS_CONTRATO):
+    """Retorna o RenderizadorPDF do processo, criado sob demanda."""
+    global _renderizador_pdf
+    with _renderizador_pdf_lock:
+        if _renderizador_pdf is None or _renderizador_pdf.css_filepath != css_filepath:
+            _renderizador_pdf = RenderizadorPDF(css_filepath)
+        return _renderizador_pdf
+
+
+def gerar_pdf_bytes(html_content, base_url, logger, css_filepath=CSS_CONTRATO):
+    """Converte o HTML do contrato em PDF com WeasyPrint (renderizador reaproveitado) e retorna os bytes."""
+    pdf_bytes = get_renderizador_pdf(css_filepath).gerar_pdf_bytes(html_content, base_url)
+    logger.debug("PDF gerado com o renderizador compartilhado.")
+    return pdf_bytes
+
+
+def gerar_pdf_mesclado(contratos, logger, base_url=None, contratos_por_bloco=None, tempos_etapas=None):
+    """
+    Gera um único PDF com vários contratos: cada um começa em página nova e ganha um marcador
+    com o nome do donatário. contratos é um iterável de (nome_donatario, contexto_contrato).
+
+    O layout é feito em blocos de contratos_por_bloco: só o HTML do bloco atual fica em memória,
+    e das páginas de cada bloco o WeasyPrint guarda apenas o layout já calculado. No fim todas
+    as páginas vão para um único Document (Document.copy) e um único write_pdf, que embute cada
+    fonte uma vez, com o subconjunto de glifos de todos os contratos, em vez de uma cópia por PDF.
+    """
+    contratos_por_bloco = contratos_por_bloco or Config.PDF_MESCLADO_CONTRATOS_POR_BLOCO
+    tempos_etapas = {} if tempos_etapas is None else tempos_etapas
+    renderizador = get_renderizador_pdf()
+    documentos = []
+    paginas = []
+    total_contratos = 0
+
+    def _renderizar_bloco(secoes):
+        inicio = time.perf_counter()
+        documento = renderizador.renderizar_documento_mesclado(''.join(secoes), base_url)
+        tempos_etapas['weasyprint_layout'] = tempos_etapas.get('weasyprint_layout', 0.0) + time.perf_counter() - inicio
+        if not documentos:
+            documentos.append(documento) # o 1º Document serve de base para o copy final
+        paginas.extend(documento.pages)
+
+    secoes = []
+    for nome_donatario, contexto_contrato in contratos:
+        html_contrato = renderizar_html_contrato(contexto_contrato, logger, tempos_etapas=tempos_etapas)
+        nome_marcador = html.escape(str(nome_donatario or 'Donatário'), quote=True)
+        secoes.append(f'<section class="contrato-mesclado"><div class="marcador-donatario" data-nome="{nome_marcador}"></div>'
+                      f'{html_contrato}</section>')
+        total_contratos += 1
+        if len(secoes) >= contratos_por_bloco:
+            _renderizar_bloco(secoes)
+            secoes = []
+    if secoes:
+        _renderizar_bloco(secoes)
+    if not documentos:
+        raise ValueError("Nenhum contrato para gerar o PDF único.")
+
+    inicio = time.perf_counter()
+    pdf_bytes = documentos[0].copy(paginas).write_pdf()
+    tempos_etapas['weasyprint'] = time.perf_counter() - inicio
+    logger.info(f"PDF único gerado: {total_contratos} contratos, {len(paginas)} páginas, {len(pdf_bytes)} bytes.")
+    return pdf_bytes
+
+
+def dividir_volumes(itens, contratos_por_volume=None):
+    """Divide os contratos do PDF único em volumes de no máximo contratos_por_volume (limita a memória por processo)."""
+    contratos_por_volume = contratos_por_volume or Config.PDF_MESCLADO_CONTRATOS_POR_VOLUME
+    return [itens[inicio:inicio + contratos_por_volume] for inicio in range(0, len(itens), contratos_por_volume)]
+
+
+def nome_arquivo_contrato(nome_donatario, data=None, extensao='pdf'):
+    """Monta o nome do arquivo do contrato (PDF ou DOCX) a partir do NOME do donatário e da data."""
+    data = data or datetime.date.today()
+    nome_donatario_arq = "".join(c if c.isalnum() else "_" for c in str(nome_donatario or 'donatario'))
+    return f"CONTRATO_{nome_donatario_arq}_{data.strftime('%Y%m%d')}.{extensao}"
+
+
+def nome_arquivo_pdf_unico(numero_volume=1, total_volumes=1, data=None):
+    """Nome do PDF único de um lote; com vários volumes, cada um leva o número do volume."""
+    data = (data or datetime.date.today()).strftime('%Y%m%d')
+    if total_volumes == 1:
+        return f"CONTRATOS_{data}.pdf"
+    return f"CONTRATOS_{data}_volume{numero_volume:03d}.pdf"
+
+
+def preparar_tarefa_contrato(indice, dados_donatario, valor_bruto_doacao, aliquota_percentual, base_url, logger):
+    """
+    Prepara o contexto do contrato e monta a tarefa para renderizar_contrato_worker:
+    (indice, contexto_contrato, nome_arquivo_pdf, base_url).
+    """
+    with TEMPO_ETAPA.medir(etapa='preparar_dados'):
+        contexto_contrato = preparar_dados_para_contrato(
+            dados_donatario, valor_bruto_doacao, aliquota_percentual, logger
+        )
+    return (indice, contexto_contrato, nome_arquivo_contrato(dados_donatario.get('NOME')), base_url)
+
+
+def preparar_tarefas_contratos(indices, registros, valores_brutos, aliquotas, base_url, logger):
+    """
+    Versão em lote de preparar_tarefa_contrato: prepara os contextos de todos os donatários de uma vez
+    (preparar_dados_para_contrato_lote). registros, valores_brutos e aliquotas seguem a ordem de indices.
+    """
+    if not indices:
+        return []
+    import pandas as pd # só o lote usa pandas; o caminho de um contrato por requisição não carrega o módulo
+
+    # dtype object preserva os valores como vieram (sem inferência de tipo por coluna do pandas)
+    donatarios_df = pd.DataFrame([RegistroDonatario.from_dict(registro).to_dict() for registro in registros],
+                                 dtype=object)
+    with TEMPO_ETAPA.medir(etapa='preparar_dados_lote'):
+        contextos = preparar_dados_para_contrato_lote(donatarios_df, valores_brutos, aliquotas, logger)
+    return [(indice, contexto_contrato, nome_arquivo_contrato(dados_donatario.get('NOME')), base_url)
+            for indice, dados_donatario, contexto_contrato in zip(indices, registros, contextos)]
+
+
+def renderizar_contrato_worker(tarefa):
+    """
+    Executa Jinja -> markdown2 -> WeasyPrint para um contrato já preparado.
+    Pensada para rodar em um processo do pool: recebe a tupla de preparar_tarefa_contrato
+    e retorna (indice, nome_arquivo_pdf, pdf_bytes, tempos_etapas). As métricas ficam no processo
+    do Flask, por isso os tempos voltam junto com o PDF (ver registrar_metricas_render).
+    """
+    indice, contexto_contrato, nome_arquivo_pdf, base_url = tarefa
+    tempos_etapas = {}
+    html_content = renderizar_html_contrato(contexto_contrato, logger_renderizacao, tempos_etapas=tempos_etapas)
+    inicio = time.perf_counter()
+    pdf_bytes = gerar_pdf_bytes(html_content, base_url, logger_renderizacao)
+    tempos_etapas['weasyprint'] = time.perf_counter() - inicio
+    return indice, nome_arquivo_pdf, pdf_bytes, tempos_etapas
+
+
+def renderizar_volume_mesclado_worker(tarefa):
+    """
+    Versão de renderizar_contrato_worker para o PDF único: recebe (numero_volume, [(nome_donatario,
+    contexto_contrato)], base_url) e retorna (numero_volume, total_contratos, pdf_bytes, tempos_etapas).
+    """
+    numero_volume, contratos, base_url = tarefa
+    tempos_etapas = {}
+    pdf_bytes = gerar_pdf_mesclado(contratos, logger_renderizacao, base_url, tempos_etapas=tempos_etapas)
+    return numero_volume, len(contratos), pdf_bytes, tempos_etapas
+
+
+def registrar_metricas_render(tempos_etapas, pdf_bytes):
+    """Registra os tempos por etapa e o tamanho do PDF devolvidos por renderizar_contrato_worker."""
+    registrar_tempos_etapas(tempos_etapas)
+    TAMANHO_PDF.observar(len(pdf_bytes))
+
+
+def inicializar_processo_renderizacao(aquecer=False):
+    """Initializer dos processos do pool: cria o renderizador (e opcionalmente o aquece) antes da 1ª tarefa."""
+    try:
+        logger_renderizacao.setLevel(Config.LOG_LEVEL)
+        if Config.TEMPLATE_COMPILADO:
+            compilar_templates(logger_renderizacao)
+        renderizador = get_renderizador_pdf()
+        if aquecer:
+            renderizador.aquecer()
+    except Exception as e_init:
+        # Falha no aquecimento não pode derrubar o worker; o primeiro contrato paga o custo a frio
+        logger_renderizacao.warning(f"Falha ao preparar o processo de renderização: {e_init}")
+
+
+def _tarefa_aquecimento(_):
+    return os.getpid()
+
+
+def get_process_pool():
+    """Retorna o pool de processos de renderização, criado sob demanda e dimensionado pelas CPUs."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=Config.PDF_POOL_WORKERS,
+                                                initializer=inicializar_processo_renderizacao,
+                                                initargs=(Config.PDF_AQUECER_RENDERIZADOR,))
+        return _process_pool
+
+
+def descartar_process_pool(pool):
+    """
+    Descarta um pool quebrado (um processo filho morreu, ex.: OOM): o executor passa a recusar qualquer
+    tarefa, então a próxima chamada a get_process_pool cria outro. Não faz nada se já foi substituído.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not pool:
+            return
+        _process_pool = None
+    logger_renderizacao.warning("Pool de renderização quebrado (processo filho encerrado). Recriando.")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def encerrar_process_pool(cancelar_pendentes=False):
+    """Encerra o pool de renderização do processo (ex.: no fim do CLI); a próxima chamada a get_process_pool cria outro."""
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=not cancelar_pendentes, cancel_futures=cancelar_pendentes)
+
+
+def submeter_no_pool(funcao, argumento):
+    """
+    pool.submit que recria o pool uma vez se ele já estiver quebrado. Retorna (future, pool usado); se o
+    future falhar com BrokenProcessPool, passe o pool a descartar_process_pool antes de reenviar.
+    """
+    pool = get_process_pool()
+    try:
+        return pool.submit(funcao, argumento), pool
+    except BrokenProcessPool:
+        descartar_process_pool(pool)
+        pool = get_process_pool()
+        return pool.submit(funcao, argumento), pool
+
+
+def _aguardar_resultado(future, ao_aguardar, intervalo_aguardar):
+    if ao_aguardar is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=intervalo_aguardar)
+        except FuturesTimeoutError:
+            ao_aguardar()
+
+
+def executar_no_pool(funcao, argumento, ao_aguardar=None, intervalo_aguardar=30):
+    """
+    Roda funcao(argumento) no pool e espera o resultado. Se o pool quebrar no meio (BrokenProcessPool),
+    recria o pool e tenta mais uma vez. ao_aguardar, se informado, é chamado a cada intervalo_aguardar
+    segundos enquanto a tarefa não termina (ex.: heartbeat de um job longo).
+    """
+    future, pool = submeter_no_pool(funcao, argumento)
+    try:
+        return _aguardar_resultado(future, ao_aguardar, intervalo_aguardar)
+    except BrokenProcessPool:
+        descartar_process_pool(pool)
+    return _aguardar_resultado(submeter_no_pool(funcao, argumento)[0], ao_aguardar, intervalo_aguardar)
+
+
+def mapear_no_pool(funcao, argumentos):
+    """
+    Envia funcao(argumento) ao pool para cada argumento e retorna um iterador de (argumento, resultado, erro)
+    na ordem de conclusão (erro é None quando deu certo). Tarefas perdidas porque o pool quebrou são
+    reenviadas uma vez a um pool novo. close() no iterador cancela as tarefas que ainda não começaram.
+    """
+    pendentes = {}
+
+    def _enviar(argumento, reenvio):
+        future, pool = submeter_no_pool(funcao, argumento)
+        pendentes[future] = (argumento, reenvio, pool)
+
+    # Envia tudo já na chamada (o pool começa a trabalhar antes de o resultado ser consumido)
+    for argumento in argumentos:
+        _enviar(argumento, False)
+
+    def _resultados():
+        try:
+            while pendentes:
+                for future in as_completed(list(pendentes)):
+                    argumento, reenvio, pool = pendentes.pop(future)
+                    try:
+                        resultado = future.result()
+                    except BrokenProcessPool as e_pool:
+                        descartar_process_pool(pool)
+                        if not reenvio:
+                            _enviar(argumento, True)
+                            continue
+                        yield argumento, None, e_pool
+                    except Exception as e_tarefa:
+                        yield argumento, None, e_tarefa
+                    else:
+                        yield argumento, resultado, None
+        finally:
+            _cancelar_pendentes(pendentes)
+
+    return ResultadosPool(_resultados(), pendentes)
+
+
+def _cancelar_pendentes(pendentes):
+    for future in list(pendentes):
+        future.cancel()
+
+
+class ResultadosPool:
+    """Iterador devolvido por mapear_no_pool; close() cancela as tarefas pendentes mesmo antes da 1ª leitura."""
+
+    def __init__(self, gerador, pendentes):
+        self._gerador = gerador
+        self._pendentes = pendentes
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._gerador)
+
+    def close(self):
+        self._gerador.close()
+        _cancelar_pendentes(self._pendentes)
+
+
+def aquecer_pool(logger):
+    """
+    Sobe todos os processos do pool já na inicialização (cada um roda o initializer e,
+    com PDF_AQUECER_RENDERIZADOR, um render de aquecimento), em vez de na primeira requisição.
+    """
+    for _, _, erro in mapear_no_pool(_tarefa_aquecimento, range(Config.PDF_POOL_WORKERS)):
+        if erro is not None:
+            raise erro
+    logger.info(f"Pool de renderização pronto ({Config.PDF_POOL_WORKERS} processo(s) no máximo).")
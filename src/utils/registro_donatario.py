@@ -0,0 +1,156 @@
+# utils/registro_donatario.py
+
+# Colunas conhecidas da planilha de donatários (as mesmas de contract_processing.CAMPOS_DONATARIO).
+# As demais colunas da planilha vão para `extras`, na ordem em que aparecem.
+CAMPOS_REGISTRO = ('NOME', 'NACIONALIDADE', 'ESTADO_CIVIL', 'PROFISSAO', 'RG', 'CPF', 'ENDERECO', 'CIDADE_UF',
+                   'CEP', 'TELEFONE', 'EMAIL', 'BANCO', 'AGENCIA', 'CONTA', 'OPERACAO')
+_POSICAO_CAMPO = {campo: posicao for posicao, campo in enumerate(CAMPOS_REGISTRO)}
+
+# Formato binário (versão 1):
+#   [versão: 1 byte][máscara dos campos presentes: varint][quantidade de extras: varint]
+#   [tamanho em caracteres de cada texto: varint] - campos presentes na ordem de CAMPOS_REGISTRO,
+#                                                   depois nome e valor de cada extra
+#   [todos os textos concatenados, em utf-8]
+# Os textos são decodificados numa única chamada e recortados pelos tamanhos.
+_VERSAO_FORMATO = 1
+
+
+def _texto(valor):
+    """Valor de célula como texto; None indica coluna ausente. Floats inteiros (1500.0) viram '1500'."""
+    if valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _escrever_varint(saida, numero):
+    while numero >= 0x80:
+        saida.append((numero & 0x7F) | 0x80)
+        numero >>= 7
+    saida.append(numero)
+
+
+def _ler_varint(dados, posicao):
+    byte = dados[posicao]
+    if byte < 0x80: # caso comum: textos com menos de 128 caracteres
+        return byte, posicao + 1
+    numero, deslocamento = byte & 0x7F, 7
+    while True:
+        posicao += 1
+        byte = dados[posicao]
+        numero |= (byte & 0x7F) << deslocamento
+        if byte < 0x80:
+            return numero, posicao + 1
+        deslocamento += 7
+
+
+class RegistroDonatario:
+    """
+    Linha da planilha de donatários com as colunas conhecidas em slots, sempre como texto (CPF, CEP,
+    agência e conta mantêm os zeros à esquerda). Tem a interface de leitura de um dict (get, [], in,
+    keys, items), que é o que preparar_dados_para_contrato e o restante da aplicação usam.
+    """
+
+    __slots__ = CAMPOS_REGISTRO + ('extras',)
+
+    def __init__(self, extras=None, **campos):
+        for campo in CAMPOS_REGISTRO:
+            setattr(self, campo, _texto(campos.pop(campo, None)))
+        if campos:
+            raise TypeError(f"Campos desconhecidos para RegistroDonatario: {', '.join(campos)}")
+        self.extras = extras or {}
+
+    @classmethod
+    def from_dict(cls, dados):
+        """Cria o registro a partir de um dict coluna -> valor (ex.: worksheet.get_all_records())."""
+        if isinstance(dados, RegistroDonatario):
+            return dados
+        registro = cls.__new__(cls)
+        for campo in CAMPOS_REGISTRO:
+            setattr(registro, campo, None)
+        extras = {}
+        for coluna, valor in dados.items():
+            if coluna in _POSICAO_CAMPO:
+                setattr(registro, coluna, _texto(valor))
+            elif valor is not None:
+                extras[str(coluna)] = _texto(valor)
+        registro.extras = extras
+        return registro
+
+    def get(self, coluna, padrao=None):
+        if coluna in _POSICAO_CAMPO:
+            valor = getattr(self, coluna)
+            return padrao if valor is None else valor
+        return self.extras.get(coluna, padrao)
+
+    def __getitem__(self, coluna):
+        valor = self.get(coluna)
+        if valor is None:
+            raise KeyError(coluna)
+        return valor
+
+    def __contains__(self, coluna):
+        return self.get(coluna) is not None
+
+    def keys(self):
+        return [campo for campo in CAMPOS_REGISTRO if getattr(self, campo) is not None] + list(self.extras)
+
+    def items(self):
+        return [(coluna, self[coluna]) for coluna in self.keys()]
+
+    def to_dict(self):
+        """Dict coluna -> texto (ex.: para guardar em JSON no job)."""
+        return dict(self.items())
+
+    def __eq__(self, outro):
+        if not isinstance(outro, RegistroDonatario):
+            return NotImplemented
+        return self.serializar() == outro.serializar()
+
+    def __repr__(self):
+        return f"RegistroDonatario(NOME={self.NOME!r}, CPF={self.CPF!r})"
+
+    def serializar(self):
+        """Bytes do registro no formato compacto descrito no topo do módulo (determinístico)."""
+        saida = bytearray((_VERSAO_FORMATO,))
+        valores = [getattr(self, campo) for campo in CAMPOS_REGISTRO]
+        _escrever_varint(saida, sum(1 << posicao for posicao, valor in enumerate(valores) if valor is not None))
+        _escrever_varint(saida, len(self.extras))
+        textos = [valor for valor in valores if valor is not None]
+        for coluna, valor in self.extras.items():
+            textos += (coluna, valor)
+        for texto in textos:
+            _escrever_varint(saida, len(texto))
+        saida += ''.join(textos).encode('utf-8')
+        return bytes(saida)
+
+    @classmethod
+    def desserializar(cls, dados):
+        if not dados or dados[0] != _VERSAO_FORMATO:
+            raise ValueError(f"Formato de registro desconhecido: {dados[:1]!r}")
+        presentes, posicao = _ler_varint(dados, 1)
+        total_extras, posicao = _ler_varint(dados, posicao)
+        tamanhos = []
+        for _ in range(bin(presentes).count('1') + 2 * total_extras):
+            tamanho, posicao = _ler_varint(dados, posicao)
+            tamanhos.append(tamanho)
+        textos = str(dados[posicao:], 'utf-8')
+
+        registro = cls.__new__(cls)
+        inicio, tamanhos = 0, iter(tamanhos)
+        for indice, campo in enumerate(CAMPOS_REGISTRO):
+            if presentes >> indice & 1:
+                fim = inicio + next(tamanhos)
+                setattr(registro, campo, textos[inicio:fim])
+                inicio = fim
+            else:
+                setattr(registro, campo, None)
+        extras = {}
+        for _ in range(total_extras):
+            meio = inicio + next(tamanhos)
+            fim = meio + next(tamanhos)
+            extras[textos[inicio:meio]] = textos[meio:fim]
+            inicio = fim
+        registro.extras = extras
+        return registro
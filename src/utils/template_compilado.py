@@ -0,0 +1,98 @@
+# utils/template_compilado.py
+import os
+import re
+import logging
+import threading
+
+import markdown2
+from jinja2 import meta
+from markupsafe import escape
+
+logger_template = logging.getLogger(__name__)
+
+# Valores que o markdown2 (com smarty-pants) copia literalmente quando aparecem no meio de um parágrafo:
+# letras, dígitos, espaços e pontuação simples. Qualquer coisa fora disso (aspas, *, _, &, <, |, [, etc.)
+# faz o contrato passar pelo pipeline completo, garantindo o mesmo HTML de antes.
+_VALOR_SEGURO = re.compile(r"[^\W_]|[ \t.,;:/()%@+ºª°-]")
+# No início de uma linha do Markdown o valor poderia virar lista/título; exige que comece por letra
+_INICIO_LINHA_SEGURO = re.compile(r"[^\W\d_]")
+
+_SLOT = "ZQXSLOT{}XQZ"
+_SLOT_REGEX = re.compile(r"ZQXSLOT(\d+)XQZ")
+
+_compilados = {}
+_compilados_lock = threading.Lock()
+
+
+def _valor_seguro(texto, inicio_de_linha):
+    # Vazio ou com espaços nas pontas pode quebrar ênfases como **{{ NOME }}**
+    if not texto or texto != texto.strip():
+        return False
+    if '..' in texto or '--' in texto:
+        return False
+    if inicio_de_linha and not _INICIO_LINHA_SEGURO.match(texto):
+        return False
+    return all(_VALOR_SEGURO.match(caractere) for caractere in texto)
+
+
+class TemplateCompilado:
+    """
+    Template Markdown convertido para HTML uma única vez, com os placeholders do Jinja
+    transformados em slots. Por contrato só os valores do donatário são escapados e encaixados.
+    """
+
+    def __init__(self, ambiente, nome_template, extras, logger=logger_template):
+        self.nome_template = nome_template
+        fonte, caminho, _ = ambiente.loader.get_source(ambiente, nome_template)
+        self.caminho = caminho
+        self.mtime = os.path.getmtime(caminho) if caminho else None
+
+        variaveis = sorted(meta.find_undeclared_variables(ambiente.parse(fonte)))
+        contexto_slots = {variavel: _SLOT.format(numero) for numero, variavel in enumerate(variaveis)}
+        markdown_slots = ambiente.get_template(nome_template).render(contexto_slots)
+
+        # Slots que começam uma linha do Markdown exigem valores mais restritos (ver _valor_seguro)
+        self.slots_inicio_linha = {
+            variaveis[int(numero)]
+            for numero in re.findall(r"(?:^|\n)[ \t]*ZQXSLOT(\d+)XQZ", markdown_slots)
+        }
+
+        html_slots = markdown2.markdown(markdown_slots, extras=extras)
+        partes = _SLOT_REGEX.split(html_slots)
+        # partes alterna [texto, numero_slot, texto, numero_slot, ..., texto]
+        self.textos = partes[0::2]
+        self.slots = [variaveis[int(numero)] for numero in partes[1::2]]
+        faltando = set(variaveis) - set(self.slots)
+        if faltando:
+            raise ValueError(f"Placeholders perdidos na compilação do template '{nome_template}': {sorted(faltando)}")
+        logger.info(f"Template '{nome_template}' compilado: {len(self.slots)} slots, {len(variaveis)} variáveis.")
+
+    def desatualizado(self):
+        return self.caminho is not None and os.path.getmtime(self.caminho) != self.mtime
+
+    def preencher(self, contexto):
+        """
+        Retorna o HTML do contrato, ou None se algum valor precisar do pipeline completo
+        (Jinja -> markdown2) para sair idêntico ao HTML de hoje.
+        """
+        valores = {}
+        for variavel in set(self.slots):
+            texto = str(contexto.get(variavel, ''))
+            if not _valor_seguro(texto, variavel in self.slots_inicio_linha):
+                return None
+            valores[variavel] = str(escape(texto))
+        partes = [self.textos[0]]
+        for variavel, texto in zip(self.slots, self.textos[1:]):
+            partes.append(valores[variavel])
+            partes.append(texto)
+        return ''.join(partes)
+
+
+def get_template_compilado(ambiente, nome_template, extras, logger=logger_template):
+    """Retorna o template compilado, recompilando quando o arquivo do template muda (mtime)."""
+    with _compilados_lock:
+        compilado = _compilados.get(nome_template)
+        if compilado is None or compilado.desatualizado():
+            compilado = TemplateCompilado(ambiente, nome_template, extras, logger)
+            _compilados[nome_template] = compilado
+        return compilado
@@ -0,0 +1,48 @@
+# utils/zip_stream.py
+import io
+import zipfile
+
+
+class _BufferStreamZip(io.RawIOBase):
+    """
+    Destino de escrita para o zipfile que apenas acumula os bytes até serem drenados.
+    Como não é 'seekable', o zipfile grava com data descriptors e o ZIP pode ser
+    enviado ao cliente aos poucos, sem montar o arquivo inteiro em memória.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def stream_zip(arquivos):
+    """
+    Gera os bytes de um ZIP a partir de um iterável de (nome_arquivo, conteudo_bytes).
+    Cada arquivo é entregue assim que é adicionado; PDFs já são comprimidos, então usamos ZIP_STORED.
+    """
+    buffer = _BufferStreamZip()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for nome_arquivo, conteudo in arquivos:
+            zf.writestr(nome_arquivo, conteudo)
+            yield buffer.drenar()
+    yield buffer.drenar()
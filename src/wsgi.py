@@ -0,0 +1,19 @@
+# wsgi.py
+"""
+Ponto de entrada WSGI de produção: gunicorn -c gunicorn.conf.py wsgi:app
+
+Com preload_app (gunicorn.conf.py) este módulo é importado uma única vez, no processo mestre:
+cria o app e as tabelas e carrega os módulos pesados, que os workers herdam pelo fork.
+Threads, pool de renderização e caches (templates, CSS/fontes, modelo DOCX, cliente do Sheets)
+são criados por worker no post_fork, via app.iniciar_servicos.
+"""
+import os
+
+from app import create_app, precarregar_modulos
+
+# Fora do gunicorn.conf.py (outro servidor WSGI, sem post_fork) os serviços sobem aqui mesmo
+_servicos_no_post_fork = os.environ.get('WSGI_SERVICOS_NO_POST_FORK') == '1'
+
+app = create_app(iniciar_servicos_agora=not _servicos_no_post_fork)
+if _servicos_no_post_fork:
+    precarregar_modulos()
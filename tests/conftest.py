@@ -0,0 +1,57 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks')) # fake_gspread e dados_sinteticos
+
+# A Config lê o ambiente na importação: tudo que o app grava fica num diretório temporário
+DIRETORIO_TESTES = tempfile.mkdtemp(prefix='testes_contratos_')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ['UPLOAD_FOLDER'] = os.path.join(DIRETORIO_TESTES, 'uploads')
+os.environ['PDF_CACHE_DIR'] = os.path.join(DIRETORIO_TESTES, 'cache_pdf')
+os.environ['JINJA_BYTECODE_CACHE_DIR'] = os.path.join(DIRETORIO_TESTES, 'jinja_cache')
+os.environ['PDF_POOL_WORKERS'] = '1'
+os.environ['PDF_AQUECER_RENDERIZADOR'] = '0'
+
+from config import Config # noqa: E402
+
+
+class ConfigTestes(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(DIRETORIO_TESTES, 'testes.db')
+    UPLOAD_FOLDER = os.environ['UPLOAD_FOLDER']
+
+
+@pytest.fixture(scope='session')
+def app():
+    # Um app por sessão de testes: o Flask-Session só registra a tabela de sessões uma vez por processo
+    from app import create_app
+    return create_app(ConfigTestes, iniciar_servicos_agora=False)
+
+
+@pytest.fixture
+def contexto_app(app):
+    """Contexto do app com o banco limpo ao final de cada teste."""
+    from extensions import db
+    with app.app_context():
+        yield app
+        db.session.rollback()
+        for tabela in reversed(db.metadata.sorted_tables):
+            db.session.execute(tabela.delete())
+        db.session.commit()
+
+
+@pytest.fixture
+def cliente_sheets():
+    """gspread falso (benchmarks/fake_gspread.py) injetado em google_services."""
+    from fake_gspread import ClienteFalso
+    from utils import google_services
+    cliente = ClienteFalso()
+    google_services.definir_cliente_sheets(cliente)
+    yield cliente
+    google_services.definir_cliente_sheets(None)
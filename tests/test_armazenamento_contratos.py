@@ -0,0 +1,90 @@
+# tests/test_armazenamento_contratos.py
+import os
+import logging
+import datetime
+
+import pytest
+
+from extensions import db
+from models import ContratoGerado
+from utils.armazenamento_contratos import gravar_contrato, aplicar_retencao, caminho_contrato, listar_contratos
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def upload_folder(tmp_path):
+    return str(tmp_path)
+
+
+def _gravar(upload_folder, nome, dias_atras=0, tamanho=100):
+    contrato = gravar_contrato(b'p' * tamanho, f"{nome}.pdf", {'NOME': nome, 'CPF': '1'}, 1500.0, 4.0,
+                               logger, upload_folder=upload_folder)
+    contrato.criado_em = datetime.datetime.utcnow() - datetime.timedelta(days=dias_atras)
+    db.session.commit()
+    return contrato
+
+
+def _restantes():
+    return sorted(contrato.nome_donatario for contrato in ContratoGerado.query.all())
+
+
+def test_remove_contratos_mais_velhos_que_o_prazo(contexto_app, upload_folder):
+    vencido = _gravar(upload_folder, 'Ana', dias_atras=100)
+    caminho_vencido = caminho_contrato(vencido, upload_folder)
+    recente = _gravar(upload_folder, 'Bia', dias_atras=10)
+
+    removidos = aplicar_retencao(upload_folder, logger, retencao_dias=90)
+
+    assert removidos == 1
+    assert _restantes() == ['Bia']
+    assert not os.path.exists(caminho_vencido)
+    assert os.path.exists(caminho_contrato(recente, upload_folder))
+
+
+def test_remove_os_mais_antigos_ate_caber_no_limite(contexto_app, upload_folder):
+    for dias_atras, nome in ((3, 'Ana'), (2, 'Bia'), (1, 'Caio')):
+        _gravar(upload_folder, nome, dias_atras=dias_atras)
+
+    removidos = aplicar_retencao(upload_folder, logger, retencao_dias=0, tamanho_maximo_bytes=250, tamanho_lote=1)
+
+    assert removidos == 1
+    assert _restantes() == ['Bia', 'Caio']
+
+
+def test_limpa_pdfs_soltos_do_layout_antigo(contexto_app, upload_folder):
+    pasta = os.path.join(upload_folder, 'contratos_gerados')
+    os.makedirs(pasta)
+    antigo, novo = os.path.join(pasta, 'antigo.pdf'), os.path.join(pasta, 'novo.pdf')
+    for caminho in (antigo, novo):
+        with open(caminho, 'wb') as f_pdf:
+            f_pdf.write(b'p')
+    os.utime(antigo, (0, 0))
+
+    assert aplicar_retencao(upload_folder, logger, retencao_dias=90) == 1
+    assert not os.path.exists(antigo) and os.path.exists(novo)
+
+
+def test_busca_por_nome_trata_curingas_do_like_como_texto(contexto_app, upload_folder):
+    for nome in ('Ana_Maria', 'AnaXMaria', '100% Bia', '100 Bia'):
+        _gravar(upload_folder, nome)
+
+    assert [contrato.nome_donatario for contrato in listar_contratos(nome='ana_')[1]] == ['Ana_Maria']
+    assert [contrato.nome_donatario for contrato in listar_contratos(nome='0%')[1]] == ['100% Bia']
+    assert listar_contratos(nome='ana')[0] == 2
+
+
+def test_api_de_contratos_exige_planilha_na_sessao(contexto_app, upload_folder, cliente_sheets):
+    contrato = _gravar(upload_folder, 'Ana')
+    cliente = contexto_app.test_client()
+
+    assert cliente.get('/api/contratos').status_code == 400
+    assert cliente.get(f'/api/contratos/{contrato.id}').status_code == 400
+    assert cliente.get(f'/contratos/{contrato.id}/download').status_code == 302
+
+    cliente_sheets.adicionar('planilha-contratos', [['NOME', 'CPF'], ['Ana', '1']])
+    cliente.post('/', data={'sheet_url': 'planilha-contratos'})
+    resposta = cliente.get('/api/contratos', query_string={'nome': 'ana'})
+    assert resposta.status_code == 200
+    assert [item['nome_donatario'] for item in resposta.get_json()['itens']] == ['Ana']
+
@@ -0,0 +1,81 @@
+# tests/test_contract_processing.py
+import random
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dados_sinteticos import gerar_registro
+from utils.contract_processing import (preparar_dados_para_contrato, preparar_dados_para_contrato_lote,
+                                       converter_valores_numericos)
+from utils.registro_donatario import RegistroDonatario
+
+logger = logging.getLogger(__name__)
+
+
+def _registros_com_faltas(total, semente=3):
+    """Registros sintéticos em que parte das colunas falta (chave ausente, None ou NaN)."""
+    rng = random.Random(semente)
+    registros = []
+    for indice in range(total):
+        registro = gerar_registro(rng, indice)
+        for coluna in rng.sample(sorted(registro), 4):
+            falta = rng.choice(['ausente', None, float('nan'), np.nan])
+            if falta == 'ausente':
+                del registro[coluna]
+            else:
+                registro[coluna] = falta
+        registros.append(registro)
+    return registros
+
+
+def test_lote_igual_ao_escalar_com_valores_faltando():
+    registros = _registros_com_faltas(200)
+    donatarios_df = pd.DataFrame(registros, dtype=object)
+
+    lote = preparar_dados_para_contrato_lote(donatarios_df, 1500.0, 4.0, logger)
+
+    escalar = [preparar_dados_para_contrato(RegistroDonatario.from_dict(
+        {coluna: valor for coluna, valor in registro.items() if not pd.isna(valor)}), 1500.0, 4.0, logger)
+        for registro in registros]
+    assert lote == escalar
+    assert all('nan' not in valor.lower().split() and 'None' not in valor
+               for contexto in lote for valor in contexto.values())
+
+
+def test_lote_com_colunas_numericas_vazias():
+    donatarios_df = pd.DataFrame({'NOME': ['Ana', 'Bia'], 'AGENCIA': [np.nan, np.nan], 'CONTA': [None, '0012']})
+
+    lote = preparar_dados_para_contrato_lote(donatarios_df, [1000.0, 2000.0], 2.0, logger)
+
+    assert [contexto['AGENCIA_DONATARIO'] for contexto in lote] == ['N/D', 'N/D']
+    assert [contexto['CONTA_DONATARIO'] for contexto in lote] == ['N/D', '0012']
+
+
+def test_lote_com_colunas_de_valor_e_aliquota_em_texto():
+    # Texto é o que vem da planilha e do CSV lido com dtype=str
+    donatarios_df = pd.DataFrame({'NOME': ['Ana', 'Bia', 'Caio'], 'VALOR': ['1500', '2000.5', '1.500,00'],
+                                  'ALIQUOTA': ['4', '4%', '2,5']}, dtype=object)
+
+    lote = preparar_dados_para_contrato_lote(donatarios_df, 'VALOR', 'ALIQUOTA', logger)
+
+    escalar = [preparar_dados_para_contrato(RegistroDonatario.from_dict({'NOME': nome}), valor, aliquota, logger)
+               for nome, valor, aliquota in [('Ana', 1500.0, 4.0), ('Bia', 2000.5, 4.0), ('Caio', 1500.0, 2.5)]]
+    assert lote == escalar
+
+
+def test_coluna_com_valores_invalidos_informa_as_linhas():
+    donatarios_df = pd.DataFrame({'NOME': ['Ana', 'Bia', 'Caio'], 'VALOR': ['1500', 'mil reais', '']}, dtype=object)
+
+    with pytest.raises(ValueError, match=r"linha 1: .*'mil reais'; linha 2"):
+        preparar_dados_para_contrato_lote(donatarios_df, 'VALOR', 4.0, logger)
+
+
+def test_converter_valores_numericos_aceita_formato_br_e_marca_o_resto():
+    valores, invalidos = converter_valores_numericos(['R$ 1.234,56', '7%', 3, None, 'abc'], 'VALOR')
+
+    assert valores == [1234.56, 7.0, 3.0, None, None]
+    assert sorted(invalidos) == [3, 4]
+    assert all(isinstance(valor, float) for valor in valores[:3])
+
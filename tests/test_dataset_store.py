@@ -0,0 +1,22 @@
+# tests/test_dataset_store.py
+import logging
+
+from extensions import db
+from models import DatasetDonatarios, DatasetLinha
+from utils.dataset_store import salvar_dataset, obter_dataset
+
+logger = logging.getLogger(__name__)
+
+
+def test_id_em_cache_reaproveitado_por_outro_dataset_nao_e_devolvido(contexto_app):
+    referencia_antiga = salvar_dataset('planilha-a', [{'NOME': 'Ana', 'CPF': '1'}], logger)
+    id_antigo = obter_dataset(referencia_antiga).id
+    # Outro worker remove o snapshot; o SQLite reaproveita o id no próximo dataset gravado
+    DatasetLinha.query.filter_by(dataset_id=id_antigo).delete()
+    DatasetDonatarios.query.filter_by(id=id_antigo).delete()
+    db.session.commit()
+    referencia_nova = salvar_dataset('planilha-b', [{'NOME': 'Bia', 'CPF': '2'}], logger)
+    assert obter_dataset(referencia_nova).id == id_antigo
+
+    assert obter_dataset(referencia_antiga) is None
+    assert obter_dataset(referencia_nova).sheet_id == 'planilha-b'
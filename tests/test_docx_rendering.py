@@ -0,0 +1,60 @@
+# tests/test_docx_rendering.py
+import io
+import logging
+
+from docx import Document
+
+from utils.docx_rendering import TemplateDocx
+
+logger = logging.getLogger(__name__)
+
+
+def _modelo(caminho, *paragrafos):
+    """DOCX em que cada parágrafo é uma lista de runs (o Word costuma quebrar o placeholder assim)."""
+    documento = Document()
+    for runs in paragrafos:
+        paragrafo = documento.add_paragraph()
+        for texto in runs:
+            paragrafo.add_run(texto)
+    documento.save(caminho)
+    return str(caminho)
+
+
+def _paragrafos(docx_bytes):
+    return [paragrafo.text for paragrafo in Document(io.BytesIO(docx_bytes)).paragraphs]
+
+
+def test_placeholder_dividido_em_varios_runs_e_preenchido(tmp_path):
+    caminho = _modelo(tmp_path / 'modelo.docx',
+                      ['Doador: ', 'NOME_', 'DONA', 'TARIO', ', CPF ', 'CPF_DONATARIO', '.'],
+                      ['Valor: R$ VALOR_BRUTO_DOACAO_', 'NUM (VALOR_BRUTO_DOACAO_EXTENSO)'])
+
+    template = TemplateDocx(caminho, logger=logger)
+    docx_bytes = template.preencher({'NOME_DONATARIO': 'Ana & <Filhos>', 'CPF_DONATARIO': '012.345.678-90',
+                                     'VALOR_BRUTO_DOACAO_NUM': '1.500,00',
+                                     'VALOR_BRUTO_DOACAO_EXTENSO': 'MIL E QUINHENTOS REAIS'})
+
+    assert _paragrafos(docx_bytes) == ['Doador: Ana & <Filhos>, CPF 012.345.678-90.',
+                                       'Valor: R$ 1.500,00 (MIL E QUINHENTOS REAIS)']
+
+
+def test_formatacao_do_primeiro_run_e_mantida(tmp_path):
+    documento = Document()
+    paragrafo = documento.add_paragraph()
+    paragrafo.add_run('NOME_DO').bold = True
+    paragrafo.add_run('NATARIO')
+    caminho = str(tmp_path / 'negrito.docx')
+    documento.save(caminho)
+
+    docx_bytes = TemplateDocx(caminho, logger=logger).preencher({'NOME_DONATARIO': 'Bia'})
+
+    runs = Document(io.BytesIO(docx_bytes)).paragraphs[0].runs
+    assert [(run.text, bool(run.bold)) for run in runs if run.text] == [('Bia', True)]
+
+
+def test_preencher_duas_vezes_nao_altera_o_modelo(tmp_path):
+    template = TemplateDocx(_modelo(tmp_path / 'modelo.docx', ['NOME_DONATARIO']), logger=logger)
+
+    template.preencher({'NOME_DONATARIO': 'Caio'})
+
+    assert _paragrafos(template.preencher({'NOME_DONATARIO': 'Davi'})) == ['Davi']
@@ -0,0 +1,55 @@
+# tests/test_formatacao_ptbr.py
+import datetime
+
+import pytest
+from num2words import num2words
+
+from utils import formatacao_ptbr
+from utils.formatacao_ptbr import (formatar_numero_br, formatar_percentual, moeda_por_extenso,
+                                   local_data_completa, limpar_caches)
+
+# Bordas (centavos, milhares, milhões, arredondamento, int x float) e uma faixa regular de valores
+VALORES = ([0, 0.0, 0.01, 0.005, 0.5, 1, 1.0, 2, 2.675, 10.1, 99.99, 100, 999.995, 1000, 1000.0, 1234.5, 1500,
+            1500.0, 1500.5, 100000, 1000000, 1000000.0, 1234567.89, 987654321.12, -1500.5]
+           + [centavos / 100 for centavos in range(0, 2_000_001, 9973)])
+
+
+@pytest.fixture(autouse=True)
+def caches_vazias():
+    limpar_caches()
+    yield
+    limpar_caches()
+
+
+def _numero_br_original(valor):
+    return f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+@pytest.mark.parametrize('chamada', ['sem cache', 'com cache'])
+def test_formatacao_igual_a_original_em_toda_a_faixa(chamada):
+    if chamada == 'com cache':
+        for valor in VALORES:
+            formatar_numero_br(valor), formatar_percentual(valor), moeda_por_extenso(valor)
+
+    for valor in VALORES:
+        assert formatar_numero_br(valor) == _numero_br_original(valor), valor
+        assert formatar_percentual(valor) == f"{valor:,.2f}%".replace('.', ','), valor
+        assert moeda_por_extenso(valor) == num2words(valor, lang='pt_BR', to='currency').upper(), valor
+
+
+def test_int_e_float_nao_dividem_a_entrada_da_cache():
+    # Conforme a versão, num2words trata int como centavos: cada tipo tem a sua entrada e o seu texto
+    assert moeda_por_extenso(1000) == num2words(1000, lang='pt_BR', to='currency').upper()
+    assert moeda_por_extenso(1000.0) == num2words(1000.0, lang='pt_BR', to='currency').upper()
+    assert formatacao_ptbr.moeda_por_extenso.cache_info().currsize == 2
+    assert formatar_numero_br(1500) == formatar_numero_br(1500.0) == '1.500,00'
+    assert formatacao_ptbr.formatar_numero_br.cache_info().currsize == 2
+
+
+def test_texto_numerico_igual_ao_num2words():
+    for texto in ('1500', '1500.50', '0.01'):
+        assert moeda_por_extenso(texto) == num2words(texto, lang='pt_BR', to='currency').upper()
+
+
+def test_local_data_completa():
+    assert local_data_completa('Mossoró', 'RN', datetime.date(2025, 3, 5)) == 'MOSSORÓ/RN, 5 DE MARÇO DE 2025'
@@ -0,0 +1,105 @@
+# tests/test_gerar_contratos_cli.py
+import os
+import json
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import gerar_contratos_cli
+from config import Config
+from utils import pdf_rendering
+
+
+class PoolFalso:
+    """Executa as tarefas na hora; um BrokenProcessPool do worker quebra o pool, como a morte de um processo filho."""
+
+    def __init__(self, max_workers=None, initializer=None, initargs=()):
+        self.quebrado = False
+
+    def submit(self, funcao, *args):
+        if self.quebrado:
+            raise BrokenProcessPool("pool quebrado")
+        future = Future()
+        try:
+            future.set_result(funcao(*args))
+        except BrokenProcessPool as e_pool:
+            self.quebrado = True
+            future.set_exception(e_pool)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def pool_falso(monkeypatch):
+    monkeypatch.setattr(pdf_rendering, 'ProcessPoolExecutor', PoolFalso)
+    monkeypatch.setattr(pdf_rendering, '_process_pool', None)
+    # O CLI ajusta o pool do app pelos argumentos; restaura a configuração ao fim do teste
+    monkeypatch.setattr(Config, 'PDF_POOL_WORKERS', Config.PDF_POOL_WORKERS)
+    monkeypatch.setattr(Config, 'PDF_AQUECER_RENDERIZADOR', Config.PDF_AQUECER_RENDERIZADOR)
+
+
+def _ler_manifesto(saida):
+    with open(os.path.join(saida, gerar_contratos_cli.NOME_MANIFESTO), encoding='utf-8') as f_manifesto:
+        return [json.loads(texto) for texto in f_manifesto][1:]
+
+
+def test_linha_com_valor_invalido_vira_erro_no_manifesto_e_o_resto_e_gerado(tmp_path, monkeypatch, pool_falso):
+    entrada = tmp_path / 'donatarios.csv'
+    entrada.write_text('NOME;CPF;VALOR\nAna;1;1.500,00\nBia;2;mil reais\nCaio;3;2000.5\n', encoding='utf-8')
+    gerados = []
+
+    def _renderizar(tarefa):
+        gerados.append((tarefa[0], tarefa[1]['VALOR_BRUTO_DOACAO_NUM']))
+        return tarefa[0], tarefa[2], b'%PDF-falso', {}
+
+    monkeypatch.setattr(gerar_contratos_cli, 'renderizar_contrato_worker', _renderizar)
+    saida = tmp_path / 'saida'
+
+    codigo = gerar_contratos_cli.main([str(entrada), '--saida', str(saida), '--coluna-valor', 'VALOR',
+                                       '--aliquota', '4', '--workers', '1'])
+
+    assert codigo == 1
+    assert sorted(gerados) == [(0, '1.500,00'), (2, '2.000,50')]
+    registros = _ler_manifesto(saida)
+    assert {registro['linha']: 'arquivo' in registro for registro in registros} == {0: True, 1: False, 2: True}
+    assert 'mil reais' in next(registro['erro'] for registro in registros if registro['linha'] == 1)
+    with open(os.path.join(saida, gerar_contratos_cli.NOME_ERROS), encoding='utf-8') as f_erros:
+        linhas_erro = f_erros.read().splitlines()
+    assert len(linhas_erro) == 1 and linhas_erro[0].startswith("Linha 1: ") and 'mil reais' in linhas_erro[0]
+
+
+def test_processo_de_renderizacao_encerrado_reenvia_uma_vez_e_registra_a_linha(tmp_path, monkeypatch, pool_falso):
+    entrada = tmp_path / 'donatarios.csv'
+    entrada.write_text('NOME;CPF;VALOR\nAna;1;100\nBia;2;200\nCaio;3;300\n', encoding='utf-8')
+    tentativas = {}
+
+    def _renderizar(tarefa):
+        linha = tarefa[0]
+        tentativas[linha] = tentativas.get(linha, 0) + 1
+        # Linha 1 derruba o processo só na primeira vez; linha 2 derruba sempre
+        if (linha == 1 and tentativas[linha] == 1) or linha == 2:
+            raise BrokenProcessPool("processo filho encerrado")
+        return linha, tarefa[2], b'%PDF-falso', {}
+
+    monkeypatch.setattr(gerar_contratos_cli, 'renderizar_contrato_worker', _renderizar)
+    saida = tmp_path / 'saida'
+
+    codigo = gerar_contratos_cli.main([str(entrada), '--saida', str(saida), '--coluna-valor', 'VALOR',
+                                       '--aliquota', '4', '--workers', '1'])
+
+    assert codigo == 1
+    assert tentativas == {0: 1, 1: 2, 2: 2}
+    registros = _ler_manifesto(saida)
+    assert {registro['linha']: 'arquivo' in registro for registro in registros} == {0: True, 1: True, 2: False}
+    with open(os.path.join(saida, gerar_contratos_cli.NOME_ERROS), encoding='utf-8') as f_erros:
+        linhas_erro = f_erros.read().splitlines()
+    assert len(linhas_erro) == 1 and linhas_erro[0].startswith("Linha 2: Processo de renderização encerrado")
+
+    # Nova execução após corrigir a causa: a linha 2 é gerada e o ERROS.txt desatualizado é removido
+    monkeypatch.setattr(gerar_contratos_cli, 'renderizar_contrato_worker', lambda tarefa: (tarefa[0], tarefa[2], b'%PDF', {}))
+    assert gerar_contratos_cli.main([str(entrada), '--saida', str(saida), '--coluna-valor', 'VALOR',
+                                     '--aliquota', '4', '--workers', '1']) == 0
+    assert not os.path.exists(os.path.join(saida, gerar_contratos_cli.NOME_ERROS))
@@ -0,0 +1,197 @@
+# tests/test_google_services.py
+import os
+import logging
+
+import pytest
+
+from config import Config
+from utils import google_services
+from utils.dataset_store import hash_registro, obter_snapshot_para_sincronizacao, obter_linha
+
+logger = logging.getLogger(__name__)
+
+CABECALHO = ['NOME', 'CPF', 'CEP']
+
+
+def _linhas(*donatarios):
+    return [list(CABECALHO)] + [list(donatario) for donatario in donatarios]
+
+
+def _snapshot(linhas, revisao):
+    """Snapshot no formato de dataset_store.obter_snapshot_para_sincronizacao."""
+    registros = [dict(zip(linhas[0], linha)) for linha in linhas[1:]]
+    return {"versao": "v1", "revisao": revisao, "colunas": list(linhas[0]),
+            "nomes": [registro['NOME'] for registro in registros],
+            "hashes": [hash_registro(registro) for registro in registros]}
+
+
+@pytest.fixture
+def ttl(monkeypatch):
+    monkeypatch.setattr(Config, 'SHEETS_CACHE_TTL', 300)
+    return 300
+
+
+def test_registros_mantem_texto_com_zeros_a_esquerda(cliente_sheets):
+    cliente_sheets.adicionar('planilha', _linhas(('Ana', '01234567890', '01310-100')))
+
+    registros = google_services.get_sheet_records('planilha', logger)
+
+    assert registros == [{'NOME': 'Ana', 'CPF': '01234567890', 'CEP': '01310-100'}]
+
+
+def test_cache_ttl_nao_chama_a_api(cliente_sheets, ttl):
+    planilha = cliente_sheets.adicionar('planilha', _linhas(('Ana', '1', '2')))
+    google_services.get_sheet_records('planilha', logger)
+    chamadas = planilha.sheet1.chamadas
+
+    planilha.sheet1.linhas.append(['Bia', '3', '4'])
+    registros = google_services.get_sheet_records('planilha', logger)
+
+    assert planilha.sheet1.chamadas == chamadas
+    assert [registro['NOME'] for registro in registros] == ['Ana']
+
+
+def test_cache_expirado_reaproveita_registros_se_revisao_nao_mudou(cliente_sheets, ttl, monkeypatch):
+    planilha = cliente_sheets.adicionar('planilha', _linhas(('Ana', '1', '2')))
+    google_services.get_sheet_records('planilha', logger)
+    monkeypatch.setattr(Config, 'SHEETS_CACHE_TTL', 0)
+
+    planilha.sheet1.linhas.append(['Bia', '3', '4']) # mesma revisão: o conteúdo não é relido
+    registros = google_services.get_sheet_records('planilha', logger)
+
+    assert [registro['NOME'] for registro in registros] == ['Ana']
+
+
+def test_revisao_nova_invalida_o_cache(cliente_sheets, ttl, monkeypatch):
+    planilha = cliente_sheets.adicionar('planilha', _linhas(('Ana', '1', '2')))
+    google_services.get_sheet_records('planilha', logger)
+    monkeypatch.setattr(Config, 'SHEETS_CACHE_TTL', 0)
+
+    planilha.sheet1.linhas.append(['Bia', '3', '4'])
+    planilha.revisao = '2024-02-01T00:00:00.000Z'
+    registros = google_services.get_sheet_records('planilha', logger)
+
+    assert [registro['NOME'] for registro in registros] == ['Ana', 'Bia']
+    assert google_services.revisao_em_cache('planilha') == planilha.revisao
+
+
+def test_cliente_autorizado_e_reaproveitado_ate_o_arquivo_de_credenciais_mudar(tmp_path, monkeypatch):
+    credenciais = tmp_path / 'credentials.json'
+    credenciais.write_text('{}')
+    autorizacoes = []
+    monkeypatch.setattr(google_services.ServiceAccountCredentials, 'from_json_keyfile_name',
+                        lambda caminho, escopos: object())
+    monkeypatch.setattr(google_services.gspread, 'authorize', lambda creds: autorizacoes.append(creds) or object())
+    monkeypatch.setattr(google_services, '_cliente_cache', dict(google_services._cliente_cache, client=None))
+
+    primeiro = google_services.get_google_sheets_client(logger, str(credenciais))
+    assert google_services.get_google_sheets_client(logger, str(credenciais)) is primeiro
+    assert len(autorizacoes) == 1
+
+    os.utime(credenciais, (1000, 1000))
+    assert google_services.get_google_sheets_client(logger, str(credenciais)) is not primeiro
+    assert len(autorizacoes) == 2
+
+
+def test_sincronizacao_sem_alteracoes_nao_le_a_aba(cliente_sheets):
+    linhas = _linhas(('Ana', '1', '2'))
+    planilha = cliente_sheets.adicionar('planilha', linhas)
+
+    resultado = google_services.sincronizar_planilha('planilha', logger, _snapshot(linhas, planilha.revisao))
+
+    assert resultado["modo"] == "sem_alteracoes"
+    assert resultado["linhas_lidas"] == 0
+
+
+def test_sincronizacao_detecta_linhas_adicionadas_editadas_e_removidas(cliente_sheets):
+    antigas = _linhas(('Ana', '1', '2'), ('Bia', '3', '4'), ('Caio', '5', '6'), ('Davi', '7', '8'))
+    snapshot = _snapshot(antigas, 'r1')
+    planilha = cliente_sheets.adicionar('planilha', _linhas(('Ana', '1', '2'), ('Bia', '03', '4'), ('Caio', '5', '6')),
+                                        revisao='r2')
+
+    resultado = google_services.sincronizar_planilha('planilha', logger, snapshot)
+    assert resultado["modo"] == "incremental"
+    assert resultado["alteradas"] == [1]
+    assert resultado["removidas"] == [3]
+    assert resultado["alteracoes"] == {1: {'NOME': 'Bia', 'CPF': '03', 'CEP': '4'}}
+
+    snapshot = _snapshot(planilha.sheet1.linhas, 'r2')
+    planilha.sheet1.linhas.append(['Eva', '9', '10'])
+    planilha.revisao = 'r3'
+    resultado = google_services.sincronizar_planilha('planilha', logger, snapshot)
+    assert resultado["adicionadas"] == [3]
+    assert resultado["alteradas"] == [] and resultado["removidas"] == []
+    assert resultado["alteracoes"][3] == {'NOME': 'Eva', 'CPF': '9', 'CEP': '10'}
+    assert resultado["total_linhas"] == 4
+
+
+def test_sincronizacao_padrao_le_so_linhas_novas_e_deslocadas(cliente_sheets):
+    antigas = _linhas(('Ana', '1', '2'), ('Bia', '3', '4'), ('Caio', '5', '6'))
+    planilha = cliente_sheets.adicionar('planilha', _linhas(('Ana', '1', '2'), ('Bia', '03', '4'), ('Davi', '7', '8'),
+                                                            ('Eva', '9', '10')), revisao='r2')
+
+    resultado = google_services.sincronizar_planilha('planilha', logger, _snapshot(antigas, 'r1'),
+                                                     verificar_edicoes=False)
+
+    # A edição do CPF de Bia (chave igual) só é vista com verificar_edicoes=True
+    assert (resultado["alteradas"], resultado["adicionadas"], resultado["removidas"]) == ([2], [3], [])
+    assert resultado["linhas_lidas"] == 2
+    assert planilha.sheet1.chamadas == 4 # revisão, cabeçalho, coluna-chave e um batch_get
+
+
+@pytest.mark.parametrize('verificar_edicoes', [True, False])
+def test_sincronizacao_conta_linhas_finais_com_chave_vazia(cliente_sheets, verificar_edicoes):
+    antigas = _linhas(('Ana', '1', '2'))
+    cliente_sheets.adicionar('planilha', _linhas(('Ana', '1', '2'), ('', '3', '4'), ('', '5')), revisao='r2')
+
+    resultado = google_services.sincronizar_planilha('planilha', logger, _snapshot(antigas, 'r1'),
+                                                     verificar_edicoes=verificar_edicoes)
+
+    assert resultado["total_linhas"] == 3
+    assert resultado["adicionadas"] == [1, 2]
+    assert resultado["alteracoes"][2] == {'NOME': '', 'CPF': '5', 'CEP': ''}
+
+    resultado = google_services.sincronizar_planilha('planilha', logger, _snapshot(_linhas(('Ana', '1', '2'), ('', '3', '4'),
+                                                                                           ('', '5', '')), 'r1'),
+                                                     verificar_edicoes=verificar_edicoes)
+    assert (resultado["total_linhas"], resultado["alteracoes"], resultado["removidas"]) == (3, {}, [])
+
+
+def test_sincronizacao_com_cabecalho_novo_faz_leitura_completa(cliente_sheets):
+    snapshot = _snapshot(_linhas(('Ana', '1', '2')), 'r1')
+    cliente_sheets.adicionar('planilha', [['NOME', 'CPF'], ['Ana', '1']], revisao='r2')
+
+    resultado = google_services.sincronizar_planilha('planilha', logger, snapshot)
+
+    assert resultado["modo"] == "completo"
+    assert resultado["registros"] == [{'NOME': 'Ana', 'CPF': '1'}]
+
+
+def test_sincronizacao_padrao_le_todos_os_valores_numa_chamada(cliente_sheets):
+    antigas = _linhas(('Ana', '1', '2'), ('Bia', '3', '4'))
+    planilha = cliente_sheets.adicionar('planilha', _linhas(('Ana', '1', '2'), ('Bia', '03', '4'), ('Caio', '5', '6')),
+                                        revisao='r2')
+
+    resultado = google_services.sincronizar_planilha('planilha', logger, _snapshot(antigas, 'r1'))
+
+    assert (resultado["alteradas"], resultado["adicionadas"], resultado["removidas"]) == ([1], [2], [])
+    assert resultado["alteracoes"][1]['CPF'] == '03'
+    assert planilha.sheet1.chamadas == 3 # revisão, cabeçalho e um batch_get do intervalo todo
+
+
+def test_cpf_editado_na_planilha_chega_ao_snapshot(contexto_app, cliente_sheets):
+    planilha = cliente_sheets.adicionar('planilha-edicao', _linhas(('Ana', '01234567890', '1'), ('Bia', '2', '3')),
+                                        revisao='r1')
+    cliente = contexto_app.test_client()
+    cliente.post('/', data={'sheet_url': 'planilha-edicao'})
+
+    planilha.sheet1.linhas[1][1] = '09876543210' # CPF da Ana corrigido; NOME e número de linhas iguais
+    planilha.revisao = 'r2'
+    cliente.post('/', data={'sheet_url': 'planilha-edicao'})
+
+    snapshot = obter_snapshot_para_sincronizacao('planilha-edicao')
+    assert snapshot["revisao"] == 'r2'
+    assert snapshot["hashes"][0] == hash_registro({'NOME': 'Ana', 'CPF': '09876543210', 'CEP': '1'})
+    with cliente.session_transaction() as sessao:
+        assert obter_linha(sessao['dataset_ref'], 0).get('CPF') == '09876543210'
+
@@ -0,0 +1,54 @@
+# tests/test_indice_donatarios.py
+from utils.indice_donatarios import IndiceDonatarios, normalizar_nome
+
+LINHAS = [
+    (0, 'José da Silva', '012.345.678-90'),
+    (1, 'Maria Souza', '98765432100'),
+    (2, 'Ana Maria Lima', '01299988877'),
+    (3, 'joselito Santos', '55544433322'),
+    (4, 'Maria 2ª Via', '20011122233'),
+]
+
+
+def _nomes(indice, posicoes):
+    return [indice.nomes[posicao] for posicao in posicoes]
+
+
+def test_normalizar_nome_tira_acentos_caixa_e_espacos():
+    assert normalizar_nome('  José   SILVA ') == 'jose silva'
+    assert normalizar_nome(None) == ''
+
+
+def test_prefixo_vem_antes_de_substring_cada_grupo_na_ordem_da_planilha():
+    indice = IndiceDonatarios(LINHAS)
+
+    assert _nomes(indice, indice.buscar('maria')) == ['Maria Souza', 'Maria 2ª Via', 'Ana Maria Lima']
+    assert _nomes(indice, indice.buscar('JOSE')) == ['José da Silva', 'joselito Santos']
+    assert _nomes(indice, indice.buscar('silva')) == ['José da Silva']
+
+
+def test_busca_por_cpf_com_ou_sem_pontuacao():
+    indice = IndiceDonatarios(LINHAS)
+
+    assert _nomes(indice, indice.buscar('012.345')) == ['José da Silva']
+    assert _nomes(indice, indice.buscar('012')) == ['José da Silva', 'Ana Maria Lima']
+    assert _nomes(indice, indice.buscar('4433')) == ['joselito Santos']
+
+
+def test_nome_com_digitos_nao_casa_prefixo_de_cpf():
+    indice = IndiceDonatarios(LINHAS)
+
+    # '2' em 'Maria 2' é parte do nome: não traz os CPFs que começam com 2
+    assert _nomes(indice, indice.buscar('Maria 2')) == ['Maria 2ª Via']
+    assert indice.buscar('2') == [4, 0, 1, 2, 3] # só dígitos: prefixo de CPF primeiro, depois substring
+
+
+def test_pagina_respeita_total_e_limites():
+    linhas = [(numero, f'Donatário {numero:03d}', f'{numero:011d}') for numero in range(120)]
+    indice = IndiceDonatarios(linhas)
+
+    total, itens = indice.pagina('', pagina=3, por_pagina=50)
+    assert total == 120 and [item['indice'] for item in itens] == list(range(100, 120))
+    assert indice.pagina('', pagina=4, por_pagina=50) == (120, [])
+    total, itens = indice.pagina('donatario 11', pagina=1, por_pagina=5)
+    assert total == 10 and itens[0] == {'indice': 110, 'nome': 'Donatário 110', 'cpf': '00000000110'}
@@ -0,0 +1,208 @@
+# tests/test_job_queue.py
+import json
+import logging
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from extensions import db
+from models import ContratoJob
+from config import Config
+from utils import job_queue, pdf_rendering
+from utils.armazenamento_contratos import obter_contrato_do_job, listar_contratos_do_job
+
+logger = logging.getLogger(__name__)
+
+
+def _job(nome, **campos):
+    job = ContratoJob(id=f"job-{nome}", dados_donatario_json=json.dumps({'NOME': nome, 'CPF': '01234567890'}),
+                      nome_donatario=nome, valor_bruto_doacao=1500.0, aliquota_percentual=4.0, **campos)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+@pytest.fixture
+def render_falso(monkeypatch):
+    """Substitui o pool de renderização: registra as tarefas e devolve um PDF fixo (ou a exceção configurada)."""
+    chamadas = []
+    falhas = []
+
+    def _executar_no_pool(funcao, tarefa, ao_aguardar=None, intervalo_aguardar=None):
+        chamadas.append(tarefa)
+        if falhas:
+            raise falhas.pop(0)
+        if ao_aguardar is not None and _executar_no_pool.durante_render:
+            _executar_no_pool.durante_render(ao_aguardar)
+        if funcao is job_queue.renderizar_volume_mesclado_worker: # (numero_volume, contratos, base_url)
+            return tarefa[0], len(tarefa[1]), f'%PDF-falso volume {tarefa[0]}'.encode(), {}
+        return tarefa[0], tarefa[2], b'%PDF-falso ' + tarefa[2].encode(), {}
+
+    monkeypatch.setattr(job_queue, 'executar_no_pool', _executar_no_pool)
+    _executar_no_pool.chamadas, _executar_no_pool.falhas = chamadas, falhas
+    _executar_no_pool.durante_render = None # callback(ao_aguardar) para simular um render longo
+    return _executar_no_pool
+
+
+def test_reserva_nao_entrega_o_mesmo_job_duas_vezes(contexto_app):
+    _job('Ana')
+    _job('Bia')
+
+    primeiro, segundo = job_queue._reservar_proximo_job(), job_queue._reservar_proximo_job()
+
+    assert {primeiro.id, segundo.id} == {'job-Ana', 'job-Bia'}
+    assert primeiro.status == segundo.status == ContratoJob.STATUS_PROCESSANDO
+    assert job_queue._reservar_proximo_job() is None
+
+
+def test_reserva_respeita_a_proxima_tentativa(contexto_app):
+    _job('Caio', proxima_tentativa_em=datetime.datetime.utcnow() + datetime.timedelta(minutes=5))
+
+    assert job_queue._reservar_proximo_job() is None
+
+
+def test_job_concluido_grava_o_contrato(contexto_app, render_falso):
+    _job('Davi')
+
+    job = job_queue._reservar_proximo_job()
+    job_queue._processar_job(contexto_app, job)
+
+    assert job.status == ContratoJob.STATUS_CONCLUIDO and job.progresso == 100
+    contrato = obter_contrato_do_job(job.id)
+    assert contrato.nome_arquivo == job.nome_arquivo_pdf
+    assert contrato.cpf == '01234567890'
+
+
+def test_falha_volta_para_a_fila_com_backoff_e_depois_vira_erro(contexto_app, render_falso):
+    render_falso.falhas.extend([RuntimeError('weasyprint caiu')] * 2)
+    _job('Eva', max_tentativas=2)
+
+    job = job_queue._reservar_proximo_job()
+    job_queue._processar_job(contexto_app, job)
+
+    assert (job.status, job.tentativas, job.erro) == (ContratoJob.STATUS_PENDENTE, 1, 'weasyprint caiu')
+    assert job.proxima_tentativa_em > datetime.datetime.utcnow()
+    assert job_queue._reservar_proximo_job() is None # ainda no backoff
+
+    job.proxima_tentativa_em = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    db.session.commit()
+    job = job_queue._reservar_proximo_job()
+    job_queue._processar_job(contexto_app, job)
+
+    assert (job.status, job.tentativas) == (ContratoJob.STATUS_ERRO, 2)
+    assert len(render_falso.chamadas) == 2
+    assert job_queue._reservar_proximo_job() is None
+
+
+def test_job_de_pdf_mesclado_grava_um_contrato_por_volume_e_retoma_sem_refazer(contexto_app, render_falso,
+                                                                              monkeypatch):
+    monkeypatch.setattr(Config, 'PDF_MESCLADO_CONTRATOS_POR_VOLUME', 2)
+    itens = [({'NOME': nome, 'CPF': '1'}, 1500.0, 4.0) for nome in ('Ana', 'Bia', 'Caio', 'Davi', 'Eva')]
+    job_queue.submeter_job_pdf_mesclado(itens, 'http://localhost/', logger)
+
+    def _falhar_no_segundo_volume(funcao, tarefa, **kwargs):
+        if tarefa[0] == 2 and render_falso.chamadas.count(tarefa) == 0:
+            render_falso.chamadas.append(tarefa)
+            raise RuntimeError('weasyprint caiu')
+        return render_falso(funcao, tarefa, **kwargs)
+
+    monkeypatch.setattr(job_queue, 'executar_no_pool', _falhar_no_segundo_volume)
+    job = job_queue._reservar_proximo_job()
+    job_queue._processar_job(contexto_app, job)
+    assert (job.status, [c.nome_arquivo for c in listar_contratos_do_job(job.id)]) == (
+        ContratoJob.STATUS_PENDENTE, [job_queue.nome_arquivo_pdf_unico(1, 3, job.criado_em.date())])
+
+    job.proxima_tentativa_em = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    db.session.commit()
+    job = job_queue._reservar_proximo_job()
+    job_queue._processar_job(contexto_app, job)
+
+    assert (job.status, job.progresso) == (ContratoJob.STATUS_CONCLUIDO, 100)
+    assert [tarefa[0] for tarefa in render_falso.chamadas] == [1, 2, 2, 3]
+    assert [len(tarefa[1]) for tarefa in render_falso.chamadas[-2:]] == [2, 1]
+    assert len(listar_contratos_do_job(job.id)) == 3
+    assert job.nome_arquivo_pdf.endswith('.zip')
+
+
+def test_volume_longo_renova_o_heartbeat_e_nao_e_tomado_por_travado(contexto_app, render_falso, monkeypatch):
+    monkeypatch.setattr(job_queue, '_ultima_recuperacao', float('-inf'))
+    job_queue.submeter_job_pdf_mesclado([({'NOME': 'Ana', 'CPF': '1'}, 1500.0, 4.0)], 'http://localhost/', logger)
+    job = job_queue._reservar_proximo_job()
+    # Reservado há mais que o timeout: sem heartbeat, a recuperação o devolveria para a fila no meio do render
+    job.atualizado_em = datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=contexto_app.config['JOBS_TIMEOUT_SEGUNDOS'] + 60)
+    db.session.commit()
+    status_durante_render = []
+
+    def _render_longo(ao_aguardar):
+        ao_aguardar()
+        job_queue._recuperar_jobs_travados(contexto_app)
+        status_durante_render.append(db.session.execute(
+            db.select(ContratoJob.status, ContratoJob.tentativas).filter_by(id=job.id)).one())
+
+    render_falso.durante_render = _render_longo
+    job_queue._processar_job(contexto_app, job)
+
+    assert status_durante_render == [(ContratoJob.STATUS_PROCESSANDO, 0)]
+    assert job.status == ContratoJob.STATUS_CONCLUIDO
+
+
+def test_executar_no_pool_chama_ao_aguardar_enquanto_a_tarefa_roda(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pdf_rendering, 'submeter_no_pool',
+                        lambda funcao, argumento: (executor.submit(funcao, argumento), executor))
+    batidas = []
+
+    resultado = pdf_rendering.executar_no_pool(lambda segundos: time.sleep(segundos) or 'pronto', 0.3,
+                                               ao_aguardar=lambda: batidas.append(1), intervalo_aguardar=0.05)
+
+    executor.shutdown()
+    assert resultado == 'pronto' and len(batidas) >= 2
+
+
+def test_jobs_travados_voltam_para_a_fila(contexto_app, monkeypatch):
+    monkeypatch.setattr(job_queue, '_ultima_recuperacao', float('-inf'))
+    antigo = datetime.datetime.utcnow() - datetime.timedelta(seconds=contexto_app.config['JOBS_TIMEOUT_SEGUNDOS'] + 60)
+    _job('Fabi', status=ContratoJob.STATUS_PROCESSANDO, progresso=10, atualizado_em=antigo)
+    _job('Gil', status=ContratoJob.STATUS_PROCESSANDO, progresso=10)
+
+    job_queue._recuperar_jobs_travados(contexto_app)
+
+    db.session.expire_all()
+    assert db.session.get(ContratoJob, 'job-Fabi').status == ContratoJob.STATUS_PENDENTE
+    assert db.session.get(ContratoJob, 'job-Gil').status == ContratoJob.STATUS_PROCESSANDO
+    assert db.session.get(ContratoJob, 'job-Fabi').tentativas == 1
+    assert job_queue._reservar_proximo_job().id == 'job-Fabi'
+
+
+def test_job_travado_sem_tentativas_restantes_vira_erro(contexto_app, monkeypatch):
+    monkeypatch.setattr(job_queue, '_ultima_recuperacao', float('-inf'))
+    antigo = datetime.datetime.utcnow() - datetime.timedelta(seconds=contexto_app.config['JOBS_TIMEOUT_SEGUNDOS'] + 60)
+    # Derrubou o processo em duas tentativas; a terceira interrupção esgota max_tentativas
+    _job('Iara', status=ContratoJob.STATUS_PROCESSANDO, tentativas=2, max_tentativas=3, atualizado_em=antigo)
+
+    job_queue._recuperar_jobs_travados(contexto_app)
+
+    db.session.expire_all()
+    job = db.session.get(ContratoJob, 'job-Iara')
+    assert (job.status, job.tentativas) == (ContratoJob.STATUS_ERRO, 3)
+    assert 'interrompido' in job.erro
+    assert job_queue._reservar_proximo_job() is None
+
+
+def test_rotas_de_job_devolvem_202_e_o_status_para_acompanhar(contexto_app, cliente_sheets):
+    cliente_sheets.adicionar('planilha-jobs', [['NOME', 'CPF'], ['Hugo Job', '98765432100']])
+    cliente = contexto_app.test_client()
+    cliente.post('/', data={'sheet_url': 'planilha-jobs'})
+
+    resposta = cliente.post('/jobs', json={'cpf': '987.654.321-00', 'valor_doacao': 1500, 'aliquota': 4})
+
+    assert resposta.status_code == 202
+    dados_job = resposta.get_json()
+    assert dados_job['status'] == ContratoJob.STATUS_PENDENTE
+    status = cliente.get(dados_job['status_url']).get_json()
+    assert (status['job_id'], status['nome_donatario']) == (dados_job['job_id'], 'Hugo Job')
+    assert cliente.get(dados_job['resultado_url']).status_code == 409
+    assert cliente.get('/jobs/nao-existe').status_code == 404
@@ -0,0 +1,77 @@
+# tests/test_lote_contratos.py
+import io
+import zipfile
+
+import pytest
+
+from utils import pdf_rendering
+from utils.zip_stream import stream_zip
+
+
+@pytest.fixture
+def cliente_com_planilha(contexto_app, cliente_sheets):
+    cliente_sheets.adicionar('planilha-lote-zip', [['NOME', 'CPF'], ['Ana Lote', '1'], ['Bia Lote', '2'],
+                                                   ['Caio Lote', '3']])
+    cliente = contexto_app.test_client()
+    cliente.post('/', data={'sheet_url': 'planilha-lote-zip'})
+    return cliente
+
+
+@pytest.fixture
+def pool_falso(monkeypatch):
+    """mapear_no_pool sem processos: 'renderiza' cada tarefa na hora e falha nos índices configurados."""
+    falhar_em = set()
+
+    def _mapear_no_pool(funcao, tarefas):
+        for tarefa in tarefas:
+            if tarefa[0] in falhar_em:
+                yield tarefa, None, RuntimeError(f'falha no índice {tarefa[0]}')
+            else:
+                yield tarefa, (tarefa[0], tarefa[2], f'%PDF-{tarefa[1]["NOME_DONATARIO"]}'.encode(), {}), None
+
+    monkeypatch.setattr(pdf_rendering, 'mapear_no_pool', _mapear_no_pool)
+    _mapear_no_pool.falhar_em = falhar_em
+    return _mapear_no_pool
+
+
+def test_stream_zip_entrega_um_pedaco_por_arquivo():
+    entregues = []
+
+    def _arquivos():
+        for numero in range(3):
+            entregues.append(numero)
+            yield f'arquivo{numero}.pdf', b'%PDF' * (numero + 1)
+
+    pedacos = []
+    for pedaco in stream_zip(_arquivos()):
+        pedacos.append((len(entregues), pedaco))
+
+    # Cada arquivo sai no pedaço seguinte à sua leitura, sem esperar os demais
+    assert [entregues_ate_aqui for entregues_ate_aqui, pedaco in pedacos[:3]] == [1, 2, 3]
+    assert all(b'%PDF' in pedaco for _, pedaco in pedacos[:3])
+    with zipfile.ZipFile(io.BytesIO(b''.join(pedaco for _, pedaco in pedacos))) as arquivo_zip:
+        assert arquivo_zip.namelist() == ['arquivo0.pdf', 'arquivo1.pdf', 'arquivo2.pdf']
+        assert arquivo_zip.read('arquivo2.pdf') == b'%PDF' * 3
+        assert arquivo_zip.testzip() is None
+
+
+def test_lote_zip_tem_um_pdf_por_indice_e_um_erros_txt(cliente_com_planilha, pool_falso):
+    pool_falso.falhar_em.add(1)
+
+    resposta = cliente_com_planilha.post('/gerar_contratos_lote', json={'indices': 'all', 'valor_doacao': 1234.5,
+                                                                        'aliquota': 4})
+
+    assert resposta.status_code == 200 and resposta.mimetype == 'application/zip'
+    with zipfile.ZipFile(io.BytesIO(resposta.data)) as arquivo_zip:
+        nomes = arquivo_zip.namelist()
+        assert sorted(nome[:6] for nome in nomes if nome.endswith('.pdf')) == ['00000_', '00002_']
+        assert arquivo_zip.read(nomes[0]).startswith(b'%PDF-')
+        assert arquivo_zip.read('ERROS.txt') == b'1: falha no \xc3\xadndice 1'
+
+
+def test_lote_com_indice_fora_do_intervalo_responde_400(cliente_com_planilha, pool_falso):
+    resposta = cliente_com_planilha.post('/gerar_contratos_lote', json={'indices': [0, 7], 'valor_doacao': 1500,
+                                                                        'aliquota': 4})
+
+    assert resposta.status_code == 400
+    assert 'fora do intervalo' in resposta.get_json()['erro']
@@ -0,0 +1,73 @@
+# tests/test_metricas.py
+import os
+import json
+
+import pytest
+
+from utils import metricas
+
+PID_OUTRO_WORKER = 999999
+
+
+@pytest.fixture
+def diretorio_multiprocesso(tmp_path, monkeypatch):
+    """Modo multiprocesso neste processo, sem a thread de gravação."""
+    monkeypatch.setattr(metricas, '_diretorio_multiprocesso', str(tmp_path))
+    monkeypatch.setattr(metricas, '_pid_multiprocesso', os.getpid())
+    return str(tmp_path)
+
+
+def _valor(texto, serie):
+    for linha in texto.splitlines():
+        if linha.startswith(serie + ' '):
+            return float(linha.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def _gravar_outro_worker(diretorio, acertos_pdf, observacoes_pdf):
+    estado = {
+        metricas.CACHE.nome: [[['pdf', 'acerto'], acertos_pdf]],
+        metricas.TAMANHO_PDF.nome: [[[], [1] * len(metricas.BUCKETS_BYTES), 2.0 * observacoes_pdf, observacoes_pdf]],
+        'metrica_de_outra_versao': [[[], 1]],
+    }
+    with open(os.path.join(diretorio, f"metricas_{PID_OUTRO_WORKER}.json"), 'w', encoding='utf-8') as f_metricas:
+        json.dump(estado, f_metricas)
+
+
+def test_exportacao_soma_as_series_de_todos_os_workers(diretorio_multiprocesso):
+    serie_acertos = 'contratos_cache_total{cache="pdf",resultado="acerto"}'
+    base = _valor(metricas.exportar_prometheus(), serie_acertos)
+    _gravar_outro_worker(diretorio_multiprocesso, acertos_pdf=5, observacoes_pdf=3)
+    metricas.CACHE.inc(cache='pdf', resultado='acerto')
+
+    texto = metricas.exportar_prometheus()
+
+    assert _valor(texto, serie_acertos) == base + 6
+    assert _valor(texto, 'contratos_pdf_bytes_count') == metricas.TAMANHO_PDF.contagem() + 3
+    assert 'metrica_de_outra_versao' not in texto
+    assert os.path.exists(os.path.join(diretorio_multiprocesso, f"metricas_{os.getpid()}.json"))
+
+
+def test_worker_encerrado_continua_na_soma(diretorio_multiprocesso):
+    serie_acertos = 'contratos_cache_total{cache="pdf",resultado="acerto"}'
+    _gravar_outro_worker(diretorio_multiprocesso, acertos_pdf=5, observacoes_pdf=3)
+    antes = metricas.exportar_prometheus()
+
+    metricas.encerrar_processo(diretorio_multiprocesso, PID_OUTRO_WORKER)
+    _gravar_outro_worker(diretorio_multiprocesso, acertos_pdf=2, observacoes_pdf=1) # pid reaproveitado
+    metricas.encerrar_processo(diretorio_multiprocesso, PID_OUTRO_WORKER)
+
+    depois = metricas.exportar_prometheus()
+    assert not os.path.exists(os.path.join(diretorio_multiprocesso, f"metricas_{PID_OUTRO_WORKER}.json"))
+    assert _valor(depois, serie_acertos) == _valor(antes, serie_acertos) + 2
+    assert _valor(depois, 'contratos_pdf_bytes_count') == _valor(antes, 'contratos_pdf_bytes_count') + 1
+
+
+def test_sem_diretorio_exporta_so_o_processo(monkeypatch, tmp_path):
+    monkeypatch.setattr(metricas, '_diretorio_multiprocesso', None)
+    metricas.ERROS.inc(etapa='teste_metricas')
+
+    texto = metricas.exportar_prometheus()
+
+    assert _valor(texto, 'contratos_erros_total{etapa="teste_metricas"}') == metricas.ERROS.valor(etapa='teste_metricas')
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,76 @@
+# tests/test_migracoes_banco.py
+import logging
+
+from sqlalchemy import create_engine, inspect, text
+
+from models import ContratoJob, DatasetDonatarios, DatasetLinha
+from utils.migracoes_banco import migrar_esquema
+
+logger = logging.getLogger(__name__)
+
+# contrato_jobs como era criada antes dos jobs de PDF mesclado
+CONTRATO_JOBS_ANTIGA = """
+CREATE TABLE contrato_jobs (
+    id VARCHAR(32) NOT NULL, status VARCHAR(20) NOT NULL, progresso INTEGER NOT NULL, tentativas INTEGER NOT NULL,
+    max_tentativas INTEGER NOT NULL, proxima_tentativa_em DATETIME NOT NULL, dados_donatario_json TEXT NOT NULL,
+    nome_donatario VARCHAR(255), valor_bruto_doacao FLOAT NOT NULL, aliquota_percentual FLOAT NOT NULL,
+    base_url VARCHAR(255), nome_arquivo_pdf VARCHAR(255), erro TEXT, criado_em DATETIME NOT NULL,
+    atualizado_em DATETIME NOT NULL, PRIMARY KEY (id)
+)"""
+
+
+def test_contrato_jobs_antiga_ganha_as_colunas_novas_e_mantem_os_jobs(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'antigo.db'}")
+    with engine.begin() as conexao:
+        conexao.execute(text(CONTRATO_JOBS_ANTIGA))
+        conexao.execute(text("CREATE INDEX ix_contrato_jobs_status ON contrato_jobs (status)"))
+        conexao.execute(text(
+            "INSERT INTO contrato_jobs VALUES ('job-antigo', 'concluido', 100, 0, 3, '2024-05-01 10:00:00', "
+            "'{\"NOME\": \"Ana\"}', 'Ana', 1500.0, 4.0, NULL, 'CONTRATO_ANA.pdf', NULL, "
+            "'2024-05-01 10:00:00', '2024-05-01 10:00:01')"))
+
+    migrar_esquema(engine, logger)
+    migrar_esquema(engine, logger) # idempotente
+
+    colunas = {coluna['name']: coluna for coluna in inspect(engine).get_columns('contrato_jobs')}
+    assert {'tipo', 'total_contratos'} <= set(colunas)
+    assert colunas['valor_bruto_doacao']['nullable'] and colunas['aliquota_percentual']['nullable']
+    assert not inspect(engine).has_table('contrato_jobs_antiga')
+    with engine.begin() as conexao:
+        linhas = conexao.execute(text(
+            "SELECT id, tipo, total_contratos, nome_arquivo_pdf, valor_bruto_doacao FROM contrato_jobs")).all()
+        # Um job de PDF mesclado (sem valor/alíquota próprios) agora pode ser gravado
+        conexao.execute(ContratoJob.__table__.insert().values(
+            id='job-lote', tipo=ContratoJob.TIPO_PDF_MESCLADO, total_contratos=2, status='pendente', progresso=0,
+            tentativas=0, max_tentativas=3, dados_donatario_json='[]'))
+    assert linhas == [('job-antigo', ContratoJob.TIPO_CONTRATO, 1, 'CONTRATO_ANA.pdf', 1500.0)]
+
+
+def test_snapshots_de_planilha_em_json_sao_removidos(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'antigo.db'}")
+    with engine.begin() as conexao:
+        conexao.execute(text("CREATE TABLE datasets_donatarios (id INTEGER PRIMARY KEY, sheet_id VARCHAR(255), "
+                             "versao VARCHAR(40), colunas_json TEXT, total_linhas INTEGER, criado_em DATETIME)"))
+        conexao.execute(text("CREATE TABLE datasets_linhas (dataset_id INTEGER, indice INTEGER, nome VARCHAR(255), "
+                             "cpf VARCHAR(64), cpf_normalizado VARCHAR(32), dados_json TEXT NOT NULL, "
+                             "PRIMARY KEY (dataset_id, indice))"))
+        conexao.execute(text("INSERT INTO datasets_donatarios VALUES (1, 'planilha', 'v1', '[]', 1, '2024-05-01')"))
+        conexao.execute(text("INSERT INTO datasets_linhas VALUES (1, 0, 'Ana', '1', '1', '{\"NOME\": \"Ana\"}')"))
+
+    migrar_esquema(engine, logger)
+    DatasetDonatarios.__table__.create(engine)
+    DatasetLinha.__table__.create(engine)
+    migrar_esquema(engine, logger) # tabelas no formato atual ficam intactas
+
+    colunas = [coluna['name'] for coluna in inspect(engine).get_columns('datasets_linhas')]
+    assert 'dados' in colunas and 'dados_json' not in colunas
+    with engine.begin() as conexao:
+        assert conexao.execute(text("SELECT COUNT(*) FROM datasets_donatarios")).scalar() == 0
+
+
+def test_banco_novo_nao_e_alterado(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'novo.db'}")
+
+    migrar_esquema(engine, logger)
+
+    assert not inspect(engine).has_table('contrato_jobs') and not inspect(engine).has_table('datasets_linhas')
@@ -0,0 +1,83 @@
+# tests/test_pdf_cache.py
+import os
+
+from utils.pdf_cache import CachePDF, chave_cache_contrato
+
+
+def _chave(numero):
+    return f"{numero:02d}" + 'a' * 62
+
+
+def test_remove_o_menos_usado_ao_passar_do_limite(tmp_path):
+    cache = CachePDF(str(tmp_path), tamanho_maximo_bytes=250)
+    cache.guardar(_chave(1), b'1' * 100)
+    cache.guardar(_chave(2), b'2' * 100)
+    assert cache.obter(_chave(1)) == b'1' * 100 # 1 passa a ser o mais recente
+
+    cache.guardar(_chave(3), b'3' * 100)
+
+    assert cache.obter(_chave(2)) is None
+    assert cache.obter(_chave(1)) == b'1' * 100
+    assert cache.obter(_chave(3)) == b'3' * 100
+    assert not os.path.exists(cache._caminho(_chave(2)))
+    estatisticas = cache.estatisticas()
+    assert (estatisticas["entradas"], estatisticas["tamanho_bytes"], estatisticas["remocoes"]) == (2, 200, 1)
+
+
+def test_pdf_maior_que_o_limite_nao_entra(tmp_path):
+    cache = CachePDF(str(tmp_path), tamanho_maximo_bytes=50)
+    cache.guardar(_chave(1), b'x' * 51)
+
+    assert cache.obter(_chave(1)) is None
+    assert cache.estatisticas()["entradas"] == 0
+
+
+def test_indice_reconstruido_do_disco_respeita_o_limite(tmp_path):
+    cache = CachePDF(str(tmp_path), tamanho_maximo_bytes=1000)
+    for numero in range(3):
+        cache.guardar(_chave(numero), b'p' * 100)
+        os.utime(cache._caminho(_chave(numero)), (1000 + numero, 1000 + numero))
+
+    reaberto = CachePDF(str(tmp_path), tamanho_maximo_bytes=150)
+
+    assert reaberto.estatisticas()["entradas"] == 1
+    assert reaberto.obter(_chave(2)) == b'p' * 100
+
+
+def test_chave_muda_com_o_contexto_e_com_o_css(tmp_path):
+    css_a, css_b = tmp_path / 'a.css', tmp_path / 'b.css'
+    css_a.write_text('body { margin: 1cm; }')
+    css_b.write_text('body { margin: 2cm; }')
+    contexto = {'NOME_DONATARIO': 'ANA', 'VALOR_BRUTO_DOACAO_NUM': '1.500,00'}
+
+    chave = chave_cache_contrato(contexto, css_filepath=str(css_a))
+
+    assert chave == chave_cache_contrato(dict(reversed(list(contexto.items()))), css_filepath=str(css_a))
+    assert chave != chave_cache_contrato(dict(contexto, VALOR_BRUTO_DOACAO_NUM='1.500,01'), css_filepath=str(css_a))
+    assert chave != chave_cache_contrato(contexto, css_filepath=str(css_b))
+
+
+def test_pdf_gravado_por_outro_processo_e_adotado(tmp_path):
+    # Duas instâncias no mesmo diretório fazem o papel de dois workers do gunicorn
+    cache_a = CachePDF(str(tmp_path), tamanho_maximo_bytes=1000)
+    cache_b = CachePDF(str(tmp_path), tamanho_maximo_bytes=1000)
+    cache_b.guardar(_chave(1), b'b' * 100)
+
+    assert cache_a.obter(_chave(1)) == b'b' * 100
+    assert cache_a.estatisticas()["entradas"] == 1 and cache_a.acertos == 1
+
+
+def test_remocao_considera_os_arquivos_dos_outros_processos(tmp_path):
+    cache_a = CachePDF(str(tmp_path), tamanho_maximo_bytes=250)
+    cache_b = CachePDF(str(tmp_path), tamanho_maximo_bytes=250)
+    cache_a.guardar(_chave(1), b'1' * 100)
+    cache_a.guardar(_chave(2), b'2' * 100)
+    os.utime(cache_a._caminho(_chave(1)), (1000, 1000))
+    os.utime(cache_a._caminho(_chave(2)), (2000, 2000))
+
+    cache_b.guardar(_chave(3), b'3' * 100)
+
+    assert not os.path.exists(cache_a._caminho(_chave(1)))
+    assert cache_b.estatisticas()["tamanho_bytes"] == 200
+    assert cache_a.obter(_chave(1)) is None
+    assert cache_a.obter(_chave(3)) == b'3' * 100
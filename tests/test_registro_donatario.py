@@ -0,0 +1,34 @@
+# tests/test_registro_donatario.py
+import pytest
+
+from utils.registro_donatario import RegistroDonatario
+
+
+def test_ida_e_volta_mantem_zeros_a_esquerda_vazios_e_extras():
+    registro = RegistroDonatario.from_dict({
+        'NOME': 'João Conceição', 'CPF': '01234567890', 'CEP': '01001-000', 'AGENCIA': '0042',
+        'EMAIL': '', 'CONTA': 1500.0, 'OBSERVACAO': '', 'APELIDO': 'Jô ✓',
+    })
+
+    copia = RegistroDonatario.desserializar(registro.serializar())
+
+    assert copia == registro
+    assert copia.to_dict() == {'NOME': 'João Conceição', 'CPF': '01234567890', 'CEP': '01001-000',
+                               'AGENCIA': '0042', 'EMAIL': '', 'CONTA': '1500',
+                               'OBSERVACAO': '', 'APELIDO': 'Jô ✓'}
+    # Vazio ('') continua diferente de coluna ausente (None)
+    assert copia.get('EMAIL') == '' and copia.get('TELEFONE') is None and 'TELEFONE' not in copia
+
+
+def test_registro_sem_campos_e_textos_longos():
+    vazio = RegistroDonatario()
+    longo = RegistroDonatario(NOME='A' * 300, extras={'ENDERECO_COMPLETO': 'Rua ' * 100})
+
+    assert RegistroDonatario.desserializar(vazio.serializar()).to_dict() == {}
+    assert RegistroDonatario.desserializar(longo.serializar()) == longo
+
+
+@pytest.mark.parametrize('dados', [b'', b'\x02\x00\x00', b'{"NOME": "Ana"}'])
+def test_versao_desconhecida_levanta_value_error(dados):
+    with pytest.raises(ValueError, match="Formato de registro desconhecido"):
+        RegistroDonatario.desserializar(dados)
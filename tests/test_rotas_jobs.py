@@ -0,0 +1,122 @@
+# tests/test_rotas_jobs.py
+import io
+import os
+import json
+import zipfile
+import logging
+
+import pytest
+
+from config import Config
+from extensions import db
+from models import ContratoJob
+from utils import job_queue
+from utils.armazenamento_contratos import gravar_contrato, aplicar_retencao, pasta_contratos
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def job_concluido(contexto_app):
+    job = ContratoJob(id='job-concluido', dados_donatario_json=json.dumps({'NOME': 'Ana'}), nome_donatario='Ana',
+                      valor_bruto_doacao=1500.0, aliquota_percentual=4.0, status=ContratoJob.STATUS_CONCLUIDO,
+                      progresso=100, nome_arquivo_pdf='CONTRATO_ANA.pdf')
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_resultado_do_job_baixa_o_contrato(contexto_app, job_concluido):
+    gravar_contrato(b'%PDF-ana', 'CONTRATO_ANA.pdf', {'NOME': 'Ana'}, 1500.0, 4.0, logger,
+                    upload_folder=contexto_app.config['UPLOAD_FOLDER'], job_id=job_concluido.id)
+
+    resposta = contexto_app.test_client().get(f'/jobs/{job_concluido.id}/resultado')
+
+    assert resposta.status_code == 200
+    assert resposta.data == b'%PDF-ana'
+    assert 'CONTRATO_ANA.pdf' in resposta.headers['Content-Disposition']
+
+
+def test_resultado_de_contrato_removido_pela_retencao_expira(contexto_app, job_concluido):
+    upload_folder = contexto_app.config['UPLOAD_FOLDER']
+    gravar_contrato(b'%PDF-ana', 'CONTRATO_ANA.pdf', {'NOME': 'Ana'}, 1500.0, 4.0, logger,
+                    upload_folder=upload_folder, job_id=job_concluido.id)
+    aplicar_retencao(upload_folder, logger, retencao_dias=0, tamanho_maximo_bytes=1)
+    # Arquivo de outra Ana com o mesmo nome no layout antigo não pode ser servido no lugar
+    with open(os.path.join(pasta_contratos(upload_folder), 'CONTRATO_ANA.pdf'), 'wb') as f_pdf:
+        f_pdf.write(b'%PDF-outra-ana')
+
+    resposta = contexto_app.test_client().get(f'/jobs/{job_concluido.id}/resultado')
+
+    assert resposta.status_code == 410
+    assert 'expirado' in resposta.get_json()['erro']
+
+
+def test_resultado_de_pdf_mesclado_em_volumes_baixa_um_zip(contexto_app):
+    job = ContratoJob(id='job-mesclado', tipo=ContratoJob.TIPO_PDF_MESCLADO, total_contratos=3,
+                      dados_donatario_json='[]', nome_donatario='Lote de 3 donatários',
+                      status=ContratoJob.STATUS_CONCLUIDO, progresso=100, nome_arquivo_pdf='CONTRATOS_20250101.zip')
+    db.session.add(job)
+    db.session.commit()
+    for numero in (1, 2):
+        gravar_contrato(f'%PDF-volume-{numero}'.encode(), f'CONTRATOS_20250101_volume{numero:03d}.pdf',
+                        {'NOME': job.nome_donatario}, None, None, logger,
+                        upload_folder=contexto_app.config['UPLOAD_FOLDER'], job_id=job.id)
+
+    resposta = contexto_app.test_client().get(f'/jobs/{job.id}/resultado')
+
+    assert resposta.status_code == 200 and resposta.mimetype == 'application/zip'
+    with zipfile.ZipFile(io.BytesIO(resposta.data)) as arquivo_zip:
+        assert arquivo_zip.namelist() == ['CONTRATOS_20250101_volume001.pdf', 'CONTRATOS_20250101_volume002.pdf']
+        assert arquivo_zip.read('CONTRATOS_20250101_volume002.pdf') == b'%PDF-volume-2'
+
+
+def test_pdf_unico_grande_vai_para_a_fila_de_jobs(contexto_app, cliente_sheets, monkeypatch):
+    submetidos = []
+
+    def _submeter(itens, base_url, logger, max_tentativas=3):
+        submetidos.append(itens)
+        job = ContratoJob(id='job-lote', tipo=ContratoJob.TIPO_PDF_MESCLADO, total_contratos=len(itens),
+                          dados_donatario_json='[]', nome_donatario=f"Lote de {len(itens)} donatários")
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    monkeypatch.setattr(job_queue, 'submeter_job_pdf_mesclado', _submeter)
+    monkeypatch.setitem(contexto_app.config, 'PDF_MESCLADO_LIMITE_SINCRONO', 1)
+    cliente_sheets.adicionar('planilha-lote', [['NOME', 'CPF'], ['Ana', '1'], ['Bia', '2']])
+    cliente = contexto_app.test_client()
+    cliente.post('/', data={'sheet_url': 'planilha-lote'})
+
+    resposta = cliente.post('/gerar_contratos_lote', json={'indices': 'all', 'valor_doacao': 1500, 'aliquota': 4,
+                                                           'formato': 'pdf'})
+
+    assert resposta.status_code == 202
+    assert resposta.get_json()['resultado_url'] == '/jobs/job-lote/resultado'
+    assert [(dados.get('NOME'), valor, aliquota) for dados, valor, aliquota in submetidos[0]] == [
+        ('Ana', 1500.0, 4.0), ('Bia', 1500.0, 4.0)]
+
+
+def test_pdf_unico_em_volumes_junta_as_falhas_num_unico_erros_txt(contexto_app, cliente_sheets, monkeypatch):
+    from utils import pdf_rendering
+
+    def _mapear_no_pool(funcao, tarefas):
+        for numero, contratos, base_url in tarefas:
+            if numero == 2:
+                yield (numero, contratos, base_url), None, RuntimeError(f'volume {numero} caiu')
+            else:
+                yield (numero, contratos, base_url), (numero, len(contratos), b'%PDF-volume', {}), None
+
+    monkeypatch.setattr(pdf_rendering, 'mapear_no_pool', _mapear_no_pool)
+    monkeypatch.setattr(Config, 'PDF_MESCLADO_CONTRATOS_POR_VOLUME', 1)
+    cliente_sheets.adicionar('planilha-volumes', [['NOME', 'CPF'], ['Ana', '1'], ['Bia', '2'], ['Caio', '3']])
+    cliente = contexto_app.test_client()
+    cliente.post('/', data={'sheet_url': 'planilha-volumes'})
+
+    resposta = cliente.post('/gerar_contratos_lote', json={'indices': 'all', 'valor_doacao': 1500, 'aliquota': 4,
+                                                           'formato': 'pdf'})
+
+    with zipfile.ZipFile(io.BytesIO(resposta.data)) as arquivo_zip:
+        assert [nome.rsplit('_', 1)[-1] for nome in arquivo_zip.namelist()] == [
+            'volume001.pdf', 'volume003.pdf', 'ERROS.txt']
+        assert arquivo_zip.read('ERROS.txt') == b'Volume 2: volume 2 caiu'
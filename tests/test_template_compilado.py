@@ -0,0 +1,56 @@
+# tests/test_template_compilado.py
+import random
+import logging
+
+import markdown2
+import pytest
+
+from dados_sinteticos import gerar_registro
+from utils.contract_processing import preparar_dados_para_contrato
+from utils.pdf_rendering import TEMPLATE_CONTRATO, MARKDOWN_EXTRAS, get_jinja_markdown_env
+from utils.template_compilado import get_template_compilado
+
+logger = logging.getLogger(__name__)
+
+
+def _html_jinja(contexto):
+    """HTML pelo pipeline completo (Jinja2 -> markdown2), a referência do template compilado."""
+    markdown_renderizado = get_jinja_markdown_env().get_template(TEMPLATE_CONTRATO).render(contexto)
+    return markdown2.markdown(markdown_renderizado, extras=MARKDOWN_EXTRAS)
+
+
+@pytest.fixture(scope='module')
+def compilado():
+    return get_template_compilado(get_jinja_markdown_env(), TEMPLATE_CONTRATO, MARKDOWN_EXTRAS, logger)
+
+
+def test_html_compilado_igual_ao_do_jinja(compilado):
+    rng = random.Random(7)
+    preenchidos = 0
+    for indice in range(200):
+        contexto = preparar_dados_para_contrato(gerar_registro(rng, indice), rng.choice([1500.0, 2000.0, 1234.56]),
+                                                rng.choice([2.0, 4.0]), logger)
+        html = compilado.preencher(contexto)
+        if html is not None:
+            preenchidos += 1
+            assert html == _html_jinja(contexto)
+    assert preenchidos > 0
+
+
+def _contexto(**valores):
+    contexto = preparar_dados_para_contrato({'NOME': 'Ana', 'CPF': '1'}, 1500.0, 4.0, logger)
+    contexto.update(valores)
+    return contexto
+
+
+@pytest.mark.parametrize('nome', ['Ana <Silva> & Cia', '*Ana*', 'Ana  Silva ', '"Ana"', 'Ana_Silva', ''])
+def test_valores_especiais_caem_no_pipeline_completo(compilado, nome):
+    assert compilado.preencher(_contexto(NOME_DONATARIO=nome)) is None
+
+
+@pytest.mark.parametrize('valor', ['1. Ana', '# Ana', '- Ana', 'Ana -- Silva', "D'Ávila", 'Rua 7, nº 10 (fundos)'])
+def test_qualquer_valor_aceito_gera_o_mesmo_html(compilado, valor):
+    for placeholder in set(compilado.slots):
+        contexto = _contexto(**{placeholder: valor})
+        html = compilado.preencher(contexto)
+        assert html is None or html == _html_jinja(contexto), placeholder